@@ -3,6 +3,7 @@
 import os
 import logging
 import sys
+import argparse
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import traceback
@@ -10,16 +11,61 @@ import time
 
 # Import modules from different categories
 from devices.device_utils import list_all_devices, select_storage_devices, run_security_erase
-from devices.pcie_utils import get_pcie_bdf, setpci_for_devices, set_interrupt_Coalescing
+from devices.erase_engine import DEFAULT_ERASE_CONCURRENCY, DEFAULT_ERASE_TIMEOUT
+from devices.pcie_utils import get_pcie_bdf, build_device_config, prompt_interrupt_coalescing
+from devices.feature_config import configure_devices, get_mismatches
 from utils.logging_utils import setup_logging
 from utils.file_utils import find_latest_result_folder
 from devices.pcie_utils import save_before_lspci_output, save_after_lspci_output
-from scripts.Solidigm_8corners_fio import run_device_tests, select_product_family
+from scripts.Solidigm_8corners_fio import run_device_tests, run_synchronized_tests, select_product_family
 from scripts.Solidigm_8corners_fio import check_nvme_write  # ✅ 確保正確引入 `check_nvme_write`
-from devices.device_utils import get_taskset_commands
+from devices.numa_topology import plan_cpu_binding, write_binding_report
+from devices.irq_affinity import apply_irq_affinity, restore_irq_affinity
+from scripts.smart_sampler import DEFAULT_SMART_INTERVAL
+from scripts.auto_tuner import autotune_device, load_tuned_params, cache_key, DEFAULT_TUNE_RUNTIME, DEFAULT_MAX_RUNS, TUNED_PARAMS_FILE
+from scripts.qd_sweep import run_sweep, parse_int_list, DEFAULT_SWEEP_IODEPTHS, DEFAULT_SWEEP_NUMJOBS, DEFAULT_KNEE_FRACTION
+from test_cases.test_scheduler import plan_test_sequence, print_test_plan
+from utils.run_journal import save_run_config, load_run_config, append_journal_entry, PHASE_ERASE
+from utils.results_db import ResultsStore, DEFAULT_DB_PATH
+from analysis.result_parser import add_row_listener, remove_row_listener
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Solidigm Performance Testing Tool")
+    parser.add_argument("--resume", action="store_true",
+                        help="接續最新測試資料夾中中斷的測試，略過 run_journal.jsonl 中已完成的階段")
+    parser.add_argument("--sync", action="store_true",
+                        help="每個測試以單一 fio job file 同時跑所有裝置，並輸出系統總 IOPS/BW")
+    parser.add_argument("--erase-concurrency", type=int, default=DEFAULT_ERASE_CONCURRENCY,
+                        help="測試前安全清除最多同時處理幾顆裝置")
+    parser.add_argument("--erase-timeout", type=int, default=DEFAULT_ERASE_TIMEOUT,
+                        help="單一裝置安全清除的逾時秒數")
+    parser.add_argument("--smart-interval", type=int, default=DEFAULT_SMART_INTERVAL,
+                        help="測試期間 SMART 取樣間隔（秒），0 表示不取樣")
+    parser.add_argument("--sweep", metavar="TEST_NAME",
+                        help="只執行指定的 test case，並以 iodepth × numjobs 網格掃描，輸出 IOPS vs p99 曲線與 knee")
+    parser.add_argument("--sweep-iodepths", type=parse_int_list, default=list(DEFAULT_SWEEP_IODEPTHS),
+                        help="sweep 的 iodepth 清單，例如 1,4,16,64")
+    parser.add_argument("--sweep-numjobs", type=parse_int_list, default=list(DEFAULT_SWEEP_NUMJOBS),
+                        help="sweep 的 numjobs 清單，例如 1,2,4,8")
+    parser.add_argument("--knee-fraction", type=float, default=DEFAULT_KNEE_FRACTION,
+                        help="knee 的定義：達到 peak IOPS 此比例的最低負載點")
+    parser.add_argument("--autotune", action="store_true",
+                        help="為每個 test case 搜尋達到 spec 的最少 numjobs / iodepth，結果依 model/capacity/firmware 快取")
+    parser.add_argument("--tune-runtime", type=int, default=DEFAULT_TUNE_RUNTIME,
+                        help="auto-tune 每個量測點的 runtime（秒）")
+    parser.add_argument("--tune-max-runs", type=int, default=DEFAULT_MAX_RUNS,
+                        help="auto-tune 每個 test case 最多量測幾個點")
+    parser.add_argument("--use-tuned", action="store_true",
+                        help="測試時使用快取中 auto-tune 的 iodepth / numjobs（沒有快取的裝置沿用 test case 設定）")
+    parser.add_argument("--tuned-params", default=TUNED_PARAMS_FILE,
+                        help="auto-tune 結果快取檔（--autotune 寫入、--use-tuned 讀取）")
+    parser.add_argument("--results-db", default=DEFAULT_DB_PATH, help="測試結果歷史資料庫 (SQLite) 路徑")
+    return parser.parse_args()
+
 
 # **主函式**
 def main():
+    args = parse_args()
     start_time = time.time()  # 記錄開始時間
     base_path = "/root/Solidigm_Performance_Testing_Tool"
 
@@ -40,26 +86,60 @@ def main():
     # ✅ **取出 test_cases 陣列**
     tests = test_config["test_cases"]
 
-    # ✅ 問使用者是否記錄 bandwidth log
-    log_bw_input = input("是否記錄 bandwidth log？(y/n): ").strip().lower()
-    log_bandwidth = log_bw_input == "y"
+    # **--sweep：只跑指定的 test case**
+    sweep = None
+    if args.sweep:
+        sweep_test = next((t for t in tests if t.get("name") == args.sweep), None)
+        if sweep_test is None:
+            print(f"❌ Test case {args.sweep} not found. Available: {', '.join(t.get('name', '') for t in tests)}")
+            sys.exit(1)
+        sweep = {"test": args.sweep, "iodepths": args.sweep_iodepths, "numjobs": args.sweep_numjobs,
+                 "knee_fraction": args.knee_fraction}
 
-    # **建立測試結果資料夾**
-    latest_folder = find_latest_result_folder(base_path, selected_model, "TestResults")
+    # **建立測試結果資料夾（--resume 時沿用最新的資料夾）**
+    latest_folder = find_latest_result_folder(base_path, selected_model, "TestResults", resume=args.resume)
     log_file = os.path.join(latest_folder, "fio_tests.log")
     setup_logging(log_file)
 
-    # **列出可用 SATA & NVMe 裝置**
-    all_devices = list_all_devices()
+    run_config = None
+    if args.resume:
+        run_config = load_run_config(latest_folder)
+        if run_config is None:
+            logging.error(f"❌ No run configuration found in {latest_folder}, cannot resume.")
+            sys.exit(1)
+        logging.info(f"🔁 Resuming run in {latest_folder}: {run_config}")
+        sweep = run_config.get("sweep")
+        args.autotune = run_config.get("autotune", False)
+        args.use_tuned = run_config.get("use_tuned", False)
+
+    if run_config:
+        log_bandwidth = run_config["log_bandwidth"]
+        selected_devices = run_config["devices"]
+    else:
+        # ✅ 問使用者是否記錄 bandwidth log
+        log_bw_input = input("是否記錄 bandwidth log？(y/n): ").strip().lower()
+        log_bandwidth = log_bw_input == "y"
+
+        # **列出可用 SATA & NVMe 裝置**
+        all_devices = list_all_devices()
 
-    # **讓使用者選擇測試裝置**
-    selected_devices = select_storage_devices(all_devices)
+        # **讓使用者選擇測試裝置**
+        selected_devices = select_storage_devices(all_devices)
 
-    # **執行安全清除**
-    run_security_erase(selected_devices)
+        # **執行安全清除（所有裝置平行）**
+        erase_results = run_security_erase(selected_devices, args.erase_concurrency, args.erase_timeout)
+        for device, result in erase_results.items():
+            if result.success:
+                append_journal_entry(latest_folder, PHASE_ERASE, device,
+                                     outputs={"method": result.method, "elapsed_sec": round(result.elapsed_sec, 1)})
+            else:
+                logging.error(f"❌ Secure erase failed for {device}: {result.message}")
 
-    # **設定中斷合併 (✅ 儲存 Log 到 fio_tests.log)**
-    set_interrupt_Coalescing(selected_devices, output_file=log_file)
+    # **詢問中斷合併設定（--resume 沿用原本的設定）**
+    if run_config:
+        coalescing_threshold = run_config.get("interrupt_coalescing")
+    else:
+        coalescing_threshold = prompt_interrupt_coalescing(selected_devices)
 
     # **獲取 NVMe PCIe BDF**
     device_bdf_map = get_pcie_bdf(selected_devices)
@@ -67,50 +147,155 @@ def main():
     # **執行 lspci 之前的狀態保存**
     save_before_lspci_output(device_bdf_map, f"{latest_folder}/lspci_outputs")
 
-    # **設定 PCIe 參數**
-    setpci_for_devices(device_bdf_map)
+    # **所有裝置同時設定中斷合併與 PCIe 參數，讀回後比對（結果存到 device_config.json）**
+    mismatches = get_mismatches(configure_devices(build_device_config(selected_devices, coalescing_threshold), latest_folder))
+    if mismatches and not run_config:
+        for entry in mismatches:
+            print(f"❌ {entry['device']} {entry['feature']}: requested {entry['requested']}, actual {entry['actual']}")
+        if input("部分裝置設定未生效，是否繼續測試？(y/n): ").strip().lower() != "y":
+            sys.exit(1)
 
-    # **輸入 FIO 測試的 Runtime**
-    runtime = input("Enter the runtime for FIO tests (in seconds): ").strip()
-    if not runtime.isdigit() or int(runtime) <= 0:
-        print("❌ Invalid runtime. Please enter a positive integer.")
-        sys.exit(1)
-    runtime = int(runtime)
-
-    # **如果選擇多個 SSD，則啟用 task_set**
-    task_set = None
-    device_numa_map = {}
-    if len(selected_devices) > 1:
-        task_set, device_numa_map = get_taskset_commands()
-        cpu_core_binding_file = os.path.join(latest_folder, "CPU_Core_Binding.txt")
-        with open(cpu_core_binding_file, "a") as log_file:
-            for dev, cmd in task_set.items():
-                numa_info = device_numa_map.get(dev, "unknown")
-                log_file.write(f"{dev} (NUMA node {numa_info}): {cmd}\n")
-
-    # ✅ **測試前，記錄 NVMe `Data Units Written`**
-    for device in selected_devices:
-        check_nvme_write(device, latest_folder, "Preconditioning - Before")
-
-    # **使用 ThreadPoolExecutor 執行測試**
-    with ThreadPoolExecutor(max_workers=len(selected_devices)) as executor:
-        futures = {
-            executor.submit(run_device_tests, device, tests, latest_folder, runtime, selected_model, form_factor, test_config, task_set, log_bandwidth): device
-            for device in selected_devices
-        }
-
-        # **等待所有裝置測試完成**
-        for future in as_completed(futures):
-            device = futures[future]
-            try:
-                future.result()
-                logging.info(f"✅ Tests completed for device: {device}")
-            except Exception as e:
-                logging.error(f"❌ Error during tests for device {device}: {e}\n{traceback.format_exc()}")
-
-    # ✅ **測試後，記錄 NVMe `Data Units Written`**
+    # **輸入 FIO 測試的 Runtime（auto-tune 使用 --tune-runtime）**
+    if run_config:
+        runtime = run_config["runtime"]
+    elif args.autotune:
+        runtime = args.tune_runtime
+    else:
+        runtime = input("Enter the runtime for FIO tests (in seconds): ").strip()
+        if not runtime.isdigit() or int(runtime) <= 0:
+            print("❌ Invalid runtime. Please enter a positive integer.")
+            sys.exit(1)
+        runtime = int(runtime)
+
+    # **依 NUMA 拓樸將每個裝置的 fio 綁定到同一個 node 的 CPU 與記憶體（--resume 沿用原本的綁定）**
+    if run_config and "cpu_binding" in run_config:
+        cpu_binding = run_config["cpu_binding"]
+    else:
+        cpu_binding = plan_cpu_binding(selected_devices)
+        write_binding_report(cpu_binding, selected_devices, os.path.join(latest_folder, "CPU_Core_Binding.txt"))
     for device in selected_devices:
-        check_nvme_write(device, latest_folder, "Preconditioning - After")
+        entry = cpu_binding.get(device)
+        if entry:
+            logging.info(f"📌 {device}: NUMA node {entry['node']}, cpus_allowed={entry['cpus_allowed']}, numa_mem_policy={entry['numa_mem_policy']}")
+
+    # **NVMe completion 中斷綁到同一組 CPU（原本設定存檔，測試結束後還原）**
+    apply_irq_affinity(selected_devices, cpu_binding, latest_folder)
+
+    results_store = None
+    try:
+        # ✅ **依裝置狀態排程測試，去除重複的 preconditioning**
+        test_plan = None
+        if run_config or sweep or args.autotune:
+            schedule = run_config.get("schedule", False) if run_config else False
+        else:
+            schedule_input = input("是否依 precondition 狀態重新排序測試以減少 preconditioning？(y/n): ").strip().lower()
+            schedule = schedule_input == "y"
+        if schedule:
+            test_plan = plan_test_sequence(tests, test_config)
+            print_test_plan(test_plan, tests, test_config)
+
+        if not run_config:
+            save_run_config(latest_folder, {
+                "model": selected_model,
+                "devices": selected_devices,
+                "runtime": runtime,
+                "log_bandwidth": log_bandwidth,
+                "schedule": schedule,
+                "sync": args.sync,
+                "cpu_binding": cpu_binding,
+                "interrupt_coalescing": coalescing_threshold,
+                "sweep": sweep,
+                "autotune": args.autotune,
+                "use_tuned": args.use_tuned,
+            })
+
+            # ✅ **測試前，記錄 NVMe `Data Units Written`**
+            for device in selected_devices:
+                check_nvme_write(device, latest_folder, "Preconditioning - Before")
+
+        # **每一列結果同時寫入 SQLite 歷史資料庫（run / 韌體 / kernel / fio 版本），由單一 writer thread 寫入**
+        results_store = ResultsStore(args.results_db).start()
+        results_store.begin_run(os.path.basename(os.path.normpath(latest_folder)), selected_model, latest_folder,
+                                run_config or load_run_config(latest_folder), selected_devices)
+        add_row_listener(results_store.record_row)
+
+        sync = run_config.get("sync", False) if run_config else args.sync
+        if args.autotune:
+            # **auto-tune：每個裝置各自搜尋參數並寫入快取**
+            with ThreadPoolExecutor(max_workers=len(selected_devices)) as executor:
+                futures = {
+                    executor.submit(autotune_device, device, tests, latest_folder, selected_model, form_factor, test_config,
+                                    runtime, cpu_binding.get(device), args.tune_max_runs, resume=args.resume,
+                                    smart_interval=args.smart_interval, cache_file=args.tuned_params): device
+                    for device in selected_devices
+                }
+                for future in as_completed(futures):
+                    device = futures[future]
+                    try:
+                        future.result()
+                        logging.info(f"✅ Auto-tune completed for device: {device}")
+                    except Exception as e:
+                        logging.error(f"❌ Error during auto-tune for device {device}: {e}\n{traceback.format_exc()}")
+        elif sweep:
+            # **iodepth × numjobs sweep：每個裝置各自掃描（不支援 --sync）**
+            if sync:
+                logging.warning("⚠️ --sync is ignored in sweep mode, each device is swept independently")
+            sweep_test = next(t for t in tests if t.get("name") == sweep["test"])
+            with ThreadPoolExecutor(max_workers=len(selected_devices)) as executor:
+                futures = {
+                    executor.submit(run_sweep, device, sweep_test, latest_folder, runtime, selected_model, form_factor, test_config,
+                                    sweep["iodepths"], sweep["numjobs"], sweep["knee_fraction"], cpu_binding.get(device),
+                                    log_bandwidth, resume=args.resume, smart_interval=args.smart_interval): device
+                    for device in selected_devices
+                }
+                for future in as_completed(futures):
+                    device = futures[future]
+                    try:
+                        future.result()
+                        logging.info(f"✅ Sweep completed for device: {device}")
+                    except Exception as e:
+                        logging.error(f"❌ Error during sweep for device {device}: {e}\n{traceback.format_exc()}")
+        elif sync:
+            if args.use_tuned:
+                logging.warning("⚠️ --use-tuned is ignored with --sync (tuned parameters are per device)")
+            # **所有裝置同時執行同一個測試（單一 fio process）**
+            run_synchronized_tests(selected_devices, tests, latest_folder, runtime, selected_model, test_config,
+                                   log_bandwidth, test_plan=test_plan, resume=args.resume, cpu_binding=cpu_binding,
+                                   smart_interval=args.smart_interval)
+        else:
+            # **--use-tuned：每個裝置依 model / capacity / firmware 取出 auto-tune 的參數**
+            tuned_params = {}
+            if args.use_tuned:
+                for device in selected_devices:
+                    tuned_params[device] = load_tuned_params(cache_key(selected_model, device), args.tuned_params)
+                    if not tuned_params[device]:
+                        logging.warning(f"⚠️ No tuned parameters cached for {device} ({cache_key(selected_model, device)})")
+
+            # **使用 ThreadPoolExecutor 執行測試**
+            with ThreadPoolExecutor(max_workers=len(selected_devices)) as executor:
+                futures = {
+                    executor.submit(run_device_tests, device, tests, latest_folder, runtime, selected_model, form_factor, test_config, cpu_binding.get(device), log_bandwidth, test_plan=test_plan, resume=args.resume, smart_interval=args.smart_interval, tuned_params=tuned_params.get(device)): device
+                    for device in selected_devices
+                }
+
+                # **等待所有裝置測試完成**
+                for future in as_completed(futures):
+                    device = futures[future]
+                    try:
+                        future.result()
+                        logging.info(f"✅ Tests completed for device: {device}")
+                    except Exception as e:
+                        logging.error(f"❌ Error during tests for device {device}: {e}\n{traceback.format_exc()}")
+
+        # ✅ **測試後，記錄 NVMe `Data Units Written`**
+        for device in selected_devices:
+            check_nvme_write(device, latest_folder, "Preconditioning - After")
+    finally:
+        # 測試中途失敗、sys.exit 或 Ctrl+C 也要寫完已收到的結果，並還原 irqbalance 與 IRQ affinity
+        if results_store is not None:
+            remove_row_listener(results_store.record_row)
+            results_store.close()
+        restore_irq_affinity(latest_folder)
 
     print("✅ All tests completed. Results saved in:", latest_folder)
 
@@ -18,6 +18,41 @@ base_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 spec_folder = os.path.join(base_folder, "spec_reference")
 family_mapping_file = os.path.join(spec_folder, "family_mapping.json")
 
+# ---------- QoS (latency 百分位) ----------
+# spec JSON 的每個型號可以有 "QoS" 區段，欄位名稱與 summary CSV 相同，每個值依 Capacity 排列，單位 us：
+# "QoS": {"4KB Random Read": {"Read QoS p99 (us)": [...], "Read QoS p99.9999 (us)": [...]}}
+def qos_workload(name):
+    """測試名稱 -> spec QoS 區段的 workload 名稱"""
+    # 測試名稱以 block size 開頭：4KB_Random_Read、8KB_RandRW_70R_30W、32KB_Random_Write ...
+    match = re.match(r"(\d+)KB_", name)
+    if not match:
+        return None
+    size = f"{match.group(1)}KB"
+    if "RandRW" in name:
+        return f"{size} Random Mixed 70/30 RR/RW"
+    if "Random_Read" in name:
+        return f"{size} Random Read"
+    if "Random_Write" in name:
+        return f"{size} Random Write"
+    return None
+
+
+def check_qos(row, qos_spec, capacity_index):
+    """latency 百分位不可超過 spec；回傳 [結果, 超出 spec 的欄位]"""
+    limits = qos_spec.get(qos_workload(row["Test Name"]) or "", {})
+    checked, failed = 0, []
+    for column, values in limits.items():
+        actual = pd.to_numeric(row.get(column), errors="coerce")
+        if pd.isna(actual):
+            continue
+        checked += 1
+        if actual > values[capacity_index]:
+            failed.append(f"{column} {actual:.1f} > {values[capacity_index]}")
+    if not checked:
+        return pd.Series(["N/A", ""])
+    return pd.Series(["FAIL" if failed else "PASS", "; ".join(failed)])
+
+
 # ---------- 比對 & 分析 ----------
 def analyze_results(csv_path, spec_json_path):
     try:
@@ -102,6 +137,8 @@ def analyze_results(csv_path, spec_json_path):
         return pd.Series([result, color, spec_val])
 
     df[["Result", "Color", "Spec Value"]] = df.apply(lambda row: check_pass(row), axis=1)
+    qos_spec = spec_data[family_key].get("QoS", {})
+    df[["QoS Result", "QoS Detail"]] = df.apply(lambda row: check_qos(row, qos_spec, capacity_index), axis=1)
 
     output_path = csv_path.replace(".csv", "_analyzed.xlsx")
     df.drop(columns=["Color"]).to_excel(output_path, index=False)
@@ -122,6 +159,13 @@ def analyze_results(csv_path, spec_json_path):
             for col in range(1, ws.max_column + 1):
                 ws.cell(row=row, column=col).fill = fill_colors[color]
 
+    # QoS 結果獨立上色，不影響整列的 throughput 判定
+    qos_col = df.drop(columns=["Color"]).columns.get_loc("QoS Result") + 1
+    for row in range(2, ws.max_row + 1):
+        qos_color = {"PASS": "GREEN", "FAIL": "RED"}.get(df.loc[row - 2, "QoS Result"])
+        if qos_color:
+            ws.cell(row=row, column=qos_col).fill = fill_colors[qos_color]
+
     wb.save(output_path)
     print(f"✅ 分析報告已儲存到: {output_path}")
 
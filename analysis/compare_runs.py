@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import csv
+import glob
+import math
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analysis.fio_logs import aggregate, find_logs, load_logs
+
+# ---------- 多次 run 的統計比較 ----------
+# 以正式測試期間每秒的 bandwidth / IOPS（<device>_precondition_log/<test>/test_bw*.log）比較兩個以上的 run：
+#   1. 去掉前 warmup 秒與最後一個不完整的秒
+#   2. 平均值與差異 (%) 的 95% 信賴區間：circular block bootstrap（每秒樣本有自相關，逐點重抽會低估變異）
+#   3. 顯著性同樣由 block bootstrap 的差異分布判定（(1 - alpha) 信賴區間不含 0）；
+#      逐秒樣本不獨立，Mann-Whitney 之類假設獨立樣本的檢定會得到過小的 p-value
+# 第一個 run 為 baseline，其餘每個 run 與它比較，依差異排序輸出 regression 報告。
+DEFAULT_WARMUP_SEC = 30
+DEFAULT_BOOTSTRAP = 2000
+DEFAULT_BLOCK_SEC = 10
+DEFAULT_ALPHA = 0.05
+DEFAULT_MIN_EFFECT_PCT = 2.0
+
+REPORT_FIELDS = [
+    "Test Name", "Device", "Baseline", "Candidate", "Metric",
+    "Baseline Mean", "Baseline CI Low", "Baseline CI High",
+    "Candidate Mean", "Candidate CI Low", "Candidate CI High",
+    "Delta (%)", "Delta CI Low (%)", "Delta CI High (%)",
+    "p-value", "Baseline Samples", "Candidate Samples", "Verdict",
+]
+
+
+# ---------- 讀取每秒資料 ----------
+def load_per_second(log_files, metric="bw", warmup_sec=0):
+    """
+    合併同一個測試所有 job 的 bw log，回傳每秒總量（bw: MB/s，iops: IOPS）。
+    bw log 欄位：time (ms), bandwidth (KiB/s), direction, block size, offset；各 job、各方向同一秒的值相加。
+    warmup_sec 依時間（不是依樣本數）略過開頭，中間缺少的秒不會讓略過的範圍變長。
+    """
+    times, per_direction = aggregate(load_logs(log_files), "IOPS" if metric == "iops" else "MB/s")
+    if not per_direction:
+        return np.empty(0)
+    series = np.sum(list(per_direction.values()), axis=0)[times >= warmup_sec * 1000]
+    # 最後一秒通常不完整
+    return series[:-1] if len(series) > 1 else series
+
+
+def find_test_logs(run_folder):
+    """回傳 {(test_name, device): [bw log files]}"""
+    logs = {}
+    for device_dir in glob.glob(os.path.join(run_folder, "*_precondition_log")):
+        device = os.path.basename(device_dir)[:-len("_precondition_log")]
+        for test_dir in glob.glob(os.path.join(device_dir, "*")):
+            files = find_logs(test_dir, "test")
+            if files:
+                logs[(os.path.basename(test_dir), device)] = files
+    return logs
+
+
+# ---------- 統計 ----------
+def block_bootstrap_means(samples, n_boot=DEFAULT_BOOTSTRAP, block=DEFAULT_BLOCK_SEC, rng=None):
+    """circular block bootstrap 的平均值分布，回傳 shape (n_boot,)"""
+    rng = rng or np.random.default_rng(0)
+    n = len(samples)
+    block = max(1, min(block, n))
+    n_blocks = math.ceil(n / block)
+    starts = rng.integers(0, n, size=(n_boot, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)[None, None, :]).reshape(n_boot, -1)[:, :n] % n
+    return samples[idx].mean(axis=1)
+
+
+def confidence_interval(distribution, level=0.95):
+    tail = (1 - level) / 2 * 100
+    low, high = np.percentile(distribution, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def bootstrap_p_value(delta_boot):
+    """
+    雙尾 p-value：bootstrap 的差異分布落在 0 另一側的比例 × 2。
+    與信賴區間來自同一個 block bootstrap，已考慮每秒樣本的自相關；解析度為 1 / n_boot。
+    """
+    n_boot = len(delta_boot)
+    if n_boot == 0:
+        return None
+    tail = min(np.count_nonzero(delta_boot <= 0), np.count_nonzero(delta_boot >= 0))
+    return min(1.0, max(2 * tail, 1) / n_boot)
+
+
+def compare_series(baseline, candidate, n_boot=DEFAULT_BOOTSTRAP, block=DEFAULT_BLOCK_SEC,
+                   alpha=DEFAULT_ALPHA, min_effect_pct=DEFAULT_MIN_EFFECT_PCT, seed=0):
+    """比較兩組每秒樣本，回傳統計結果 dict（數值越大越好，例如 bandwidth / IOPS）"""
+    rng = np.random.default_rng(seed)
+    base_boot = block_bootstrap_means(baseline, n_boot, block, rng)
+    cand_boot = block_bootstrap_means(candidate, n_boot, block, rng)
+    delta_boot = (cand_boot - base_boot) / base_boot * 100
+    base_mean, cand_mean = float(baseline.mean()), float(candidate.mean())
+    delta = (cand_mean - base_mean) / base_mean * 100 if base_mean else float("nan")
+    delta_low, delta_high = confidence_interval(delta_boot)
+    p_value = bootstrap_p_value(delta_boot)
+
+    # 顯著 = 差異的 (1 - alpha) 信賴區間不包含 0
+    sig_low, sig_high = confidence_interval(delta_boot, 1 - alpha)
+    if sig_high < 0 and abs(delta) >= min_effect_pct:
+        verdict = "REGRESSION"
+    elif sig_low > 0 and abs(delta) >= min_effect_pct:
+        verdict = "IMPROVEMENT"
+    else:
+        verdict = "NO CHANGE"
+    return {
+        "baseline_mean": base_mean, "baseline_ci": confidence_interval(base_boot),
+        "candidate_mean": cand_mean, "candidate_ci": confidence_interval(cand_boot),
+        "delta_pct": delta, "delta_ci": (delta_low, delta_high),
+        "p_value": p_value, "baseline_n": len(baseline), "candidate_n": len(candidate), "verdict": verdict,
+    }
+
+
+# ---------- 報告 ----------
+def run_label(run_folder):
+    """run 名稱，可以從結果資料庫取得時加上韌體版本"""
+    run_id = os.path.basename(os.path.normpath(run_folder))
+    try:
+        from utils.results_db import DEFAULT_DB_PATH, connect
+        if os.path.exists(DEFAULT_DB_PATH):
+            conn = connect(DEFAULT_DB_PATH)
+            firmware = [r[0] for r in conn.execute(
+                "SELECT DISTINCT firmware FROM run_devices WHERE run_id = ? AND firmware IS NOT NULL", (run_id,))]
+            conn.close()
+            if firmware:
+                return f"{run_id} ({'/'.join(firmware)})"
+    except Exception:
+        pass
+    return run_id
+
+
+def compare_runs(run_folders, metric="bw", warmup_sec=DEFAULT_WARMUP_SEC, pool_devices=False, **stats_options):
+    """
+    以第一個 run 為 baseline 比較其餘 run。
+    pool_devices=True 時同一個測試的所有裝置合併成一組樣本（不同 run 的裝置名稱不同時使用）。
+    :return: 依 Delta (%) 由低到高（最嚴重的 regression 在前）排序的報告列
+    """
+    def series_by_key(run_folder):
+        result = {}
+        for (test, device), files in find_test_logs(run_folder).items():
+            samples = load_per_second(files, metric, warmup_sec)
+            if len(samples) == 0:
+                continue
+            key = (test, "ALL" if pool_devices else device)
+            result[key] = np.concatenate([result[key], samples]) if key in result else samples
+        return result
+
+    baseline_folder = run_folders[0]
+    baseline = series_by_key(baseline_folder)
+    baseline_name = run_label(baseline_folder)
+    unit = "MB/s" if metric == "bw" else "IOPS"
+    rows = []
+    for candidate_folder in run_folders[1:]:
+        candidate = series_by_key(candidate_folder)
+        candidate_name = run_label(candidate_folder)
+        for key in sorted(set(baseline) & set(candidate)):
+            stats = compare_series(baseline[key], candidate[key], **stats_options)
+            rows.append({
+                "Test Name": key[0], "Device": key[1], "Baseline": baseline_name, "Candidate": candidate_name,
+                "Metric": unit,
+                "Baseline Mean": f"{stats['baseline_mean']:.2f}",
+                "Baseline CI Low": f"{stats['baseline_ci'][0]:.2f}", "Baseline CI High": f"{stats['baseline_ci'][1]:.2f}",
+                "Candidate Mean": f"{stats['candidate_mean']:.2f}",
+                "Candidate CI Low": f"{stats['candidate_ci'][0]:.2f}", "Candidate CI High": f"{stats['candidate_ci'][1]:.2f}",
+                "Delta (%)": f"{stats['delta_pct']:.2f}",
+                "Delta CI Low (%)": f"{stats['delta_ci'][0]:.2f}", "Delta CI High (%)": f"{stats['delta_ci'][1]:.2f}",
+                "p-value": f"{stats['p_value']:.3g}" if stats["p_value"] is not None else "N/A",
+                "Baseline Samples": stats["baseline_n"], "Candidate Samples": stats["candidate_n"],
+                "Verdict": stats["verdict"],
+            })
+        missing = sorted(set(baseline) ^ set(candidate))
+        if missing:
+            print(f"⚠️ {len(missing)} test/device pairs only exist in one of {baseline_name} / {candidate_name}"
+                  f"{'' if pool_devices else ' (use --pool-devices when device names differ)'}")
+    rows.sort(key=lambda r: float(r["Delta (%)"]))
+    return rows
+
+
+def print_report(rows):
+    icons = {"REGRESSION": "❌", "IMPROVEMENT": "✅", "NO CHANGE": "➖"}
+    for row in rows:
+        print(f"{icons[row['Verdict']]} {row['Verdict']:<11} {row['Test Name']:<24} {row['Device']:<10} "
+              f"{row['Baseline Mean']:>10} → {row['Candidate Mean']:>10} {row['Metric']:<4} "
+              f"Δ {row['Delta (%)']:>7}% [{row['Delta CI Low (%)']}, {row['Delta CI High (%)']}]  p={row['p-value']}  "
+              f"({row['Candidate']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以每秒 bandwidth / IOPS 比較多次測試 run，找出統計上顯著的 regression")
+    parser.add_argument("runs", nargs="+", help="測試結果資料夾，第一個為 baseline")
+    parser.add_argument("--metric", choices=["bw", "iops"], default="bw")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP_SEC, help="略過每個測試開頭的秒數")
+    parser.add_argument("--pool-devices", action="store_true", help="同一個測試的所有裝置合併比較")
+    parser.add_argument("--bootstrap", type=int, default=DEFAULT_BOOTSTRAP, help="bootstrap 次數")
+    parser.add_argument("--block", type=int, default=DEFAULT_BLOCK_SEC, help="block bootstrap 的區塊長度（秒）")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="顯著水準")
+    parser.add_argument("--min-effect", type=float, default=DEFAULT_MIN_EFFECT_PCT, help="判定 regression 的最小差異 (%)")
+    parser.add_argument("--output", help="報告 CSV 路徑（預設存到 baseline 資料夾）")
+    args = parser.parse_args(argv)
+
+    if len(args.runs) < 2:
+        parser.error("need at least two runs to compare")
+    rows = compare_runs(args.runs, args.metric, args.warmup, args.pool_devices, n_boot=args.bootstrap,
+                        block=args.block, alpha=args.alpha, min_effect_pct=args.min_effect)
+    if not rows:
+        print("❌ No common test cases found between the runs")
+        return
+    print_report(rows)
+    output = args.output or os.path.join(args.runs[0], f"regression_report_{args.metric}.csv")
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"✅ Regression report saved: {output}")
+
+
+if __name__ == "__main__":
+    main()
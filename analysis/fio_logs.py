@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import glob
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from analysis.log_cache import cached_parse
+
+# ---------- fio log 載入 (bw / iops / lat / clat / slat) ----------
+# fio log 每行：time (ms), value, direction (0=read 1=write 2=trim), block size, offset[, priority]
+# 第三欄是 IO 方向，不是 thread；每個 job 各自一個檔案 <prefix>_<kind>.<job>.log。
+# 每個檔案只解析一次成 int64 欄位陣列，依 (job, direction) 分組，plot / compare 等分析共用。
+LOG_COLUMNS = ("time", "value", "ddir", "bs", "offset")
+DIRECTION_NAMES = {0: "read", 1: "write", 2: "trim"}
+LOG_PARSER = "fio_log"
+
+_JOB_INDEX = re.compile(r"\.(\d+)\.log$")
+
+
+def parse_log(path):
+    """解析單一 fio log，回傳 shape (rows, 5) 的 int64 陣列（欄位依 LOG_COLUMNS，缺少的欄位補 0）"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if not raw:
+        return np.zeros((0, len(LOG_COLUMNS)), dtype=np.int64)
+    first_line = raw[:raw.find(b"\n")] if b"\n" in raw else raw
+    n_columns = first_line.count(b",") + 1
+    # 逗號換成空白後由 NumPy 的 C parser 一次解析
+    values = np.fromstring(raw.replace(b",", b" "), dtype=np.float64, sep=" ")
+    if values.size % n_columns:
+        # 欄數不一致（例如檔案被截斷），改用逐行解析
+        values = np.atleast_2d(np.genfromtxt(path, delimiter=",", dtype=np.float64, invalid_raise=False,
+                                             usecols=range(min(n_columns, len(LOG_COLUMNS)))))
+        n_columns = values.shape[1]
+    data = values.reshape(-1, n_columns).astype(np.int64)
+    result = np.zeros((data.shape[0], len(LOG_COLUMNS)), dtype=np.int64)
+    used = min(n_columns, len(LOG_COLUMNS))
+    result[:, :used] = data[:, :used]
+    return result
+
+
+def log_job_index(path):
+    """.../test_bw.1_bw.3.log -> 3；沒有 job 編號時回傳 0"""
+    match = _JOB_INDEX.search(os.path.basename(path))
+    return int(match.group(1)) if match else 0
+
+
+def find_logs(log_path, prefix, kind="bw"):
+    """<prefix>*_<kind>.<job>.log，例如 test_bw.1_bw.1.log；不含同資料夾的 clat_hist log"""
+    return sorted(glob.glob(os.path.join(log_path, f"{prefix}*_{kind}.*.log")), key=lambda f: (log_job_index(f), f))
+
+
+@dataclass
+class LogSeries:
+    """單一 job、單一方向的樣本"""
+    job: int
+    ddir: int
+    source: str
+    time: np.ndarray
+    value: np.ndarray
+    bs: np.ndarray
+    offset: np.ndarray
+
+    @property
+    def direction(self):
+        return DIRECTION_NAMES.get(self.ddir, str(self.ddir))
+
+    def __len__(self):
+        return len(self.time)
+
+
+@dataclass
+class FioLogSet:
+    """一組 log（例如一個測試所有 job 的 bw log），依 (job, direction) 分組"""
+    files: list
+    series: dict = field(default_factory=dict)
+
+    @property
+    def start_ms(self):
+        starts = [s.time[0] for s in self.series.values() if len(s)]
+        return int(min(starts)) if starts else None
+
+    @property
+    def end_ms(self):
+        ends = [s.time[-1] for s in self.series.values() if len(s)]
+        return int(max(ends)) if ends else None
+
+    @property
+    def jobs(self):
+        return sorted({job for job, _ in self.series})
+
+    @property
+    def directions(self):
+        return sorted({ddir for _, ddir in self.series})
+
+    def select(self, ddir=None, job=None):
+        """回傳符合條件的 LogSeries（依 job、direction 排序）"""
+        return [self.series[key] for key in sorted(self.series)
+                if (ddir is None or key[1] == ddir) and (job is None or key[0] == job)]
+
+    def __bool__(self):
+        return any(len(s) for s in self.series.values())
+
+
+def load_logs(files, use_cache=True):
+    """解析多個 log 檔（每個只讀一次，use_cache 時沿用 .parsed/ 的快取），回傳 FioLogSet"""
+    log_set = FioLogSet(files=list(files))
+    for position, path in enumerate(log_set.files, start=1):
+        data = cached_parse(path, parse_log, LOG_PARSER, use_cache)
+        if not len(data):
+            continue
+        # 檔名沒有 job 編號時以檔案順序代替
+        job = log_job_index(path) or position
+        ddirs = data[:, 2]
+        for ddir in np.unique(ddirs):
+            rows = data[ddirs == ddir]
+            log_set.series[(job, int(ddir))] = LogSeries(job, int(ddir), path, rows[:, 0], rows[:, 1], rows[:, 3], rows[:, 4])
+    return log_set
+
+
+def load_log_folder(log_path, prefix, kind="bw", use_cache=True):
+    return load_logs(find_logs(log_path, prefix, kind), use_cache)
+
+
+# ---------- 跨 job 聚合 ----------
+# bw log 的 value 是單一 job 的 KiB/s；裝置的總量要把所有 job 對齊到同一個時間格後相加。
+DEFAULT_BIN_MS = 1000
+RATE_UNITS = ("MB/s", "IOPS", "KIOPS")
+
+
+def series_rate(series, unit="MB/s"):
+    """LogSeries 的 KiB/s 換算成 unit：MB/s (10^6 bytes)、IOPS 或 KIOPS（IO 數依每個樣本的 bs 換算）"""
+    if unit not in RATE_UNITS:
+        raise ValueError(f"Unknown rate unit: {unit}")
+    bytes_per_sec = series.value * 1024.0
+    if unit == "MB/s":
+        return bytes_per_sec / 1e6
+    iops = np.where(series.bs > 0, bytes_per_sec / np.maximum(series.bs, 1), 0.0)
+    return iops / 1000 if unit == "KIOPS" else iops
+
+
+def aggregate(log_set, unit="MB/s", bin_ms=DEFAULT_BIN_MS, start_ms=None):
+    """
+    把每個 job 的樣本對齊到最接近的 bin_ms 時間格，同一方向的各 job 相加。
+    以四捨五入而非無條件捨去歸格：fio 的 log 時間有幾 ms 的抖動，捨去會把樣本推到前一格，
+    留下一格兩個樣本、下一格沒有樣本。
+    同一格內一個 job 有多個樣本時先取平均（log_avg_msec 小於 bin_ms 或未設定時）；
+    只保留所有 (job, direction) 都有樣本的格子，job 啟動 / 結束不同步的頭尾格不會被低估。
+    :return: (times, {ddir: values})，times 為各格起點相對 start_ms（預設最早樣本）的 ms
+    """
+    selected = [series for series in log_set.select() if len(series)]
+    if not selected:
+        return np.empty(0, dtype=np.int64), {}
+    start_ms = log_set.start_ms if start_ms is None else start_ms
+    bins = [np.rint((series.time - start_ms) / bin_ms).astype(np.int64) for series in selected]
+    n_bins = int(max(b.max() for b in bins)) + 1
+    totals, complete = {}, np.ones(n_bins, dtype=bool)
+    for series, series_bins in zip(selected, bins):
+        keep = series_bins >= 0
+        counts = np.bincount(series_bins[keep], minlength=n_bins)
+        sums = np.bincount(series_bins[keep], weights=series_rate(series, unit)[keep], minlength=n_bins)
+        totals[series.ddir] = totals.get(series.ddir, 0.0) + sums / np.maximum(counts, 1)
+        complete &= counts > 0
+    times = np.flatnonzero(complete) * bin_ms
+    return times, {ddir: values[complete] for ddir, values in sorted(totals.items())}
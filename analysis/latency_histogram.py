@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+import os
+import csv
+import glob
+from dataclasses import dataclass
+
+import numpy as np
+
+from analysis.log_cache import cached_parse
+
+# ---------- fio latency histogram log (--write_hist_log) ----------
+# 每一行：time (ms), direction (0=read 1=write 2=trim), block size, bin0, bin1, ...
+# 每一行的 bins 是該 log_hist_msec 期間完成的 IO 的 completion latency 直方圖（ns），不是累計值。
+# bin index -> latency 的換算與 fio 的 plat_idx_to_val() / tools/hist/fiologparser_hist.py 相同。
+FIO_IO_U_PLAT_BITS = 6
+FIO_IO_U_PLAT_VAL = 1 << FIO_IO_U_PLAT_BITS
+FIO_IO_U_PLAT_GROUP_NR = 29   # fio 3.x（ns 單位），最大 bin 約 2^34 ns ≈ 17 s
+FIO_IO_U_PLAT_NR = FIO_IO_U_PLAT_GROUP_NR * FIO_IO_U_PLAT_VAL   # 1856 欄（log_hist_coarseness=0）
+HIST_NON_BIN_COLUMNS = 3
+
+QOS_PERCENTILES = (99.0, 99.9, 99.99, 99.9999)
+DIRECTIONS = {0: "Read", 1: "Write", 2: "Trim"}
+HIST_PARSER = "fio_hist_log_u32"
+
+
+def plat_idx_to_val(idx, edge=0.5):
+    """
+    fio plat_idx_to_val() 的向量化版本：bin index (ndarray) -> latency (ns)。
+    edge=0.5 取 bin 中點，0.0 / 1.0 取下緣 / 上緣。
+    """
+    idx = np.asarray(idx, dtype=np.int64)
+    error_bits = np.maximum((idx >> FIO_IO_U_PLAT_BITS) - 1, 0)
+    base = np.left_shift(1, error_bits + FIO_IO_U_PLAT_BITS, dtype=np.int64)
+    k = idx % FIO_IO_U_PLAT_VAL
+    values = base + (k + edge) * np.left_shift(1, error_bits, dtype=np.int64)
+    # 前兩個 group 每個 bin 即為精確值
+    return np.where(idx < (FIO_IO_U_PLAT_VAL << 1), idx.astype(np.float64), values)
+
+
+def bin_latencies(n_bins, edge=0.5):
+    """依 hist log 的欄數推算 log_hist_coarseness，回傳每個 bin 的代表 latency (ns)"""
+    stride = FIO_IO_U_PLAT_NR // n_bins
+    if stride < 1 or stride * n_bins != FIO_IO_U_PLAT_NR or stride & (stride - 1):
+        raise ValueError(f"Unexpected histogram width {n_bins} (expected {FIO_IO_U_PLAT_NR} >> coarseness)")
+    idx = np.arange(n_bins, dtype=np.int64) * stride
+    if stride == 1:
+        return plat_idx_to_val(idx, edge)
+    lower = plat_idx_to_val(idx, 0.0)
+    upper = plat_idx_to_val(idx + stride, 1.0)
+    return lower + (upper - lower) * edge
+
+
+def hist_log_dtype(n_bins):
+    """
+    hist log 一行的 structured dtype。bin 的計數是單一 log_hist_msec 區間內落在該 bin 的 IO 數，
+    uint32 綽綽有餘；時間是 Unix epoch (ms)，需要 int64。整份 log 的記憶體約為全部用 int64 的一半。
+    """
+    return np.dtype([("time", np.int64), ("direction", np.uint8), ("bs", np.uint32), ("bins", np.uint32, (n_bins,))])
+
+
+def parse_hist_log(hist_file):
+    with open(hist_file, "r") as f:
+        first_line = f.readline()
+    if not first_line.strip():
+        return np.empty(0, hist_log_dtype(FIO_IO_U_PLAT_NR))
+    n_bins = first_line.count(",") + 1 - HIST_NON_BIN_COLUMNS
+    return np.loadtxt(hist_file, delimiter=",", dtype=hist_log_dtype(n_bins), ndmin=1)
+
+
+def load_hist_log(hist_file, use_cache=True):
+    """讀取單一 hist log，回傳 (time_ms, direction, counts[rows, bins])；counts 為 uint32"""
+    data = cached_parse(hist_file, parse_hist_log, HIST_PARSER, use_cache)
+    return data["time"], data["direction"], data["bins"]
+
+
+@dataclass
+class LatencyHistogram:
+    """合併後的直方圖時間序列：counts[window, bin]，window i 涵蓋 [start_ms + i*interval_ms, +interval_ms)"""
+    start_ms: int
+    interval_ms: int
+    counts: np.ndarray
+    latencies_ns: np.ndarray
+
+    @property
+    def total(self):
+        return self.counts.sum(axis=0, dtype=np.int64)
+
+    @property
+    def samples(self):
+        return int(self.counts.sum(dtype=np.int64))
+
+
+def merge_hist_logs(hist_files, direction=None, interval_ms=1000):
+    """
+    把一個測試所有 job 的 hist log 合併成每個時間區間一份直方圖。
+    各 job 的 log 時間點不會完全對齊，以 floor((t - 起點) / interval) 歸入區間（不做跨區間比例分配）。
+    :param direction: 0=read / 1=write / 2=trim；None 表示全部方向
+    :return: LatencyHistogram；沒有資料時回傳 None
+    """
+    sums = accumulate_hist_logs(hist_files, (direction,), interval_ms, per_window=True)
+    if direction not in sums.windows:
+        return None
+    return LatencyHistogram(sums.start_ms, interval_ms, sums.windows[direction], sums.latencies_ns)
+
+
+@dataclass
+class HistogramSums:
+    """accumulate_hist_logs() 的結果：每個方向整個測試的總和，以及（per_window 時）每個區間的直方圖"""
+    start_ms: int
+    latencies_ns: np.ndarray
+    totals: dict    # {direction: counts[bins] (int64)}
+    windows: dict   # {direction: counts[window, bins] (uint32)}；per_window=False 時為空
+
+
+def _hist_start_ms(hist_files):
+    """fio 依時間順序寫 hist log，每個檔案只讀第一行就能得到所有 log 的起點；區間結束時間減 1ms"""
+    starts = []
+    for hist_file in hist_files:
+        with open(hist_file, "r") as f:
+            first_field = f.readline().split(",", 1)[0].strip()
+        if first_field:
+            starts.append(int(first_field))
+    return min(starts) - 1 if starts else None
+
+
+def _add_windows(counts, windows, rows):
+    """把 rows 依 window 加到 counts[window]；counts 不夠長時加倍擴充，回傳（可能是新的）counts"""
+    order = np.argsort(windows, kind="stable")
+    windows, rows = windows[order], rows[order]
+    needed = int(windows[-1]) + 1
+    if needed > len(counts):
+        grown = np.zeros((max(needed, 2 * len(counts)), rows.shape[1]), dtype=np.uint32)
+        grown[:len(counts)] = counts
+        counts = grown
+    # 同一區間的多行先用 reduceat 加總，再一次加到對應的 window
+    boundaries = np.flatnonzero(np.r_[True, windows[1:] != windows[:-1]])
+    counts[windows[boundaries]] += np.add.reduceat(rows, boundaries, axis=0, dtype=np.uint32)
+    return counts
+
+
+def accumulate_hist_logs(hist_files, directions, interval_ms=1000, per_window=False):
+    """
+    逐一讀取 hist log 並累加到每個方向的總和，同一時間只有一個檔案的資料在記憶體中。
+    per_window=True 時另外累加每個區間的直方圖（windows × bins，只在需要區間百分位時建立）。
+    :param directions: 要統計的方向，例如 (0, 1, 2)；None 表示不分方向
+    :return: HistogramSums；沒有任何資料時 start_ms 為 None
+    """
+    start_ms = _hist_start_ms(hist_files)
+    n_bins = None
+    totals, windows, used = {}, {}, {}
+    for hist_file in hist_files:
+        times, log_directions, rows = load_hist_log(hist_file)
+        if not len(times):
+            continue
+        if n_bins is None:
+            n_bins = rows.shape[1]
+        elif rows.shape[1] != n_bins:
+            raise ValueError("Histogram logs have different widths (mixed log_hist_coarseness)")
+        for direction in directions:
+            mask = slice(None) if direction is None else log_directions == direction
+            selected = rows[mask]
+            if not len(selected):
+                continue
+            totals[direction] = totals.get(direction, 0) + selected.sum(axis=0, dtype=np.int64)
+            if per_window:
+                # 起點取自每個檔案的第一行；萬一 log 沒有依時間排序，較早的行歸入第一個區間
+                window_index = np.maximum((times[mask] - 1 - start_ms) // interval_ms, 0)
+                counts = windows.get(direction, np.zeros((0, n_bins), dtype=np.uint32))
+                windows[direction] = _add_windows(counts, window_index, selected)
+                used[direction] = max(used.get(direction, 0), int(window_index.max()) + 1)
+    latencies = bin_latencies(n_bins) if n_bins else np.empty(0)
+    # 去掉加倍擴充時多出來、不屬於任何區間的列
+    windows = {direction: counts[:used[direction]] for direction, counts in windows.items()}
+    return HistogramSums(start_ms if n_bins else None, latencies, totals, windows)
+
+
+def histogram_percentiles(counts, latencies_ns, percentiles=QOS_PERCENTILES):
+    """
+    由直方圖計算百分位（ns）。counts 可以是單一直方圖 (bins,) 或 (windows, bins)；
+    回傳 shape 為 (..., len(percentiles))，沒有樣本的區間為 NaN。
+    """
+    counts = np.atleast_2d(counts)
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1]
+    result = np.full((counts.shape[0], len(percentiles)), np.nan)
+    for i, p in enumerate(percentiles):
+        # 第一個累計數 >= p% 樣本數的 bin；樣本數取整數，避免 99.9 / 100 的浮點誤差多算一個樣本
+        rank = np.ceil(total * (p / 100.0) - 1e-9)
+        idx = (cumulative < rank[:, None]).sum(axis=1)
+        valid = total > 0
+        result[valid, i] = latencies_ns[np.minimum(idx[valid], len(latencies_ns) - 1)]
+    return result
+
+
+def percentile_label(p):
+    return f"p{p:g}"
+
+
+def find_hist_logs(log_path, prefix="test"):
+    """fio 依 job 編號產生 <prefix>_clat_hist.<N>.log"""
+    return sorted(glob.glob(os.path.join(log_path, f"{prefix}_clat_hist.*.log")))
+
+
+def summarize_hist_logs(hist_files, percentiles=QOS_PERCENTILES, interval_ms=1000, interval_csv=None):
+    """
+    計算每個方向整個測試的 QoS 百分位 (us)：{"Read": {"p99": 85.2, ...}, "Write": {...}}。
+    interval_csv 不為 None 時另外寫出每個區間的百分位。
+    """
+    # 每個檔案只讀一次，三個方向共用；只有要輸出區間百分位時才建立 windows × bins 的矩陣
+    sums = accumulate_hist_logs(hist_files, tuple(DIRECTIONS), interval_ms, per_window=bool(interval_csv))
+    summary = {}
+    interval_rows = []
+    for direction, name in DIRECTIONS.items():
+        total = sums.totals.get(direction)
+        if total is None or not total.any():
+            continue
+        overall = histogram_percentiles(total, sums.latencies_ns, percentiles)[0] / 1000.0
+        summary[name] = {percentile_label(p): float(v) for p, v in zip(percentiles, overall)}
+        if interval_csv:
+            counts = sums.windows[direction]
+            per_window = histogram_percentiles(counts, sums.latencies_ns, percentiles) / 1000.0
+            window_samples = counts.sum(axis=1, dtype=np.int64)
+            for i in np.flatnonzero(window_samples):
+                row = {"time_ms": sums.start_ms + (i + 1) * interval_ms, "direction": name,
+                       "samples": int(window_samples[i])}
+                row.update({percentile_label(p): f"{v:.2f}" for p, v in zip(percentiles, per_window[i])})
+                interval_rows.append(row)
+
+    if interval_csv and interval_rows:
+        with open(interval_csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["time_ms", "direction", "samples"] + [percentile_label(p) for p in percentiles])
+            writer.writeheader()
+            writer.writerows(sorted(interval_rows, key=lambda r: (r["time_ms"], r["direction"])))
+    return summary
+
+
+def qos_columns(summary, percentiles=QOS_PERCENTILES):
+    """summarize_hist_logs() 的結果 -> CSV 欄位 "Read QoS p99 (us)" ...；沒有資料時為 N/A"""
+    columns = {}
+    for name in ("Read", "Write"):
+        values = (summary or {}).get(name, {})
+        for p in percentiles:
+            label = percentile_label(p)
+            value = values.get(label)
+            columns[f"{name} QoS {label} (us)"] = f"{value:.2f}" if value is not None else "N/A"
+    return columns
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# ---------- 解析結果快取 ----------
+# 原始 log 解析後的陣列存成同資料夾 .parsed/<檔名>.npz（壓縮欄位格式），並記錄來源檔的 size 與 mtime_ns；
+# 兩者都與來源相符才使用快取，否則重新解析並覆寫。放在子資料夾，不會被 <prefix>_*.log 的 glob 掃到。
+CACHE_DIRNAME = ".parsed"
+CACHE_FORMAT_VERSION = 1
+
+# fio 產生的 log：<prefix>_<kind>.<job>.log
+_BW_STYLE_LOG = re.compile(r"_(bw|iops|lat|clat|slat)\.\d+\.log$")
+_HIST_LOG = re.compile(r"_clat_hist\.\d+\.log$")
+
+
+def cache_path(source):
+    return os.path.join(os.path.dirname(source), CACHE_DIRNAME, os.path.basename(source) + ".npz")
+
+
+def _source_stamp(source):
+    st = os.stat(source)
+    return st.st_size, st.st_mtime_ns
+
+
+def _read_cache(source, parser_name, stamp):
+    sidecar = cache_path(source)
+    if not os.path.exists(sidecar):
+        return None
+    try:
+        with np.load(sidecar, allow_pickle=False) as cached:
+            if (int(cached["version"]) != CACHE_FORMAT_VERSION or str(cached["parser"]) != parser_name
+                    or (int(cached["size"]), int(cached["mtime_ns"])) != stamp):
+                return None
+            return cached["data"]
+    except (OSError, ValueError, KeyError):
+        # 寫到一半或格式不符的 sidecar 當作沒有快取
+        return None
+
+
+def _write_cache(source, parser_name, stamp, data):
+    sidecar = cache_path(source)
+    tmp_file = f"{sidecar}.{os.getpid()}.tmp.npz"
+    try:
+        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+        np.savez_compressed(tmp_file, data=data, version=CACHE_FORMAT_VERSION, parser=parser_name,
+                            size=stamp[0], mtime_ns=stamp[1])
+        os.replace(tmp_file, sidecar)
+    except OSError as e:
+        # 唯讀的結果資料夾：只是沒有快取，不影響分析
+        print(f"⚠️ Cannot write parse cache {sidecar}: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def cached_parse(source, parser, parser_name, use_cache=True):
+    """
+    回傳 parser(source) 的結果（ndarray）；快取命中時直接讀 sidecar，未命中時解析後寫入。
+    parser_name 區分不同的解析方式，換 parser 時舊的 sidecar 自動失效。
+    """
+    if not use_cache:
+        return parser(source)
+    stamp = _source_stamp(source)
+    data = _read_cache(source, parser_name, stamp)
+    if data is None:
+        data = parser(source)
+        _write_cache(source, parser_name, stamp, data)
+    return data
+
+
+# ---------- 預先建立 / 清除 ----------
+def _parser_for(source):
+    """依檔名選擇解析方式：(parser, parser_name)；不是 fio log 時回傳 None"""
+    name = os.path.basename(source)
+    if _HIST_LOG.search(name):
+        from analysis.latency_histogram import parse_hist_log, HIST_PARSER
+        return parse_hist_log, HIST_PARSER
+    if _BW_STYLE_LOG.search(name):
+        from analysis.fio_logs import parse_log, LOG_PARSER
+        return parse_log, LOG_PARSER
+    return None
+
+
+def find_cacheable_logs(folder):
+    logs = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [d for d in dirs if d != CACHE_DIRNAME]
+        logs.extend(os.path.join(root, f) for f in sorted(files) if _parser_for(f))
+    return logs
+
+
+def build_cache(folder):
+    """解析 folder 下所有 fio log 並寫入快取，回傳 (新解析, 已是最新)"""
+    built = fresh = 0
+    for source in find_cacheable_logs(folder):
+        parser, parser_name = _parser_for(source)
+        if _read_cache(source, parser_name, _source_stamp(source)) is not None:
+            fresh += 1
+            continue
+        cached_parse(source, parser, parser_name)
+        built += 1
+    return built, fresh
+
+
+def prune_cache(folder, remove_all=False):
+    """刪除來源已不存在或已變更的 sidecar（remove_all=True 時全部刪除），回傳刪除數量"""
+    removed = 0
+    for root, dirs, files in os.walk(folder):
+        if os.path.basename(root) != CACHE_DIRNAME:
+            continue
+        for name in files:
+            sidecar = os.path.join(root, name)
+            source = os.path.join(os.path.dirname(root), name[:-len(".npz")]) if name.endswith(".npz") else None
+            stale = remove_all or source is None or not os.path.exists(source) or _parser_for(source) is None
+            if not stale:
+                parser_name = _parser_for(source)[1]
+                stale = _read_cache(source, parser_name, _source_stamp(source)) is None
+            if stale:
+                os.remove(sidecar)
+                removed += 1
+        if not os.listdir(root):
+            os.rmdir(root)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="預先建立或清除 fio log 的解析快取 (.parsed/*.npz)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="解析資料夾下所有 fio log 並寫入快取")
+    build.add_argument("folder", help="測試結果資料夾")
+    prune = sub.add_parser("prune", help="刪除來源已不存在或已變更的快取")
+    prune.add_argument("folder", help="測試結果資料夾")
+    prune.add_argument("--all", action="store_true", help="刪除所有快取")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        built, fresh = build_cache(args.folder)
+        print(f"✅ Parse cache under {args.folder}: {built} built, {fresh} already up to date")
+    else:
+        removed = prune_cache(args.folder, args.all)
+        print(f"🧹 Removed {removed} cache file(s) under {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,31 @@
 
 import os
 import re
+import sys
+import csv
 import json
+import argparse
+import matplotlib
+matplotlib.use("Agg")  # 無 display 的 server 與 worker process 都用同一個 headless backend
 import matplotlib.pyplot as plt
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from matplotlib.ticker import FuncFormatter
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analysis.fio_logs import DIRECTION_NAMES, aggregate, find_logs, load_logs
+
 # ========== SPEC 路徑設定 ==========
 BASE_PATH = "/root/Solidigm_Performance_Testing_Tool"
 SPEC_FOLDER = os.path.join(BASE_PATH, "spec_reference")
 FAMILY_MAPPING_FILE = os.path.join(SPEC_FOLDER, "family_mapping.json")
 
+# ========== 繪圖設定 ==========
+# 圖寬 16 in × 100 dpi = 1600 個像素欄；每欄只保留 min / max 兩點，線條外形（含掉速尖峰）與原始資料相同
+PLOT_PIXEL_COLUMNS = 1600
+DEFAULT_PLOT_WORKERS = min(8, os.cpu_count() or 1)
+
 def find_latest_test_folder(base_path=BASE_PATH):
     test_folders = [
         folder for folder in os.listdir(base_path)
@@ -40,7 +54,7 @@ def get_spec_json_path_by_product(product_name):
     return os.path.join(SPEC_FOLDER, mapping.get(model_prefix, ""))
 
 def get_spec_value(spec_path, model_key, metric_name, capacity):
-    if not os.path.exists(spec_path):
+    if not spec_path or not os.path.exists(spec_path):
         return None
     with open(spec_path, "r") as f:
         spec_data = json.load(f)
@@ -56,36 +70,107 @@ def get_spec_value(spec_path, model_key, metric_name, capacity):
     if min_diff > 0.5:
         return None
     idx = cap_diffs.index(min_diff)
-    return spec_data[model_key].get(metric_name, [])[idx]
+    values = spec_data[model_key].get(metric_name, [])
+    return values[idx] if idx < len(values) else None
 
 def infer_metric_from_logname(log_path):
+    # 資料夾名稱即 test case 名稱，例如 4KB_Random_Read、16KB_RandRW_70R_30W、128KB_Seq_Write
     name = os.path.basename(log_path).lower()
-    if "128kb_seq_read" in name:
-        return "128KB Seq Read (MB/s)"
-    elif "128kb_seq_write" in name:
-        return "128KB Seq Write (MB/s)"
-    elif "16kb_randrw" in name or "70r_30w" in name:
-        return "16KB Random Mixed 70/30 RR/RW (KIOPs)"
-    elif "16kb_randr" in name:
-        return "16KB Random Read (KIOPs)"
-    elif "16kb_randw" in name:
-        return "16KB Random Write (KIOPs)"
-    elif "4kb_randrw" in name:
-        return "4KB Random Mixed 70/30 RR/RW (KIOPs)"
-    elif "4kb_randr" in name:
-        return "4KB Random Read (KIOPs)"
-    elif "4kb_randw" in name:
-        return "4KB Random Write (KIOPs)"
+    match = re.match(r"(\d+)kb_", name)
+    if not match:
+        return None
+    size = f"{match.group(1)}KB"
+    if "seq_read" in name:
+        return f"{size} Seq Read (MB/s)"
+    elif "seq_write" in name:
+        return f"{size} Seq Write (MB/s)"
+    elif "randrw" in name or "70r_30w" in name:
+        return f"{size} Random Mixed 70/30 RR/RW (KIOPs)"
+    elif "random_read" in name or "randr" in name:
+        return f"{size} Random Read (KIOPs)"
+    elif "random_write" in name or "randw" in name:
+        return f"{size} Random Write (KIOPs)"
     return None
 
-def plot_bw_log(log_path, output_folder, product_name, prefix):
-    txt_files = sorted([
-        f for f in os.listdir(log_path)
-        if f.startswith(prefix) and f.endswith(".log")
-    ])
-    if not txt_files:
+def load_smart_series(log_path, prefix):
+    """讀取 scripts/smart_sampler.py 產生的 smart_<prefix>.csv；不存在時回傳 None"""
+    smart_file = os.path.join(log_path, f"smart_{prefix}.csv")
+    if not os.path.exists(smart_file):
+        return None
+    rows = []
+    with open(smart_file, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                rows.append({k: int(v) for k, v in row.items() if v not in (None, "")})
+            except ValueError:
+                continue
+    return [row for row in rows if "time_ms" in row] or None
+
+def throttle_intervals(smart_rows):
+    """回傳溫度節流期間 [(start_ms, end_ms)]：兩次取樣間 thermal throttle / warning 時間有增加的區段"""
+    counters = ("thm_temp1_total_time", "thm_temp2_total_time", "warning_temp_time", "critical_comp_time")
+    intervals = []
+    for prev, cur in zip(smart_rows, smart_rows[1:]):
+        if any(cur.get(c, 0) > prev.get(c, 0) for c in counters):
+            if intervals and intervals[-1][1] == prev["time_ms"]:
+                intervals[-1] = (intervals[-1][0], cur["time_ms"])
+            else:
+                intervals.append((prev["time_ms"], cur["time_ms"]))
+    return intervals
+
+def plot_temperature_overlay(ax, smart_rows, global_start):
+    """在 bandwidth 圖上以右側 y 軸疊上溫度，並標出 thermal throttling 區段"""
+    times = [(row["time_ms"] - global_start) / 1000 for row in smart_rows if "temperature_c" in row]
+    temps = [row["temperature_c"] for row in smart_rows if "temperature_c" in row]
+    ax2 = ax.twinx()
+    ax2.plot(times, temps, color='darkorange', linestyle=':', linewidth=1.2, label='Composite Temperature (°C)')
+    ax2.set_ylabel("Temperature (°C)")
+    for i, (start, end) in enumerate(throttle_intervals(smart_rows)):
+        ax.axvspan((start - global_start) / 1000, (end - global_start) / 1000, color='red', alpha=0.15,
+                   label="Thermal Throttling" if i == 0 else None)
+    return ax2
+
+def decimate_minmax(x, y, columns=PLOT_PIXEL_COLUMNS):
+    """
+    min / max envelope 降取樣：樣本依序切成 columns 段，每段保留最小與最大值的點（保持原順序）。
+    樣本數不超過 2 × columns 時原樣回傳。
+    """
+    n = len(y)
+    if n <= 2 * columns:
+        return x, y
+    size = -(-n // columns)
+    # 補齊成 columns × size；補的值與最後一點相同，索引超出時夾回 n - 1 不影響結果
+    padded = np.pad(y, (0, size * columns - n), mode="edge").reshape(columns, size)
+    base = np.arange(columns) * size
+    keep = np.concatenate([base + padded.argmin(axis=1), base + padded.argmax(axis=1), [0, n - 1]])
+    keep = np.unique(np.minimum(keep, n - 1))
+    return x[keep], y[keep]
+
+def merged_plot_path(log_path, output_folder, prefix):
+    return os.path.join(output_folder, f"{os.path.basename(log_path)}_{prefix.lower()}merged_plot.png")
+
+def is_up_to_date(out_file, inputs):
+    """圖檔存在且比所有輸入檔（bw log、SMART CSV）新時不需要重畫"""
+    if not os.path.exists(out_file):
+        return False
+    newest_input = max((os.path.getmtime(f) for f in inputs if os.path.exists(f)), default=0)
+    return os.path.getmtime(out_file) >= newest_input
+
+def plot_bw_log(log_path, output_folder, product_name, prefix, force=False):
+    """畫出 <prefix> 的合併圖；回傳圖檔路徑（沒有資料時回傳 None）。force=False 時 log 沒有更新就略過"""
+    # 只取 bandwidth log（<prefix>_bw.1_bw.N.log），略過同資料夾的 latency 直方圖 (<prefix>_clat_hist.N.log)
+    files = find_logs(log_path, prefix)
+    if not files:
         print(f"⚠️ No folders found with prefix '{prefix}' under {log_path}")
-        return
+        return None
+
+    out_file = merged_plot_path(log_path, output_folder, prefix)
+    if not force and is_up_to_date(out_file, files + [os.path.join(log_path, f"smart_{prefix}.csv")]):
+        print(f"⏭️ Logs unchanged since last render, skipping: {out_file}")
+        return out_file
+
+    # 每個檔案只解析一次，依 (job, direction) 分組
+    log_set = load_logs(files)
 
     model_key = "-".join(product_name.split("-")[:2])
     capacity = next((part for part in product_name.split("-") if re.match(r"\d+\.\d+TB", part)), None)
@@ -95,76 +180,52 @@ def plot_bw_log(log_path, output_folder, product_name, prefix):
 
     spec_path = get_spec_json_path_by_product(product_name)
     subfolder_name = os.path.basename(log_path).lower()
+    # 各 job 對齊到同一秒相加，才是裝置的總量；單位依 spec metric（KIOPs 或 MB/s）
+    metric = infer_metric_from_logname(log_path)
+    unit = "KIOPS" if metric and metric.endswith("(KIOPs)") else "MB/s"
+    global_start = log_set.start_ms
+    all_times, per_direction = aggregate(log_set, unit)
+    all_times = all_times // 1000  # x 軸以秒為單位
+    if not all_times.size:
+        print(f"⚠️ No valid data found for merged plot in {log_path}")
+        return None
+
+    all_values = np.sum(list(per_direction.values()), axis=0)
+    jobs = len(log_set.jobs)
+    print(f"🔍 Aggregating {jobs} job(s), directions: "
+          f"{', '.join(DIRECTION_NAMES.get(d, str(d)) for d in per_direction)} in {log_path}")
     plt.figure(figsize=(16, 6))
     ax = plt.gca()
     ax.set_facecolor('white')
     ax.figure.set_facecolor('white')
     ax.ticklabel_format(style='plain', axis='y')  # 👈 關掉 y 軸科學記號
 
-    all_times, all_bws_mb = [], []
-    available_threads = set()
-    for txt in txt_files:
-        with open(os.path.join(log_path, txt), "r") as f:
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) >= 3:
-                    try:
-                        available_threads.add(int(parts[2]))
-                    except:
-                        continue
-
-    if not available_threads:
-        print(f"❌ No valid thread info found in {log_path}")
-        return
+    if len(per_direction) > 1:
+        for ddir, values in per_direction.items():
+            plt.plot(*decimate_minmax(all_times, values), linewidth=0.8,
+                     label=f"{DIRECTION_NAMES.get(ddir, str(ddir)).capitalize()} ({unit})")
+    plt.plot(*decimate_minmax(all_times, all_values), color='black', linewidth=1.0,
+             label=f"Total of {jobs} job(s) ({unit})")
 
-    selected_thread = 0 if 0 in available_threads else min(available_threads)
-    print(f"🔍 Using thread {selected_thread} in {log_path}")
-
-    global_start = None
-    for txt in txt_files:
-        with open(os.path.join(log_path, txt), "r") as f:
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) < 3 or int(parts[2]) != selected_thread:
-                    continue
-                t = int(parts[0])
-                if global_start is None or t < global_start:
-                    global_start = t
-
-    for txt in txt_files:
-        filepath = os.path.join(log_path, txt)
-        times, bws_mb = [], []
-        with open(filepath, "r") as f:
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) < 3 or int(parts[2]) != selected_thread:
-                    continue
-                t = int(parts[0]) - global_start
-                bw = int(parts[1])
-                times.append(t)
-                bws_mb.append(bw)
-        if times:
-            all_times.extend(times)
-            all_bws_mb.extend(bws_mb)
-            plt.plot(times, bws_mb, label=txt, linewidth=0.8)
-
-    if not all_times:
-        print(f"⚠️ No valid data found for merged plot in {log_path}")
-        return
+    # SMART 時間與 bw log 同為 Unix epoch (ms)（fio --log_unix_epoch=1），扣掉同一個起點即可對齊
+    smart_rows = load_smart_series(log_path, prefix)
+    ax2 = None
+    if smart_rows and global_start > 1e12:
+        ax2 = plot_temperature_overlay(ax, smart_rows, global_start)
+        plt.sca(ax)
 
-    metric = infer_metric_from_logname(log_path)
     if metric:
         spec_val = get_spec_value(spec_path, model_key, metric, capacity)
         print(f"📌 spec_val: {spec_val}")
         if spec_val:
             plt.axhline(spec_val, color='blue', linestyle='-', linewidth=1,
-                        label=f'SPEC: {spec_val} MB/s')
+                        label=f'SPEC: {spec_val} {unit}')
             if "rand" in subfolder_name:
                 lower, upper = spec_val * 0.9, spec_val * 1.1
                 plt.axhspan(lower, upper, color='green', alpha=0.2, label="SPEC ±10% Range")
-                avg_bw = np.mean(all_bws_mb)
-                plt.axhline(avg_bw, color='red', linestyle='--', linewidth=1,
-                            label=f'Avg Bandwidth: {avg_bw:.2f} MB/s')
+                avg_value = np.mean(all_values)
+                plt.axhline(avg_value, color='red', linestyle='--', linewidth=1,
+                            label=f'Avg: {avg_value:.2f} {unit}')
 
     max_time = max(all_times)
     tick_count = 20
@@ -175,31 +236,61 @@ def plot_bw_log(log_path, output_folder, product_name, prefix):
     ax.set_xlim(left=0)  # ✅ 加上這行解決 X 軸 0 空格問題
     plt.xticks(rotation=45)
 
-    plt.title(f"{prefix.capitalize()} Bandwidth - {os.path.basename(log_path)}")
+    quantity = "IOPS" if unit == "KIOPS" else "Bandwidth"
+    plt.title(f"{prefix.capitalize()} {quantity} - {os.path.basename(log_path)}")
     plt.xlabel("Time (Seconds)")
-    plt.ylabel("Bandwidth (MB/s)")
+    plt.ylabel(f"{quantity} ({unit})")
     plt.grid(True, linestyle='--', linewidth=0.5)
-    plt.legend()
+    handles, labels = ax.get_legend_handles_labels()
+    if ax2 is not None:
+        extra_handles, extra_labels = ax2.get_legend_handles_labels()
+        handles, labels = handles + extra_handles, labels + extra_labels
+    ax.legend(handles, labels)
     plt.tight_layout()
-    out_file = os.path.join(output_folder, f"{os.path.basename(log_path)}_{prefix.lower()}merged_plot.png")
     plt.savefig(out_file)
     print(f"✅ Merged plot saved: {out_file}")
     plt.close()
+    return out_file
 
-def main():
-    latest_folder = find_latest_test_folder()
-    if not latest_folder:
-        return
-    product_name = os.path.basename(latest_folder).replace("_TestResults_", "")
-    for device_folder in os.listdir(latest_folder):
-        device_path = os.path.join(latest_folder, device_folder)
+def find_plot_jobs(test_folder):
+    """回傳 [(log_path, prefix)]：每個 <device>_precondition_log/<test> 資料夾的 precondition 與 test 圖"""
+    jobs = []
+    for device_folder in sorted(os.listdir(test_folder)):
+        device_path = os.path.join(test_folder, device_folder)
         if os.path.isdir(device_path) and device_folder.endswith("_precondition_log"):
-            for test_type_folder in os.listdir(device_path):
+            for test_type_folder in sorted(os.listdir(device_path)):
                 log_path = os.path.join(device_path, test_type_folder)
                 if os.path.isdir(log_path):
-                    print(f"📊 Plotting precondition + test logs in: {log_path}")
-                    plot_bw_log(log_path, log_path, product_name, "precondition")
-                    plot_bw_log(log_path, log_path, product_name, "test")
+                    jobs.extend((log_path, prefix) for prefix in ("precondition", "test"))
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="畫出 precondition / test 的 bandwidth 合併圖")
+    parser.add_argument("folder", nargs="?", help="測試結果資料夾（預設為最新的一個）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_PLOT_WORKERS, help="平行繪圖的 process 數")
+    parser.add_argument("--force", action="store_true", help="log 沒有更新也重畫")
+    args = parser.parse_args(argv)
+
+    latest_folder = args.folder or find_latest_test_folder()
+    if not latest_folder:
+        return
+    product_name = os.path.basename(latest_folder).replace("_TestResults_", "")
+    jobs = find_plot_jobs(latest_folder)
+    print(f"📊 Plotting {len(jobs)} precondition + test logs under {latest_folder} ({args.workers} workers)")
+    if args.workers <= 1:
+        for log_path, prefix in jobs:
+            plot_bw_log(log_path, log_path, product_name, prefix, args.force)
+        return
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(plot_bw_log, log_path, log_path, product_name, prefix, args.force): (log_path, prefix)
+                   for log_path, prefix in jobs}
+        for future in as_completed(futures):
+            log_path, prefix = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Plotting {prefix} logs in {log_path} failed: {e}")
 
 if __name__ == "__main__":
     main()
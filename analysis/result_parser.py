@@ -2,6 +2,13 @@
 import re
 import os 
 import csv
+import json
+import socket
+import threading
+from dataclasses import dataclass, field
+
+# fio percentile_list，涵蓋 spec 常見的 QoS 百分位
+FIO_PERCENTILE_LIST = "50:90:99:99.9:99.99:99.9999"
 
 # 測試結果輸出            
 # 取得測試結果 CSV 檔案名稱
@@ -56,13 +63,400 @@ def parse_fio_output(output):
     return f"{total_bw:.2f}MB/s", total_iops, runtime
 
 
+# ---------- fio JSON 結果模型 ----------
+@dataclass
+class FioLatency:
+    """單一方向的 latency 統計（單位: ns），bins 來自 json+ 的完整直方圖"""
+    min_ns: float = 0.0
+    max_ns: float = 0.0
+    mean_ns: float = 0.0
+    stddev_ns: float = 0.0
+    samples: int = 0
+    percentiles: dict = field(default_factory=dict)
+    bins: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_json(cls, data):
+        if not data:
+            return cls()
+        return cls(
+            min_ns=float(data.get("min", 0)),
+            max_ns=float(data.get("max", 0)),
+            mean_ns=float(data.get("mean", 0)),
+            stddev_ns=float(data.get("stddev", 0)),
+            samples=int(data.get("N", 0)),
+            percentiles={float(k): float(v) for k, v in data.get("percentile", {}).items()},
+            bins={int(k): int(v) for k, v in data.get("bins", {}).items()},
+        )
+
+    def percentile(self, pct):
+        """
+        取得百分位 latency (ns)。優先使用 json+ bins 計算，沒有 bins 才查 fio 的 percentile 表。
+        """
+        if self.bins:
+            total = sum(self.bins.values())
+            target = total * pct / 100.0
+            running = 0
+            for value in sorted(self.bins):
+                running += self.bins[value]
+                if running >= target:
+                    return float(value)
+            return float(max(self.bins))
+        for key, value in self.percentiles.items():
+            if abs(key - pct) < 1e-6:
+                return value
+        return None
+
+
+@dataclass
+class FioDirection:
+    """單一方向 (read / write / trim) 的 fio 統計"""
+    io_bytes: int = 0
+    bw_bytes: float = 0.0
+    iops: float = 0.0
+    runtime_ms: int = 0
+    total_ios: int = 0
+    slat: FioLatency = field(default_factory=FioLatency)
+    clat: FioLatency = field(default_factory=FioLatency)
+    lat: FioLatency = field(default_factory=FioLatency)
+
+    @classmethod
+    def from_json(cls, data):
+        if not data:
+            return cls()
+        return cls(
+            io_bytes=int(data.get("io_bytes", 0)),
+            bw_bytes=float(data.get("bw_bytes", data.get("bw", 0) * 1024)),
+            iops=float(data.get("iops", 0)),
+            runtime_ms=int(data.get("runtime", 0)),
+            total_ios=int(data.get("total_ios", 0)),
+            slat=FioLatency.from_json(data.get("slat_ns")),
+            clat=FioLatency.from_json(data.get("clat_ns")),
+            lat=FioLatency.from_json(data.get("lat_ns")),
+        )
+
+    @property
+    def bw_mbps(self):
+        return self.bw_bytes / 1_000_000
+
+
+@dataclass
+class FioResult:
+    """一個 fio job (group_reporting 後) 的完整結果"""
+    jobname: str = ""
+    read: FioDirection = field(default_factory=FioDirection)
+    write: FioDirection = field(default_factory=FioDirection)
+    trim: FioDirection = field(default_factory=FioDirection)
+    usr_cpu: float = 0.0
+    sys_cpu: float = 0.0
+    ctx: int = 0
+    job_runtime_ms: int = 0
+    error: int = 0
+    disk_util: dict = field(default_factory=dict)
+    fio_version: str = ""
+    hostname: str = ""
+    port: int = 0
+
+    @classmethod
+    def from_json(cls, job, disk_util=None, fio_version=""):
+        return cls(
+            hostname=job.get("hostname", ""),
+            port=int(job.get("port", 0) or 0),
+            jobname=job.get("jobname", ""),
+            read=FioDirection.from_json(job.get("read")),
+            write=FioDirection.from_json(job.get("write")),
+            trim=FioDirection.from_json(job.get("trim")),
+            usr_cpu=float(job.get("usr_cpu", 0)),
+            sys_cpu=float(job.get("sys_cpu", 0)),
+            ctx=int(job.get("ctx", 0)),
+            job_runtime_ms=int(job.get("job_runtime", 0)),
+            error=int(job.get("error", 0)),
+            disk_util={d.get("name"): float(d.get("util", 0)) for d in (disk_util or [])},
+            fio_version=fio_version,
+        )
+
+    @property
+    def total_iops(self):
+        return self.read.iops + self.write.iops + self.trim.iops
+
+    @property
+    def total_bw_mbps(self):
+        return self.read.bw_mbps + self.write.bw_mbps + self.trim.bw_mbps
+
+    @property
+    def total_ios(self):
+        return self.read.total_ios + self.write.total_ios + self.trim.total_ios
+
+    @property
+    def runtime_sec(self):
+        return max(self.read.runtime_ms, self.write.runtime_ms, self.trim.runtime_ms) / 1000
+
+    @property
+    def cpu_usec_per_io(self):
+        """
+        每個 IO 花費的 fio CPU 時間 (usec)。
+        group_reporting 下 usr/sys_cpu 是各 job 平均百分比，job_runtime 是各 job 執行時間總和。
+        """
+        if not self.total_ios:
+            return None
+        cpu_usec = (self.usr_cpu + self.sys_cpu) / 100 * self.job_runtime_ms * 1000
+        return cpu_usec / self.total_ios
+
+    def active_directions(self):
+        """回傳有實際 IO 的方向，例如 [("read", FioDirection), ...]"""
+        return [(name, d) for name, d in (("read", self.read), ("write", self.write), ("trim", self.trim))
+                if d.total_ios > 0]
+
+    def clat_percentile(self, pct):
+        """
+        多方向 (randrw) 時回傳各方向中最差的 clat 百分位 (ns)
+        """
+        values = [d.clat.percentile(pct) for _, d in self.active_directions()]
+        values = [v for v in values if v is not None]
+        return max(values) if values else None
+
+
+def _merge_latency(latencies):
+    latencies = [lat for lat in latencies if lat.samples]
+    if not latencies:
+        return FioLatency()
+    samples = sum(lat.samples for lat in latencies)
+    bins = {}
+    for lat in latencies:
+        for value, count in lat.bins.items():
+            bins[value] = bins.get(value, 0) + count
+    return FioLatency(
+        min_ns=min(lat.min_ns for lat in latencies),
+        max_ns=max(lat.max_ns for lat in latencies),
+        mean_ns=sum(lat.mean_ns * lat.samples for lat in latencies) / samples,
+        samples=samples,
+        # 沒有 bins 時無法正確合併百分位，保留最差裝置的值
+        percentiles={} if bins else {
+            p: max(lat.percentiles.get(p, 0) for lat in latencies) for p in latencies[0].percentiles
+        },
+        bins=bins,
+    )
+
+
+def _merge_direction(directions):
+    return FioDirection(
+        io_bytes=sum(d.io_bytes for d in directions),
+        bw_bytes=sum(d.bw_bytes for d in directions),
+        iops=sum(d.iops for d in directions),
+        runtime_ms=max((d.runtime_ms for d in directions), default=0),
+        total_ios=sum(d.total_ios for d in directions),
+        slat=_merge_latency([d.slat for d in directions]),
+        clat=_merge_latency([d.clat for d in directions]),
+        lat=_merge_latency([d.lat for d in directions]),
+    )
+
+
+def merge_fio_results(results, jobname="aggregate"):
+    """
+    合併多個 FioResult（例如同一個 fio process 中每個裝置一個 group）成系統總量：
+    IOPS / BW 直接相加，latency 以 json+ bins 合併後重新計算百分位，CPU 以執行時間加權。
+    """
+    total_runtime = sum(r.job_runtime_ms for r in results)
+    disk_util = {}
+    for r in results:
+        disk_util.update(r.disk_util)
+    return FioResult(
+        jobname=jobname,
+        read=_merge_direction([r.read for r in results]),
+        write=_merge_direction([r.write for r in results]),
+        trim=_merge_direction([r.trim for r in results]),
+        usr_cpu=sum(r.usr_cpu * r.job_runtime_ms for r in results) / total_runtime if total_runtime else 0.0,
+        sys_cpu=sum(r.sys_cpu * r.job_runtime_ms for r in results) / total_runtime if total_runtime else 0.0,
+        ctx=sum(r.ctx for r in results),
+        job_runtime_ms=total_runtime,
+        error=max((r.error for r in results), default=0),
+        disk_util=disk_util,
+        fio_version=results[0].fio_version if results else "",
+    )
+
+
+def parse_fio_json(output):
+    """
+    解析 fio --output-format=json/json+ 的輸出，回傳 FioResult 清單（每個 job / group 一個）。
+    fio 可能在 JSON 前印出警告文字，因此從第一個 '{' 開始解析。
+    client/server 模式的結果在 "client_stats"，每筆帶有 hostname / port；"All clients" 彙總列會略過。
+    """
+    start = output.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found in fio output")
+    data = json.loads(output[start:])
+    fio_version = data.get("fio version", "")
+    disk_util = data.get("disk_util", [])
+    jobs = data.get("jobs") or [j for j in data.get("client_stats", []) if j.get("jobname") != "All clients"]
+    return [FioResult.from_json(job, disk_util, fio_version) for job in jobs]
+
+
+def load_fio_json(json_file):
+    """讀取 fio_<test>_<device>.json 並回傳第一個 (group_reporting) 結果"""
+    with open(json_file, "r") as f:
+        results = parse_fio_json(f.read())
+    if not results:
+        raise ValueError(f"No jobs found in {json_file}")
+    return results[0]
+
+
+def format_fio_summary(result, device):
+    """產生給人看的 fio_<test>_<device>.txt 摘要"""
+    lines = [f"{result.jobname} on {device} ({result.fio_version})"]
+    for name, d in result.active_directions():
+        lines.append(
+            f"  {name}: IOPS={d.iops:.0f}, BW={d.bw_mbps:.2f}MB/s, runtime={d.runtime_ms}msec, "
+            f"clat mean={d.clat.mean_ns / 1000:.2f}us"
+        )
+        for pct in (50, 99, 99.9, 99.99):
+            value = d.clat.percentile(pct)
+            if value is not None:
+                lines.append(f"    clat p{pct:g}: {value / 1000:.2f}us")
+    lines.append(f"  cpu: usr={result.usr_cpu:.2f}%, sys={result.sys_cpu:.2f}%, ctx={result.ctx}")
+    for disk, util in result.disk_util.items():
+        lines.append(f"  disk util {disk}: {util:.2f}%")
+    return "\n".join(lines) + "\n"
+
+
+def _us(value_ns):
+    return f"{value_ns / 1000:.2f}" if value_ns is not None else "N/A"
+
+
+def _worst_mean(result, attr):
+    """取各有效方向中最大的平均 latency (ns)，沒有樣本時回傳 None"""
+    means = [getattr(d, attr).mean_ns for _, d in result.active_directions() if getattr(d, attr).samples]
+    return max(means) if means else None
+
+
+def fio_result_to_row(device, test_name, result, iodepth, numjobs, ioengine, host=None):
+    """將 FioResult 轉成 write_to_csv 使用的欄位字典；host 預設為執行 fio 的本機名稱"""
+    cpu_per_io = result.cpu_usec_per_io
+    return {
+        "Host": host or result.hostname or socket.gethostname(),
+        "Device": device,
+        "Test Name": test_name,
+        "Bandwidth": f"{result.total_bw_mbps:.2f}MB/s",
+        "IOPS": round(result.total_iops),
+        "IO Depth": iodepth,
+        "Num Jobs": numjobs,
+        "IO Engine": ioengine,
+        "Runtime": f"{result.runtime_sec:.3f}",
+        "Read IOPS": round(result.read.iops),
+        "Write IOPS": round(result.write.iops),
+        "Read BW (MB/s)": f"{result.read.bw_mbps:.2f}",
+        "Write BW (MB/s)": f"{result.write.bw_mbps:.2f}",
+        "Read clat Mean (us)": _us(result.read.clat.mean_ns if result.read.total_ios else None),
+        "Write clat Mean (us)": _us(result.write.clat.mean_ns if result.write.total_ios else None),
+        "slat Mean (us)": _us(_worst_mean(result, "slat")),
+        "lat Mean (us)": _us(_worst_mean(result, "lat")),
+        "clat p50 (us)": _us(result.clat_percentile(50)),
+        "clat p99 (us)": _us(result.clat_percentile(99)),
+        "clat p99.9 (us)": _us(result.clat_percentile(99.9)),
+        "clat p99.99 (us)": _us(result.clat_percentile(99.99)),
+        "usr CPU (%)": f"{result.usr_cpu:.2f}",
+        "sys CPU (%)": f"{result.sys_cpu:.2f}",
+        "CPU usec/IO": f"{cpu_per_io:.3f}" if cpu_per_io is not None else "N/A",
+        "Disk Util (%)": f"{result.disk_util.get(device, 0):.2f}" if device in result.disk_util else "N/A",
+    }
+
+
+# 少於 1GiB 的寫入量相對 32MiB 計數器單位誤差太大
+WAF_MIN_HOST_BYTES = 1 << 30
+
+
+def nand_bytes_delta(before, after):
+    """
+    測試前後 vendor SMART (0xCA) nand_bytes_written 的差值 (bytes)。
+    before / after 為 scripts.smart_sampler.read_write_counters() 的結果；缺資料時回傳 None
+    """
+    if not before or not after:
+        return None
+    if before.get("nand_bytes_written") is None or after.get("nand_bytes_written") is None:
+        return None
+    return after["nand_bytes_written"] - before["nand_bytes_written"]
+
+
+def write_amplification_columns(host_bytes, nand_bytes):
+    """
+    WAF = NAND 寫入量 / host 寫入量。host 寫入量取自 fio (write io_bytes)，NAND 寫入量取自 vendor SMART。
+    vendor 計數器以 32MiB 為單位，寫入量太小（例如讀取測試）時 WAF 為 N/A。
+    """
+    columns = {
+        "Host Written (GB)": f"{host_bytes / 1e9:.2f}",
+        "NAND Written (GB)": f"{nand_bytes / 1e9:.2f}" if nand_bytes is not None else "N/A",
+        "WAF": "N/A",
+    }
+    if nand_bytes is not None and host_bytes >= WAF_MIN_HOST_BYTES:
+        columns["WAF"] = f"{nand_bytes / host_bytes:.3f}"
+    return columns
+
+
+def host_cpu_columns(usage, total_ios):
+    """
+    scripts/host_cpu_monitor.py HostCpuMonitor.usage() 的摘要 -> CSV 欄位。
+    usage 只統計 fio 綁定的 core（未綁定時為全部 CPU）；usage 為 None（例如 resume 跳過的測試）時全部 N/A。
+    """
+    columns = dict.fromkeys(["Host CPU (%)", "Host IRQ+SoftIRQ (%)", "Host usec/IO", "Host Cycles/IO",
+                             "NVMe IRQs/IO", "Max Core (%)", "Host Saturated"], "N/A")
+    if not usage:
+        return columns
+    columns["Host CPU (%)"] = f"{usage['busy_pct']:.2f}"
+    columns["Host IRQ+SoftIRQ (%)"] = f"{usage['irq_softirq_pct']:.2f}"
+    columns["Max Core (%)"] = f"{usage['max_core_pct']:.2f}"
+    columns["Host Saturated"] = "Yes" if usage["saturated_cpus"] else "No"
+    if total_ios:
+        usec_per_io = usage["busy_usec"] / total_ios
+        columns["Host usec/IO"] = f"{usec_per_io:.3f}"
+        columns["NVMe IRQs/IO"] = f"{usage['nvme_irqs'] / total_ios:.3f}"
+        if usage.get("cpu_mhz"):
+            columns["Host Cycles/IO"] = f"{usec_per_io * usage['cpu_mhz']:.0f}"
+    return columns
+
+
 # 測試結果輸出   
 # 寫入結果到 CSV
+CSV_HEADERS = [
+    "Device", "Test Name", "Bandwidth", "IOPS", "IO Depth", "Num Jobs", "IO Engine", "Runtime",
+    "Read IOPS", "Write IOPS", "Read BW (MB/s)", "Write BW (MB/s)",
+    "Read clat Mean (us)", "Write clat Mean (us)", "slat Mean (us)", "lat Mean (us)",
+    "clat p50 (us)", "clat p99 (us)", "clat p99.9 (us)", "clat p99.99 (us)",
+    "usr CPU (%)", "sys CPU (%)", "CPU usec/IO", "Disk Util (%)",
+    "Precondition", "Host",
+    "Host Written (GB)", "NAND Written (GB)", "WAF",
+    "Host CPU (%)", "Host IRQ+SoftIRQ (%)", "Host usec/IO", "Host Cycles/IO", "NVMe IRQs/IO",
+    "Max Core (%)", "Host Saturated",
+    "Read QoS p99 (us)", "Read QoS p99.9 (us)", "Read QoS p99.99 (us)", "Read QoS p99.9999 (us)",
+    "Write QoS p99 (us)", "Write QoS p99.9 (us)", "Write QoS p99.99 (us)", "Write QoS p99.9999 (us)",
+]
+
+
+# 多個裝置 thread 同時寫入同一個 CSV，header 判斷與寫入必須在同一個 lock 內
+_csv_lock = threading.Lock()
+# 每寫入一列就呼叫 listener(csv_file, row)，例如 utils/results_db.py 的 ResultsStore.record_row
+_row_listeners = []
+
+
+def add_row_listener(listener):
+    _row_listeners.append(listener)
+
+
+def remove_row_listener(listener):
+    if listener in _row_listeners:
+        _row_listeners.remove(listener)
+
+
 def write_to_csv(csv_file, data):
-    headers = ["Device", "Test Name", "Bandwidth", "IOPS", "IO Depth", "Num Jobs", "IO Engine", "Runtime"]
-    write_header = not os.path.exists(csv_file)
-    with open(csv_file, "a", newline="") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(headers)
-        writer.writerow(data)
\ No newline at end of file
+    """
+    寫入一列結果。data 可以是 fio_result_to_row() 回傳的字典，或依 CSV_HEADERS 順序的 list。
+    """
+    if not isinstance(data, dict):
+        data = dict(zip(CSV_HEADERS, data))
+    with _csv_lock:
+        write_header = not os.path.exists(csv_file)
+        with open(csv_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS, restval="N/A", extrasaction="ignore")
+            if write_header:
+                writer.writeheader()
+            writer.writerow(data)
+    for listener in list(_row_listeners):
+        listener(csv_file, data)
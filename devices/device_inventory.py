@@ -0,0 +1,233 @@
+import os
+import re
+import logging
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from devices.numa_topology import SYSFS_ROOT, get_device_pci_address
+
+# ---------- 裝置清單 (單次 sysfs 掃描) ----------
+# 只讀 /sys/block、/sys/class/nvme 與 PCI tree 一次，不再對每顆裝置呼叫 lsblk / nvme id-ctrl。
+# 結果快取成唯讀的 {name: DeviceInfo}，所有模組共用；裝置變動（例如 nvme format 後）呼叫 refresh_inventory()。
+PROC_ROOT = "/proc"
+
+SYSTEM_MOUNTPOINTS = ("/", "/boot", "/boot/efi", "/home", "[SWAP]")
+
+# 沒有實體裝置或不是測試對象的 block device
+_SKIPPED_PREFIXES = ("loop", "ram", "zram", "dm-", "md", "sr", "nbd")
+# native NVMe multipath 的隱藏路徑 (nvme0c0n1)
+_NVME_PATH_PATTERN = re.compile(r"^nvme\d+c\d+n\d+$")
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    name: str
+    transport: str
+    model: str = "Unknown"
+    serial: str = "Unknown"
+    firmware: str = "Unknown"
+    size_bytes: int = 0
+    rotational: bool = False
+    controller: str = None      # NVMe controller，例如 nvme0
+    bdf: str = None
+    numa_node: int = None
+    link_speed: str = None      # 例如 "16.0 GT/s PCIe"
+    link_width: int = None
+    max_link_speed: str = None
+    max_link_width: int = None
+    mountpoints: tuple = field(default_factory=tuple)
+
+    @property
+    def is_nvme(self):
+        return self.transport == "nvme"
+
+    @property
+    def is_system_drive(self):
+        return any(mp in SYSTEM_MOUNTPOINTS for mp in self.mountpoints)
+
+    @property
+    def capacity(self):
+        """以十進位單位顯示容量，例如 "61.44 TB" """
+        if self.size_bytes >= 1e12:
+            return f"{self.size_bytes / 1e12:.2f} TB"
+        return f"{self.size_bytes / 1e9:.2f} GB"
+
+    @property
+    def link(self):
+        """例如 "16.0 GT/s PCIe x4 (max 16.0 GT/s PCIe x4)" """
+        if not self.link_speed:
+            return "N/A"
+        return f"{self.link_speed} x{self.link_width} (max {self.max_link_speed} x{self.max_link_width})"
+
+
+def _read(path, default=None):
+    try:
+        with open(path, "r") as f:
+            value = f.read().strip()
+        return value if value else default
+    except (OSError, UnicodeDecodeError):
+        return default
+
+
+def _read_int(path):
+    try:
+        return int(_read(path))
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_vpd_serial(path):
+    """SCSI/SATA 的序號在 VPD page 0x80：4 byte header 之後的 ASCII"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    serial = data[4:].decode("ascii", errors="ignore").strip(" \x00")
+    return serial or None
+
+
+def _read_mounts(proc_root):
+    """回傳 {kernel name 或 /dev 路徑: [mountpoint, ...]}（含 swap）"""
+    mounts = {}
+    for line in (_read(os.path.join(proc_root, "mounts"), "") or "").splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith("/dev/"):
+            mounts.setdefault(parts[0], []).append(parts[1])
+    for line in (_read(os.path.join(proc_root, "swaps"), "") or "").splitlines()[1:]:
+        parts = line.split()
+        if parts and parts[0].startswith("/dev/"):
+            mounts.setdefault(parts[0], []).append("[SWAP]")
+    return mounts
+
+
+def _dm_names(sysfs_root):
+    """{"/dev/mapper/ubuntu--vg-root": "dm-0"}"""
+    block_dir = os.path.join(sysfs_root, "block")
+    names = {}
+    for name in os.listdir(block_dir) if os.path.isdir(block_dir) else []:
+        dm_name = _read(os.path.join(block_dir, name, "dm", "name"))
+        if dm_name:
+            names[f"/dev/mapper/{dm_name}"] = name
+    return names
+
+
+def _mounts_by_kernel_name(sysfs_root, proc_root):
+    dm_names = _dm_names(sysfs_root)
+    by_name = {}
+    for source, mountpoints in _read_mounts(proc_root).items():
+        name = dm_names.get(source) or os.path.basename(source)
+        by_name.setdefault(name, []).extend(mountpoints)
+    return by_name
+
+
+def _device_users(sysfs_root, name):
+    """裝置本身、它的 partition，以及建在上面的 dm / md（holders），遞迴展開"""
+    block_dir = os.path.join(sysfs_root, "class", "block")
+    users, pending = [], [name]
+    while pending:
+        current = pending.pop()
+        if current in users:
+            continue
+        users.append(current)
+        disk_dir = os.path.join(sysfs_root, "block", current)
+        if os.path.isdir(disk_dir):
+            pending.extend(
+                entry for entry in os.listdir(disk_dir)
+                if os.path.exists(os.path.join(disk_dir, entry, "partition"))
+            )
+        holders_dir = os.path.join(block_dir, current, "holders")
+        if os.path.isdir(holders_dir):
+            pending.extend(os.listdir(holders_dir))
+    return users
+
+
+def _scan_device(sysfs_root, name, mounts):
+    block_dir = os.path.join(sysfs_root, "block", name)
+    device_dir = os.path.join(block_dir, "device")
+    info = {
+        "name": name,
+        "size_bytes": (_read_int(os.path.join(block_dir, "size")) or 0) * 512,
+        "rotational": _read(os.path.join(block_dir, "queue", "rotational")) == "1",
+    }
+
+    if name.startswith("nvme"):
+        controller = os.path.basename(os.path.realpath(device_dir))
+        ctrl_dir = os.path.join(sysfs_root, "class", "nvme", controller)
+        if not os.path.isdir(ctrl_dir):
+            ctrl_dir = device_dir
+        info.update(
+            transport="nvme",
+            controller=controller,
+            model=_read(os.path.join(ctrl_dir, "model"), "Unknown"),
+            serial=_read(os.path.join(ctrl_dir, "serial"), "Unknown"),
+            firmware=_read(os.path.join(ctrl_dir, "firmware_rev"), "Unknown"),
+        )
+    else:
+        vendor = _read(os.path.join(device_dir, "vendor"), "")
+        model = _read(os.path.join(device_dir, "model"), "Unknown")
+        info.update(
+            transport="sata" if vendor.startswith("ATA") else "scsi",
+            model=model,
+            serial=_read_vpd_serial(os.path.join(device_dir, "vpd_pg80")) or "Unknown",
+            firmware=_read(os.path.join(device_dir, "rev"), "Unknown"),
+        )
+
+    bdf = get_device_pci_address(name, sysfs_root)
+    if bdf:
+        pci_dir = os.path.join(sysfs_root, "bus", "pci", "devices", bdf)
+        numa_node = _read_int(os.path.join(pci_dir, "numa_node"))
+        info.update(
+            bdf=bdf,
+            numa_node=numa_node if numa_node is not None and numa_node >= 0 else None,
+            link_speed=_read(os.path.join(pci_dir, "current_link_speed")),
+            link_width=_read_int(os.path.join(pci_dir, "current_link_width")),
+            max_link_speed=_read(os.path.join(pci_dir, "max_link_speed")),
+            max_link_width=_read_int(os.path.join(pci_dir, "max_link_width")),
+        )
+
+    mountpoints = []
+    for user in _device_users(sysfs_root, name):
+        mountpoints.extend(mounts.get(user, []))
+    info["mountpoints"] = tuple(mountpoints)
+    return DeviceInfo(**info)
+
+
+def scan_devices(sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    """掃描所有實體磁碟，回傳唯讀的 {name: DeviceInfo}（依名稱排序）"""
+    block_dir = os.path.join(sysfs_root, "block")
+    mounts = _mounts_by_kernel_name(sysfs_root, proc_root)
+    devices = {}
+    for name in sorted(os.listdir(block_dir)) if os.path.isdir(block_dir) else []:
+        if name.startswith(_SKIPPED_PREFIXES) or _NVME_PATH_PATTERN.match(name):
+            continue
+        if not os.path.exists(os.path.join(block_dir, name, "device")):
+            continue
+        try:
+            devices[name] = _scan_device(sysfs_root, name, mounts)
+        except OSError as e:
+            logging.warning(f"⚠️ Failed to read sysfs attributes of {name}: {e}")
+    return MappingProxyType(devices)
+
+
+_inventory_cache = {}
+_inventory_lock = threading.Lock()
+
+
+def get_inventory(sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT, refresh=False):
+    """回傳快取的裝置清單；第一次呼叫（或 refresh=True）時才掃描 sysfs"""
+    key = (sysfs_root, proc_root)
+    with _inventory_lock:
+        if refresh or key not in _inventory_cache:
+            _inventory_cache[key] = scan_devices(sysfs_root, proc_root)
+        return _inventory_cache[key]
+
+
+def refresh_inventory(sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    return get_inventory(sysfs_root, proc_root, refresh=True)
+
+
+def get_device_info(device, sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    """回傳單一裝置的 DeviceInfo，不存在時回傳 None"""
+    return get_inventory(sysfs_root, proc_root).get(device)
@@ -0,0 +1,123 @@
+import time
+import shlex
+import logging
+import subprocess
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from devices.device_inventory import get_device_info
+
+# ---------- 平行清除 (blkdiscard / nvme format / hdparm secure erase) ----------
+# 所有裝置同時清除，最多 max_workers 顆並行；每顆裝置有自己的 timeout 與結果。
+# runner 可替換（測試時用假的 runner 或 loop device），介面為 runner(command, timeout) -> (returncode, output)
+MODE_SECURE = "secure"    # 測試開始前：NVMe blkdiscard→nvme format，SATA SSD hdparm secure erase
+MODE_DISCARD = "discard"  # 每個測試 preconditioning 前：只處理 NVMe，其他裝置略過
+
+DEFAULT_ERASE_CONCURRENCY = 8
+DEFAULT_ERASE_TIMEOUT = 3600  # 秒，單一裝置所有步驟的總時間
+
+
+@dataclass
+class EraseResult:
+    device: str
+    success: bool
+    method: str
+    elapsed_sec: float = 0.0
+    message: str = ""
+
+
+def run_command(command, timeout=None):
+    """預設 runner：不經過 shell 執行指令，回傳 (returncode, stdout + stderr)"""
+    result = subprocess.run(shlex.split(command), capture_output=True, text=True, timeout=timeout)
+    return result.returncode, (result.stdout + result.stderr).strip()
+
+
+def get_erase_methods(device, mode=MODE_SECURE):
+    """
+    依裝置類型回傳依序嘗試的清除方式 [(method, [command, ...]), ...]；空清單代表略過此裝置。
+    """
+    device_path = f"/dev/{device}"
+    if device.startswith("nvme"):
+        return [
+            ("blkdiscard", [f"blkdiscard {device_path}"]),
+            ("nvme format", [f"nvme format {device_path} -s 1 -n 1"]),
+        ]
+    if mode == MODE_DISCARD:
+        return []
+    info = get_device_info(device)
+    if info is not None and info.rotational:
+        return []
+    return [
+        ("hdparm secure erase", [
+            f"hdparm --user-master u --security-set-pass NULL {device_path}",
+            f"hdparm --user-master u --security-erase NULL {device_path}",
+        ]),
+    ]
+
+
+def erase_device(device, mode=MODE_SECURE, timeout=DEFAULT_ERASE_TIMEOUT, runner=run_command):
+    """清除單一裝置；第一個方式失敗時改用下一個。回傳 EraseResult"""
+    start = time.monotonic()
+    methods = get_erase_methods(device, mode)
+    if not methods:
+        logging.info(f"⏭️ Skipping erase on {device} ({'not NVMe' if mode == MODE_DISCARD else 'HDD'}).")
+        return EraseResult(device, True, "skipped")
+
+    message = ""
+    for method, commands in methods:
+        logging.info(f"🔹 Running {method} on {device}...")
+        try:
+            for command in commands:
+                remaining = None
+                if timeout:
+                    remaining = timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(command, timeout)
+                returncode, output = runner(command, remaining)
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, command, output)
+        except subprocess.TimeoutExpired:
+            message = f"{method} timed out after {timeout}s"
+            logging.error(f"❌ {message} on {device}")
+            # 逾時代表裝置可能還在處理，不再嘗試下一個方式
+            return EraseResult(device, False, method, time.monotonic() - start, message)
+        except (subprocess.CalledProcessError, OSError) as e:
+            message = f"{method} failed: {getattr(e, 'output', None) or e}"
+            logging.warning(f"⚠️ {message} on {device}")
+            continue
+        elapsed = time.monotonic() - start
+        logging.info(f"✅ {method} completed on {device} ({elapsed:.1f}s).")
+        return EraseResult(device, True, method, elapsed)
+
+    logging.error(f"❌ All erase methods failed for {device}")
+    return EraseResult(device, False, methods[-1][0], time.monotonic() - start, message)
+
+
+def erase_devices(devices, mode=MODE_SECURE, max_workers=DEFAULT_ERASE_CONCURRENCY, timeout=DEFAULT_ERASE_TIMEOUT,
+                  runner=run_command, on_progress=None):
+    """
+    平行清除所有裝置。
+    :param on_progress: 每完成一顆裝置呼叫 on_progress(result, done, total)
+    :return: {device: EraseResult}，順序與 devices 相同
+    """
+    if not devices:
+        return {}
+    results = {}
+    total = len(devices)
+    logging.info(f"🧹 Erasing {total} devices ({mode}, up to {max_workers} in parallel)...")
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+        futures = {executor.submit(erase_device, device, mode, timeout, runner): device for device in devices}
+        for future in as_completed(futures):
+            device = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = EraseResult(device, False, "error", message=str(e))
+                logging.error(f"❌ Erase of {device} raised: {e}")
+            results[device] = result
+            done = len(results)
+            status = "✅" if result.success else "❌"
+            logging.info(f"{status} [{done}/{total}] {device}: {result.method} ({result.elapsed_sec:.1f}s) {result.message}".rstrip())
+            if on_progress is not None:
+                on_progress(result, done, total)
+    return {device: results[device] for device in devices}
@@ -0,0 +1,156 @@
+import os
+import re
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from devices.device_inventory import get_device_info
+from devices.erase_engine import run_command
+
+# ---------- 裝置設定 (desired state → apply → verify → diff) ----------
+# desired state 格式（每個裝置一份）：
+# {"nvme0n1": {"interrupt_coalescing": {"time": 1, "threshold": 9},
+#              "pcie_registers": {"CAP_PM+10.b": "00", "CAP_PM+F.b": "02"}}}
+# 所有裝置同時套用，全部套用完再一起讀回，requested / actual 的差異存到結果資料夾。
+DEVICE_CONFIG_FILE = "device_config.json"
+DEFAULT_CONFIG_CONCURRENCY = 32
+
+# NVMe Feature 0x08 Interrupt Coalescing：bits 15:8 = aggregation time (100us)，bits 7:0 = threshold
+INTERRUPT_COALESCING_FID = 0x08
+
+
+def _controller_path(device):
+    info = get_device_info(device)
+    if info and info.controller:
+        return f"/dev/{info.controller}"
+    match = re.match(r"^(nvme\d+)", device)
+    if not match:
+        raise ValueError(f"{device} is not an NVMe device")
+    return f"/dev/{match.group(1)}"
+
+
+def _device_bdf(device):
+    info = get_device_info(device)
+    if info is None or not info.bdf:
+        raise ValueError(f"No PCIe BDF for {device}")
+    return info.bdf
+
+
+def _check(runner, command):
+    returncode, output = runner(command, None)
+    if returncode != 0:
+        raise RuntimeError(f"'{command}' failed (rc={returncode}): {output}")
+    return output
+
+
+def apply_interrupt_coalescing(device, value, runner):
+    encoded = ((value.get("time", 1) & 0xFF) << 8) | (value["threshold"] & 0xFF)
+    _check(runner, f"nvme set-feature {_controller_path(device)} --feature-id {INTERRUPT_COALESCING_FID:#04x} --value {encoded:#06x}")
+
+
+def read_interrupt_coalescing(device, value, runner):
+    output = _check(runner, f"nvme get-feature {_controller_path(device)} --feature-id {INTERRUPT_COALESCING_FID:#04x}")
+    match = re.search(r"value:\s*(0x[0-9a-fA-F]+)", output)
+    if not match:
+        raise RuntimeError(f"Unexpected get-feature output: {output}")
+    encoded = int(match.group(1), 16)
+    return {"time": (encoded >> 8) & 0xFF, "threshold": encoded & 0xFF}
+
+
+def apply_pcie_registers(device, value, runner):
+    bdf = _device_bdf(device)
+    for register, register_value in value.items():
+        _check(runner, f"setpci -s {bdf} {register}={register_value}")
+
+
+def read_pcie_registers(device, value, runner):
+    bdf = _device_bdf(device)
+    return {register: _check(runner, f"setpci -s {bdf} {register}").strip() for register in value}
+
+
+def _normalize(feature, value):
+    """比較前正規化：PCIe register 以數值比較（"02" == "0x2"）"""
+    if feature == "pcie_registers":
+        try:
+            return {register: int(str(v), 16) for register, v in value.items()}
+        except ValueError:
+            return value
+    return value
+
+
+# feature -> (apply(device, value, runner), read(device, requested, runner))
+FEATURE_HANDLERS = {
+    "interrupt_coalescing": (apply_interrupt_coalescing, read_interrupt_coalescing),
+    "pcie_registers": (apply_pcie_registers, read_pcie_registers),
+}
+
+
+def _apply_device(device, features, runner):
+    errors = {}
+    for feature, value in features.items():
+        try:
+            FEATURE_HANDLERS[feature][0](device, value, runner)
+        except (RuntimeError, ValueError, OSError) as e:
+            errors[feature] = str(e)
+            logging.error(f"❌ Failed to apply {feature} on {device}: {e}")
+    return errors
+
+
+def _read_device(device, features, runner):
+    actual = {}
+    for feature, value in features.items():
+        try:
+            actual[feature] = FEATURE_HANDLERS[feature][1](device, value, runner)
+        except (RuntimeError, ValueError, OSError) as e:
+            actual[feature] = None
+            logging.error(f"❌ Failed to read back {feature} on {device}: {e}")
+    return actual
+
+
+def configure_devices(desired_state, result_folder=None, max_workers=DEFAULT_CONFIG_CONCURRENCY, runner=run_command):
+    """
+    套用 desired_state 到所有裝置並驗證。
+    :return: 差異清單 [{"device", "feature", "requested", "actual", "error", "match"}]，全部一致時每筆 match 為 True
+    """
+    desired_state = {device: features for device, features in desired_state.items() if features}
+    if not desired_state:
+        return []
+    workers = max(1, min(max_workers, len(desired_state)))
+
+    # 1) 同時套用
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        apply_errors = dict(zip(desired_state, executor.map(
+            lambda item: _apply_device(item[0], item[1], runner), desired_state.items()
+        )))
+    # 2) 全部套用完成後一次讀回
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        actual_state = dict(zip(desired_state, executor.map(
+            lambda item: _read_device(item[0], item[1], runner), desired_state.items()
+        )))
+
+    diff = []
+    for device, features in desired_state.items():
+        for feature, requested in features.items():
+            actual = actual_state[device].get(feature)
+            match = actual is not None and _normalize(feature, requested) == _normalize(feature, actual)
+            diff.append({
+                "device": device,
+                "feature": feature,
+                "requested": requested,
+                "actual": actual,
+                "error": apply_errors[device].get(feature),
+                "match": match,
+            })
+            if match:
+                logging.info(f"✅ {device} {feature}: {actual}")
+            else:
+                logging.error(f"❌ {device} {feature}: requested {requested}, actual {actual}")
+
+    if result_folder:
+        with open(os.path.join(result_folder, DEVICE_CONFIG_FILE), "w") as f:
+            json.dump({"requested": desired_state, "actual": actual_state, "diff": diff}, f, indent=2)
+    return diff
+
+
+def get_mismatches(diff):
+    return [entry for entry in diff if not entry["match"]]
@@ -0,0 +1,188 @@
+import os
+import json
+import logging
+import subprocess
+
+from devices.numa_topology import SYSFS_ROOT, get_device_pci_address, parse_cpulist
+
+# ---------- NVMe IRQ affinity ----------
+# 把每個 NVMe controller 的 MSI-X 中斷 (nvmeXqY) 綁到該裝置 fio job 使用的 CPU，
+# 讓 completion 不會跑到另一個 socket。原本的 smp_affinity_list 會先存檔，測試結束後還原。
+PROC_ROOT = "/proc"
+IRQ_SNAPSHOT_FILE = "irq_affinity_snapshot.json"
+IRQ_REPORT_FILE = "IRQ_Affinity.txt"
+
+
+def _read_file(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_interrupt_names(proc_root=PROC_ROOT):
+    """解析 /proc/interrupts，回傳 {irq: name}，例如 {125: "nvme0q1"}"""
+    names = {}
+    content = _read_file(os.path.join(proc_root, "interrupts"))
+    if not content:
+        return names
+    for line in content.splitlines()[1:]:
+        irq, _, rest = line.strip().partition(":")
+        if not irq.isdigit():
+            continue
+        fields = rest.split()
+        if fields:
+            names[int(irq)] = fields[-1]
+    return names
+
+
+def get_device_irqs(device, sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT, interrupt_names=None):
+    """
+    回傳裝置所屬 controller 的 MSI-X 中斷 {irq: name}。
+    IRQ 編號來自 /sys/bus/pci/devices/<bdf>/msi_irqs，名稱來自 /proc/interrupts。
+    """
+    bdf = get_device_pci_address(device, sysfs_root)
+    if bdf is None:
+        return {}
+    msi_dir = os.path.join(sysfs_root, "bus", "pci", "devices", bdf, "msi_irqs")
+    if not os.path.isdir(msi_dir):
+        return {}
+    if interrupt_names is None:
+        interrupt_names = read_interrupt_names(proc_root)
+    irqs = sorted(int(name) for name in os.listdir(msi_dir) if name.isdigit())
+    return {irq: interrupt_names.get(irq, f"irq{irq}") for irq in irqs}
+
+
+def _is_admin_queue(name):
+    return name.endswith("q0")
+
+
+def plan_irq_affinity(device_irqs, cpus_allowed):
+    """
+    I/O queue 中斷輪流分配到 cpus_allowed 中的每一顆 CPU；admin queue (q0) 允許整段 CPU。
+    :return: {irq: "cpu list"}
+    """
+    cpus = parse_cpulist(cpus_allowed)
+    if not cpus:
+        return {}
+    plan = {}
+    io_index = 0
+    for irq, name in sorted(device_irqs.items()):
+        if _is_admin_queue(name):
+            plan[irq] = cpus_allowed
+        else:
+            plan[irq] = str(cpus[io_index % len(cpus)])
+            io_index += 1
+    return plan
+
+
+def snapshot_irq_affinity(irqs, proc_root=PROC_ROOT):
+    """回傳 {irq: 原本的 smp_affinity_list}"""
+    snapshot = {}
+    for irq in irqs:
+        value = _read_file(os.path.join(proc_root, "irq", str(irq), "smp_affinity_list"))
+        if value is not None:
+            snapshot[irq] = value
+    return snapshot
+
+
+def set_irq_affinity(irq, cpu_list, proc_root=PROC_ROOT):
+    """寫入 smp_affinity_list；kernel managed IRQ 會拒絕寫入 (EIO)，回傳 False"""
+    path = os.path.join(proc_root, "irq", str(irq), "smp_affinity_list")
+    try:
+        with open(path, "w") as f:
+            f.write(f"{cpu_list}\n")
+        return True
+    except OSError as e:
+        logging.warning(f"⚠️ Cannot set affinity of IRQ {irq} to {cpu_list}: {e}")
+        return False
+
+
+def is_irqbalance_active():
+    result = subprocess.run("systemctl is-active irqbalance", shell=True, capture_output=True, text=True)
+    return result.stdout.strip() == "active"
+
+
+def stop_irqbalance():
+    """停止 irqbalance，避免它在測試中把中斷搬走；回傳原本是否在執行"""
+    if not is_irqbalance_active():
+        return False
+    logging.info("🔹 Stopping irqbalance for the duration of the test...")
+    subprocess.run("systemctl stop irqbalance", shell=True, capture_output=True, text=True)
+    return True
+
+
+def start_irqbalance():
+    logging.info("🔹 Restarting irqbalance...")
+    subprocess.run("systemctl start irqbalance", shell=True, capture_output=True, text=True)
+
+
+def apply_irq_affinity(devices, cpu_binding, result_folder, sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    """
+    依 cpu_binding（devices.numa_topology.plan_cpu_binding() 的結果）設定每個裝置的中斷 affinity。
+    原本的設定存到 <result_folder>/irq_affinity_snapshot.json（已存在時沿用，--resume 不會覆蓋已記錄的值；
+    resume 時才出現的 IRQ 會補進檔案，結束時一併還原），
+    實際套用的結果寫到 IRQ_Affinity.txt。
+    :return: 原本的 affinity {irq: cpu list}
+    """
+    snapshot_file = os.path.join(result_folder, IRQ_SNAPSHOT_FILE)
+    if os.path.exists(snapshot_file):
+        with open(snapshot_file, "r") as f:
+            saved = json.load(f)
+        snapshot = {int(irq): value for irq, value in saved["affinity"].items()}
+        irqbalance_was_active = saved.get("irqbalance_active", False)
+        saved_count = len(snapshot)
+    else:
+        snapshot = {}
+        irqbalance_was_active = None
+        saved_count = None
+
+    # 先停 irqbalance 再設定，避免設定完馬上被搬走；--resume（例如重開機後）irqbalance 可能又被啟動，
+    # 所以每次都要停，但原本的狀態只記錄第一次
+    irqbalance_active = stop_irqbalance()
+    if irqbalance_was_active is None:
+        irqbalance_was_active = irqbalance_active
+
+    interrupt_names = read_interrupt_names(proc_root)
+    report_lines = []
+    for device in devices:
+        entry = cpu_binding.get(device)
+        device_irqs = get_device_irqs(device, sysfs_root, proc_root, interrupt_names)
+        if not entry or not device_irqs:
+            logging.warning(f"⚠️ No CPU binding or MSI-X interrupts for {device}, IRQ affinity unchanged")
+            report_lines.append(f"{device}: unchanged")
+            continue
+
+        for irq, value in snapshot_irq_affinity(device_irqs, proc_root).items():
+            snapshot.setdefault(irq, value)
+
+        for irq, cpu_list in plan_irq_affinity(device_irqs, entry["cpus_allowed"]).items():
+            applied = set_irq_affinity(irq, cpu_list, proc_root)
+            effective = _read_file(os.path.join(proc_root, "irq", str(irq), "smp_affinity_list"))
+            status = "" if applied else " (managed, not changed)"
+            report_lines.append(f"{device} {device_irqs[irq]} IRQ {irq}: {effective}{status}")
+
+    if saved_count is None or len(snapshot) > saved_count:
+        with open(snapshot_file, "w") as f:
+            json.dump({"irqbalance_active": irqbalance_was_active,
+                       "affinity": {str(irq): value for irq, value in snapshot.items()}}, f, indent=2)
+
+    with open(os.path.join(result_folder, IRQ_REPORT_FILE), "a") as f:
+        f.write("\n".join(report_lines) + "\n")
+    logging.info(f"✅ IRQ affinity applied for {len(devices)} devices (see {IRQ_REPORT_FILE})")
+    return snapshot
+
+
+def restore_irq_affinity(result_folder, proc_root=PROC_ROOT):
+    """依 irq_affinity_snapshot.json 還原原本的 affinity，並重新啟動 irqbalance（若原本在執行）"""
+    snapshot_file = os.path.join(result_folder, IRQ_SNAPSHOT_FILE)
+    if not os.path.exists(snapshot_file):
+        return
+    with open(snapshot_file, "r") as f:
+        saved = json.load(f)
+    for irq, value in saved["affinity"].items():
+        set_irq_affinity(irq, value, proc_root)
+    if saved.get("irqbalance_active"):
+        start_irqbalance()
+    logging.info(f"✅ Restored original affinity of {len(saved['affinity'])} IRQs")
@@ -0,0 +1,147 @@
+import os
+import re
+import logging
+
+# ---------- NUMA 拓樸 (直接讀 sysfs) ----------
+# 裝置所在 NUMA node：/sys/bus/pci/devices/<BDF>/numa_node
+# 每個 node 的 CPU：/sys/devices/system/node/node<N>/cpulist
+# 不依賴 lspci / lscpu 的輸出格式，也不假設只有兩個 node
+SYSFS_ROOT = "/sys"
+
+# 每個 node 保留前幾顆 CPU 給 OS / 中斷處理，不分配給 fio
+RESERVED_CPUS_PER_NODE = 4
+
+_BDF_PATTERN = re.compile(r"^[0-9a-fA-F]{4,}:[0-9a-fA-F]{2}:[0-9a-fA-F]{2}\.[0-7]$")
+
+
+def _read_sysfs(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def parse_cpulist(cpulist):
+    """"0-3,8-11" -> [0, 1, 2, 3, 8, 9, 10, 11]"""
+    cpus = []
+    for part in (cpulist or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpulist(cpus):
+    """[0, 1, 2, 3, 8] -> "0-3,8"（fio --cpus_allowed 格式）"""
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{start}-{end}" if start != end else f"{start}" for start, end in ranges)
+
+
+def get_numa_nodes(sysfs_root=SYSFS_ROOT):
+    """回傳 {node_id: [cpu, ...]}；沒有 NUMA 資訊的系統視為單一 node 0"""
+    node_dir = os.path.join(sysfs_root, "devices", "system", "node")
+    nodes = {}
+    if os.path.isdir(node_dir):
+        for name in os.listdir(node_dir):
+            match = re.match(r"^node(\d+)$", name)
+            if not match:
+                continue
+            cpus = parse_cpulist(_read_sysfs(os.path.join(node_dir, name, "cpulist")))
+            if cpus:  # 沒有 CPU 的 node（例如 CXL / HBM memory-only node）不能綁定
+                nodes[int(match.group(1))] = cpus
+
+    if not nodes:
+        online = _read_sysfs(os.path.join(sysfs_root, "devices", "system", "cpu", "online"))
+        nodes[0] = parse_cpulist(online) if online else list(range(os.cpu_count() or 1))
+    return dict(sorted(nodes.items()))
+
+
+def get_device_pci_address(device, sysfs_root=SYSFS_ROOT):
+    """由 /sys/class/block/<device> 的實際路徑找出最接近裝置的 PCI BDF，例如 0000:3b:00.0"""
+    for link in (os.path.join(sysfs_root, "class", "block", device),
+                 os.path.join(sysfs_root, "class", "block", device, "device")):
+        if not os.path.exists(link):
+            continue
+        bdfs = [part for part in os.path.realpath(link).split(os.sep) if _BDF_PATTERN.match(part)]
+        if bdfs:
+            return bdfs[-1]
+    return None
+
+
+def get_device_numa_node(device, sysfs_root=SYSFS_ROOT):
+    """回傳裝置所在的 NUMA node；無法判斷（或 BIOS 回報 -1）時回傳 None"""
+    bdf = get_device_pci_address(device, sysfs_root)
+    if bdf is None:
+        logging.warning(f"⚠️ Cannot find PCI address for {device}")
+        return None
+    value = _read_sysfs(os.path.join(sysfs_root, "bus", "pci", "devices", bdf, "numa_node"))
+    try:
+        node = int(value)
+    except (TypeError, ValueError):
+        return None
+    return node if node >= 0 else None
+
+
+def plan_cpu_binding(devices, sysfs_root=SYSFS_ROOT, reserved_cpus=RESERVED_CPUS_PER_NODE):
+    """
+    依裝置所在 NUMA node 分配 CPU，每個裝置拿到同一個 node 上一段不重疊的 CPU。
+
+    :return: {device: {"node": 0, "cpus_allowed": "4-13", "numa_mem_policy": "bind:0"}}
+             fio 參數可直接用 fio_options() 取出
+    """
+    nodes = get_numa_nodes(sysfs_root)
+    devices_by_node = {}
+    for device in devices:
+        node = get_device_numa_node(device, sysfs_root)
+        if node is None and len(nodes) == 1:
+            node = next(iter(nodes))
+        if node not in nodes:
+            logging.warning(f"⚠️ NUMA node of {device} unknown, fio will not be pinned for this device")
+            continue
+        devices_by_node.setdefault(node, []).append(device)
+
+    binding = {}
+    for node, node_devices in devices_by_node.items():
+        cpus = nodes[node]
+        # CPU 不夠時不保留，避免裝置分不到 CPU
+        if len(cpus) - reserved_cpus >= len(node_devices):
+            cpus = cpus[reserved_cpus:]
+        per_device = max(len(cpus) // len(node_devices), 1)
+        for index, device in enumerate(node_devices):
+            device_cpus = cpus[index * per_device:(index + 1) * per_device] or cpus[-per_device:]
+            binding[device] = {
+                "node": node,
+                "cpus_allowed": format_cpulist(device_cpus),
+                "numa_mem_policy": f"bind:{node}" if len(nodes) > 1 else None,
+            }
+    return binding
+
+
+def fio_options(device_binding):
+    """plan_cpu_binding() 單一裝置的結果 -> fio 參數 dict"""
+    if not device_binding:
+        return {}
+    return {key: device_binding[key] for key in ("cpus_allowed", "numa_mem_policy") if device_binding.get(key)}
+
+
+def write_binding_report(binding, devices, output_file):
+    """把實際套用到 fio 的 CPU / memory 綁定寫入 CPU_Core_Binding.txt"""
+    with open(output_file, "a") as f:
+        for device in devices:
+            entry = binding.get(device)
+            if entry is None:
+                f.write(f"{device} (NUMA node unknown): not pinned\n")
+                continue
+            options = " ".join(f"--{k}={v}" for k, v in fio_options(entry).items())
+            f.write(f"{device} (NUMA node {entry['node']}): {options}\n")
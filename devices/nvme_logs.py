@@ -0,0 +1,278 @@
+import os
+import re
+import fcntl
+import ctypes
+import struct
+import logging
+import subprocess
+from dataclasses import dataclass, field, asdict
+
+# ---------- NVMe log page 解碼 ----------
+# 直接解析 log page 的原始 bytes，不再解析 nvme-cli / smartctl 的文字輸出。
+# 取得方式：優先用 NVMe admin passthrough ioctl（不產生子程序），失敗時改用一次
+# `nvme get-log --raw-binary`。解碼函式只吃 bytes，可以直接用擷取下來的 binary fixture 測試。
+LOG_ID_SMART = 0x02
+LOG_ID_VENDOR_SMART = 0xCA   # Intel / Solidigm additional SMART attributes
+SMART_LOG_LEN = 512
+VENDOR_SMART_LOG_LEN = 512
+IDENTIFY_LEN = 4096
+
+NVME_ADMIN_GET_LOG_PAGE = 0x02
+NVME_ADMIN_IDENTIFY = 0x06
+NVME_NSID_ALL = 0xFFFFFFFF
+# _IOWR('N', 0x41, struct nvme_admin_cmd)，struct 為 72 bytes
+NVME_IOCTL_ADMIN_CMD = 0xC0484E41
+_ADMIN_CMD_FORMAT = "<BBHIIIQQII6III"
+
+
+# ---------- 取得原始 bytes ----------
+def controller_path(device):
+    """nvme0n1 -> /dev/nvme0（admin 指令送到 controller character device）"""
+    match = re.match(r"^(nvme\d+)", device)
+    if not match:
+        raise ValueError(f"{device} is not an NVMe device")
+    return f"/dev/{match.group(1)}"
+
+
+def admin_passthrough(device, opcode, data_len, nsid=0, cdw10=0, cdw11=0, timeout_ms=5000):
+    """送出 NVMe admin 指令並回傳 data buffer（需要 root）"""
+    buffer = ctypes.create_string_buffer(data_len)
+    command = bytearray(struct.pack(
+        _ADMIN_CMD_FORMAT, opcode, 0, 0, nsid, 0, 0, 0, ctypes.addressof(buffer), 0, data_len,
+        cdw10, cdw11, 0, 0, 0, 0, timeout_ms, 0
+    ))
+    fd = os.open(controller_path(device), os.O_RDONLY)
+    try:
+        status = fcntl.ioctl(fd, NVME_IOCTL_ADMIN_CMD, command)
+    finally:
+        os.close(fd)
+    if status != 0:
+        raise OSError(f"NVMe admin opcode {opcode:#04x} on {device} failed with status {status:#x}")
+    return buffer.raw
+
+
+def _run_binary(command):
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise OSError(f"{' '.join(command)} failed (rc={result.returncode}): {result.stderr.decode(errors='ignore').strip()}")
+    return result.stdout
+
+
+def read_log_page(device, log_id, length):
+    """讀取一個 log page 的原始 bytes：admin passthrough，失敗時改用一次 nvme get-log"""
+    numd = length // 4 - 1
+    cdw10 = ((numd & 0xFFFF) << 16) | (log_id & 0xFF)
+    cdw11 = (numd >> 16) & 0xFFFF
+    try:
+        return admin_passthrough(device, NVME_ADMIN_GET_LOG_PAGE, length, NVME_NSID_ALL, cdw10, cdw11)
+    except OSError as e:
+        logging.debug(f"Admin passthrough get-log {log_id:#04x} on {device} failed ({e}), using nvme-cli")
+    return _run_binary(["nvme", "get-log", controller_path(device), f"--log-id={log_id}",
+                        f"--log-len={length}", "--raw-binary"])
+
+
+def read_identify_controller(device):
+    try:
+        return admin_passthrough(device, NVME_ADMIN_IDENTIFY, IDENTIFY_LEN, cdw10=1)
+    except OSError as e:
+        logging.debug(f"Admin passthrough identify on {device} failed ({e}), using nvme-cli")
+    return _run_binary(["nvme", "id-ctrl", controller_path(device), "--raw-binary"])
+
+
+# ---------- SMART / Health Information (Log Page 0x02) ----------
+def _u128(data, offset):
+    return int.from_bytes(data[offset:offset + 16], "little")
+
+
+@dataclass(frozen=True)
+class SmartLog:
+    # 欄位名稱與 nvme-cli `smart-log -o json` 相同；temperature 為 Kelvin
+    critical_warning: int
+    temperature: int
+    avail_spare: int
+    spare_thresh: int
+    percent_used: int
+    endurance_grp_critical_warning_summary: int
+    data_units_read: int
+    data_units_written: int
+    host_read_commands: int
+    host_write_commands: int
+    controller_busy_time: int
+    power_cycles: int
+    power_on_hours: int
+    unsafe_shutdowns: int
+    media_errors: int
+    num_err_log_entries: int
+    warning_temp_time: int
+    critical_comp_time: int
+    temperature_sensors: tuple
+    thm_temp1_trans_count: int
+    thm_temp2_trans_count: int
+    thm_temp1_total_time: int
+    thm_temp2_total_time: int
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < 232:
+            raise ValueError(f"SMART log page too short: {len(data)} bytes")
+        (critical_warning, temperature, avail_spare, spare_thresh, percent_used,
+         endurance_summary) = struct.unpack_from("<BHBBBB", data, 0)
+        warning_temp_time, critical_comp_time = struct.unpack_from("<II", data, 192)
+        sensors = struct.unpack_from("<8H", data, 200)
+        thm = struct.unpack_from("<4I", data, 216)
+        return cls(
+            critical_warning=critical_warning,
+            temperature=temperature,
+            avail_spare=avail_spare,
+            spare_thresh=spare_thresh,
+            percent_used=percent_used,
+            endurance_grp_critical_warning_summary=endurance_summary,
+            data_units_read=_u128(data, 32),
+            data_units_written=_u128(data, 48),
+            host_read_commands=_u128(data, 64),
+            host_write_commands=_u128(data, 80),
+            controller_busy_time=_u128(data, 96),
+            power_cycles=_u128(data, 112),
+            power_on_hours=_u128(data, 128),
+            unsafe_shutdowns=_u128(data, 144),
+            media_errors=_u128(data, 160),
+            num_err_log_entries=_u128(data, 176),
+            warning_temp_time=warning_temp_time,
+            critical_comp_time=critical_comp_time,
+            temperature_sensors=tuple(s for s in sensors if s),
+            thm_temp1_trans_count=thm[0],
+            thm_temp2_trans_count=thm[1],
+            thm_temp1_total_time=thm[2],
+            thm_temp2_total_time=thm[3],
+        )
+
+    @property
+    def temperature_c(self):
+        return self.temperature - 273
+
+    @property
+    def data_units_written_bytes(self):
+        # 1 data unit = 1000 個 512-byte sector
+        return self.data_units_written * 512000
+
+    @property
+    def data_units_read_bytes(self):
+        return self.data_units_read * 512000
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# ---------- Intel / Solidigm Additional SMART Attributes (Log Page 0xCA) ----------
+# 每個 attribute 12 bytes：id, reserved[2], normalized, reserved, raw[6], reserved
+VENDOR_SMART_ATTRIBUTES = {
+    0xAB: "program_fail_count",
+    0xAC: "erase_fail_count",
+    0xAD: "wear_leveling_count",
+    0xB8: "e2e_error_detect_count",
+    0xC7: "crc_error_count",
+    0xE2: "timed_workload_media_wear",
+    0xE3: "timed_workload_host_reads",
+    0xE4: "timed_workload_timer",
+    0xEA: "thermal_throttle_status",
+    0xF0: "retry_buffer_overflow_count",
+    0xF3: "pll_lock_loss_count",
+    0xF4: "nand_bytes_written",
+    0xF5: "host_bytes_written",
+}
+VENDOR_BYTES_WRITTEN_UNIT = 32 * 1024 * 1024  # 0xF4 / 0xF5 的單位為 32MiB
+
+
+@dataclass(frozen=True)
+class VendorSmartAttribute:
+    key: int
+    name: str
+    normalized: int
+    raw: int
+    raw_bytes: bytes = field(repr=False, default=b"")
+
+
+@dataclass(frozen=True)
+class VendorSmartLog:
+    attributes: dict
+
+    @classmethod
+    def from_bytes(cls, data):
+        attributes = {}
+        for offset in range(0, len(data) - 11, 12):
+            key, normalized = data[offset], data[offset + 3]
+            if key == 0:
+                break
+            raw_bytes = bytes(data[offset + 5:offset + 11])
+            name = VENDOR_SMART_ATTRIBUTES.get(key, f"attribute_{key:#04x}")
+            attributes[name] = VendorSmartAttribute(key, name, normalized, int.from_bytes(raw_bytes, "little"), raw_bytes)
+        return cls(attributes)
+
+    def raw(self, name):
+        attribute = self.attributes.get(name)
+        return attribute.raw if attribute else None
+
+    @property
+    def nand_bytes_written(self):
+        raw = self.raw("nand_bytes_written")
+        return raw * VENDOR_BYTES_WRITTEN_UNIT if raw is not None else None
+
+    @property
+    def host_bytes_written(self):
+        raw = self.raw("host_bytes_written")
+        return raw * VENDOR_BYTES_WRITTEN_UNIT if raw is not None else None
+
+    @property
+    def wear_leveling(self):
+        """0xAD raw = min / max / avg erase count (各 2 bytes)"""
+        attribute = self.attributes.get("wear_leveling_count")
+        if attribute is None:
+            return None
+        minimum, maximum, average = struct.unpack("<3H", attribute.raw_bytes)
+        return {"min": minimum, "max": maximum, "avg": average}
+
+    @property
+    def thermal_throttle(self):
+        """0xEA raw = throttle 百分比 (1 byte) + 次數 (4 bytes)"""
+        attribute = self.attributes.get("thermal_throttle_status")
+        if attribute is None:
+            return None
+        return {"percent": attribute.raw_bytes[0], "count": int.from_bytes(attribute.raw_bytes[1:5], "little")}
+
+
+# ---------- Identify Controller：溫度門檻 ----------
+@dataclass(frozen=True)
+class TemperatureThresholds:
+    warning_k: int   # WCTEMP
+    critical_k: int  # CCTEMP
+
+    @classmethod
+    def from_identify(cls, data):
+        warning_k, critical_k = struct.unpack_from("<HH", data, 266)
+        return cls(warning_k, critical_k)
+
+    @property
+    def warning_c(self):
+        return self.warning_k - 273 if self.warning_k else None
+
+    @property
+    def critical_c(self):
+        return self.critical_k - 273 if self.critical_k else None
+
+
+# ---------- 便利函式 ----------
+def get_smart_log(device):
+    return SmartLog.from_bytes(read_log_page(device, LOG_ID_SMART, SMART_LOG_LEN))
+
+
+def get_vendor_smart_log(device):
+    """不支援 0xCA 的裝置回傳 None"""
+    try:
+        return VendorSmartLog.from_bytes(read_log_page(device, LOG_ID_VENDOR_SMART, VENDOR_SMART_LOG_LEN))
+    except OSError as e:
+        logging.debug(f"Vendor SMART log not available on {device}: {e}")
+        return None
+
+
+def get_temperature_thresholds(device):
+    return TemperatureThresholds.from_identify(read_identify_controller(device))
@@ -3,183 +3,51 @@ import os
 import subprocess
 import logging
 
-def get_pcie_bdf(devices):
-    """取得 NVMe 裝置的 PCIe BDF"""
-    device_bdf_map = {}
-    for device in devices:
-        try:
-            bdf_path = f"/sys/block/{device}/device/address"
-            if os.path.exists(bdf_path):
-                with open(bdf_path, "r") as f:
-                    bdf = f.read().strip()
-                    device_bdf_map[device] = bdf
-            else:
-                print(f"⚠️ 找不到 {bdf_path}，請確認 {device} 是否為有效的 NVMe 裝置")
-                device_bdf_map[device] = None
-
-        except Exception as e:
-            print(f"❌ 無法獲取 {device} 的 PCIe BDF，錯誤：{e}")
-            device_bdf_map[device] = None
-
-    return device_bdf_map
-
-
-def setpci_for_devices(devices):
-    """為 NVMe 設備設定 PCIe 參數"""
-    for device in devices:
-        try:
-            bdf_path = f"/sys/block/{device}/device/address"
-            with open(bdf_path, "r") as f:
-                bdf = f.read().strip()
-
-            if not bdf:
-                logging.error(f"❌ 無法取得 {device} 的 BDF，跳過 PCIe 參數設定！")
-                continue
-
-            logging.info(f"✅ Found BDF {bdf} for {device}")
-
-            # 設定 PCIe 參數
-            cmd_power_limit = f"setpci -s {bdf} CAP_PM+10.b=00"
-            subprocess.run(cmd_power_limit, shell=True, capture_output=True, text=True, check=True)
-            logging.info(f"✅ Power limit adjusted for {device} ({bdf})")
-
-        except FileNotFoundError:
-            logging.error(f"❌ 找不到 {bdf_path}，無法獲取 {device} 的 BDF！")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"❌ 無法為 {device} ({bdf}) 設定 PCIe 參數，錯誤：{e}")
-
-
-def set_interrupt_Coalescing(devices, log_file):
-    """
-    設定 NVMe Interrupt Coalescing，並將 Log 存入 `log_file`
-    """
-    # 先詢問使用者是否要啟用 Interrupt Coalescing
-    enable_ic = input("Do you want to enable Interrupt Coalescing? (y/n): ").strip().lower()
-    if enable_ic != 'y':
-        print("Skipping Interrupt Coalescing configuration.")
-        return
-    
-    # 根據系統內的 NVMe 數量建議 threshold 值
-    num_nvme = len(devices)
-    if num_nvme == 8:
-        recommended_threshold = 3
-    elif num_nvme in [12, 16]:
-        recommended_threshold = 5  # 或者 9，讓使用者選擇
-    else:
-        recommended_threshold = 9  # 超過這個數值可能不會帶來效益
-    
-    print(f"System detected {num_nvme} NVMe devices.")
-    print(f"Recommended threshold value: {recommended_threshold}")
-    
-    # 讓使用者選擇 threshold 值
-    threshold = input(f"Enter threshold value (default={recommended_threshold}): ").strip()
-    if not threshold.isdigit():
-        threshold = recommended_threshold  # 使用推薦值
-    else:
-        threshold = int(threshold)
-    
-    for device in devices:
-        try:
-            # 去除設備名稱中的多餘空格或不可見字符
-            device = device.strip()
-            
-            # 使用正則表達式提取基礎設備名稱（僅保留 nvmeX）
-            match = re.match(r"^(nvme\d+)", device)
-            if match:
-                device_base = match.group(1)
-            else:
-                logging.error(f"Failed to extract base device name from: {device}")
-                continue
-            
-            # 設定 Interrupt Coalescing 參數
-            set_feature_Interrupt_Coalescing = (
-                f"nvme set-feature /dev/{device_base} -feature-id 0x08 --value 0x01{threshold:02X}"
-            )
-            
-            # 取得設定值來確認是否正確
-            get_feature_Interrupt_Coalescing = (
-                f"nvme get-feature /dev/{device_base} -feature-id 0x08"
-            )
-            
-            logging.info(f"Setting interrupt coalescing for /dev/{device_base} with threshold={threshold}")
-            subprocess.run(set_feature_Interrupt_Coalescing, shell=True, capture_output=True, text=True, check=True)
-            result = subprocess.run(get_feature_Interrupt_Coalescing, shell=True, capture_output=True, text=True, check=True)
-            
-            final_setting = result.stdout.strip()
-            
-            # 記錄結果到 `log_file`
-            logging.info(f"Interrupt coalescing set successfully for /dev/{device_base}: {final_setting}")
-            print(f"{device_base} interrupt coalescing setting: {final_setting}")
-            
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Failed to set interrupt coalescing for /dev/{device_base}: {e}")
-
+from devices.device_inventory import get_device_info
 
 #裝置設定
-# 這一段是有問題的  因為他邏輯是要抓bdf 但是下面自己的都能抓 所以或許可以刪掉 3/23
 def get_pcie_bdf(devices):
     """
-    取得 NVMe 裝置的 PCIe BDF（Bus-Device-Function）並回傳字典
+    取得 NVMe 裝置的 PCIe BDF（Bus-Device-Function）並回傳字典（來自 device_inventory 的快取，不重新掃描）
     :param devices: NVMe 裝置名稱清單，例如 ["nvme0n1", "nvme1n1"]
     :return: 字典 { "nvme0n1": "0000:02:00.0", "nvme1n1": "0000:03:00.0" }
     """
     device_bdf_map = {}
-
     for device in devices:
-        try:
-            # 使用正確的路徑來獲取 BDF
-            bdf_path = f"/sys/block/{device}/device/address"
-            if os.path.exists(bdf_path):
-                with open(bdf_path, "r") as f:
-                    bdf = f.read().strip()
-                    device_bdf_map[device] = bdf
-            else:
-                print(f"⚠️ 找不到 {bdf_path}，請確認 {device} 是否為有效的 NVMe 裝置")
-                device_bdf_map[device] = None
-
-        except Exception as e:
-            print(f"❌ 無法獲取 {device} 的 PCIe BDF，錯誤：{e}")
-            device_bdf_map[device] = None
-
+        info = get_device_info(device)
+        device_bdf_map[device] = info.bdf if info else None
+        if device_bdf_map[device] is None:
+            print(f"⚠️ 找不到 {device} 的 PCIe BDF，請確認 {device} 是否為有效的 NVMe 裝置")
     return device_bdf_map
 
 
 
 #裝置設定
 # **設定 PCIe 參數**
-def setpci_for_devices(devices):
+# 提高功耗限制 (CAP_PM+10) 並啟用 ASPM (CAP_PM+F)，設定DUT device to D0 stage
+PCIE_POWER_REGISTERS = {"CAP_PM+10.b": "00", "CAP_PM+F.b": "02"}
+
+
+def build_device_config(devices, coalescing_threshold=None):
     """
-    為指定的 NVMe 設備調整 PCIe 參數，例如提高功耗限制或啟用 ASPM。
-    :param devices: NVMe 裝置名稱清單，例如 ["nvme0n1", "nvme1n1"]
-    設定DUT device to D0 stage
+    產生 devices.feature_config.configure_devices() 使用的 desired state。
+    :param coalescing_threshold: Interrupt Coalescing threshold，None 表示不設定
     """
+    desired_state = {}
     for device in devices:
-        try:
-            # 先取得 BDF
-            bdf_path = f"/sys/block/{device}/device/address"
-            with open(bdf_path, "r") as f:
-                bdf = f.read().strip()  # 讀取 BDF，例如 '0000:02:00.0'
-
-            if not bdf:
-                logging.error(f"❌ 無法取得 {device} 的 BDF，跳過 PCIe 參數設定！")
-                continue
-
-            logging.info(f"✅ Found BDF {bdf} for {device}")
-
-            # 修改 PCIe 配置以提高功耗限制
-            cmd_power_limit = f"setpci -s {bdf} CAP_PM+10.b=00"
-            subprocess.run(cmd_power_limit, shell=True, capture_output=True, text=True, check=True)
-            logging.info(f"✅ Power limit adjusted for {device} ({bdf})")
-
-            # 啟用 ASPM（Active State Power Management）
-            cmd_aspm_enable = f"setpci -s {bdf} CAP_PM+F.b=02"
-            subprocess.run(cmd_aspm_enable, shell=True, capture_output=True, text=True, check=True)
-            logging.info(f"✅ ASPM enabled for {device} ({bdf})")
-
-        except FileNotFoundError:
-            logging.error(f"❌ 找不到 {bdf_path}，無法獲取 {device} 的 BDF！")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"❌ 無法為 {device} ({bdf}) 設定 PCIe 參數，錯誤：{e}")
+        info = get_device_info(device)
+        if info is None or not info.is_nvme:
+            logging.info(f"Skipping feature configuration for {device} (not NVMe)")
+            continue
+        features = {}
+        if info.bdf:
+            features["pcie_registers"] = dict(PCIE_POWER_REGISTERS)
+        else:
+            logging.error(f"❌ 無法取得 {device} 的 BDF，跳過 PCIe 參數設定！")
+        if coalescing_threshold is not None:
+            features["interrupt_coalescing"] = {"time": 1, "threshold": coalescing_threshold}
+        desired_state[device] = features
+    return desired_state
 
             
 #裝置設定
@@ -265,34 +133,29 @@ def save_after_lspci_output(device_bdf_map, output_dir="./lspci_outputs"):
 #裝置設定  
 # 設定 Interrupt Coalescing (適用於 Intel 平台)
 
-def set_interrupt_Coalescing(devices, output_file="interrupt_coalescing.txt"):
-    output_path = os.path.join(os.getcwd(), output_file)
-    
+def prompt_interrupt_coalescing(devices):
+    """
+    詢問是否啟用 Interrupt Coalescing 與 threshold 值；回傳 threshold，不啟用時回傳 None
+    """
     # 先詢問使用者是否要啟用 Interrupt Coalescing
     enable_ic = input("Do you want to enable Interrupt Coalescing? (y/n): ").strip().lower()
     if enable_ic != 'y':
         print("Skipping Interrupt Coalescing configuration.")
-        return
-    
+        return None
+
     # 過濾出 NVMe 裝置，排除 SATA
     nvme_devices = []
     for device in devices:
-        device = device.strip()
-        model_path = f"/sys/block/{device}/device/model"
-        if os.path.exists(model_path):
-            with open(model_path, "r") as f:
-                model_name = f.read().strip().lower()
-                if "nvme" in model_name:
-                    nvme_devices.append(device)
-                else:
-                    logging.info(f"Skipping {device} (not NVMe, model: {model_name})")
+        info = get_device_info(device.strip())
+        if info is not None and info.is_nvme:
+            nvme_devices.append(device)
         else:
-            logging.info(f"Skipping {device} (model information not available)")
+            logging.info(f"Skipping {device} (not NVMe)")
 
     # 若沒有 NVMe 裝置，則不執行設定
     if not nvme_devices:
         print("No NVMe devices found. Skipping Interrupt Coalescing configuration.")
-        return
+        return None
 
     # 根據系統內的 NVMe 數量建議 threshold 值
     num_nvme = len(nvme_devices)
@@ -312,39 +175,4 @@ def set_interrupt_Coalescing(devices, output_file="interrupt_coalescing.txt"):
         threshold = recommended_threshold  # 使用推薦值
     else:
         threshold = int(threshold)
-    
-    with open(output_path, "a") as log_file:
-        for device in nvme_devices:
-            try:
-                # 確保裝置名稱正確（僅處理 nvmeX）
-                match = re.match(r"^(nvme\d+)", device)
-                if match:
-                    device_base = match.group(1)
-                else:
-                    logging.error(f"Failed to extract NVMe base name from: {device}")
-                    continue
-                
-                # 設定 Interrupt Coalescing 參數
-                set_feature_Interrupt_Coalescing = (
-                    f"nvme set-feature /dev/{device_base} -feature-id 0x08 --value 0x01{threshold:02X}"
-                )
-                
-                # 取得設定值來確認是否正確
-                get_feature_Interrupt_Coalescing = (
-                    f"nvme get-feature /dev/{device_base} -feature-id 0x08"
-                )
-                
-                logging.info(f"Setting interrupt coalescing for /dev/{device_base} with threshold={threshold}")
-                subprocess.run(set_feature_Interrupt_Coalescing, shell=True, capture_output=True, text=True, check=True)
-                result = subprocess.run(get_feature_Interrupt_Coalescing, shell=True, capture_output=True, text=True, check=True)
-                
-                final_setting = result.stdout.strip()
-                
-                # 記錄結果到日誌與檔案
-                logging.info(f"Interrupt coalescing set successfully for /dev/{device_base}: {final_setting}")
-                log_file.write(f"{device_base}: {final_setting}\n")
-                print(f"{device_base} interrupt coalescing setting: {final_setting}")
-                
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Failed to set interrupt coalescing for /dev/{device_base}: {e}")
-                log_file.write(f"{device_base}: Failed to set interrupt coalescing\n")
+    return threshold
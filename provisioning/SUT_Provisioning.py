@@ -3,9 +3,15 @@
 import logging
 import subprocess
 import os
+import sys
 from datetime import datetime
 import openpyxl
 
+# ✅ 讓 script 可以直接執行（python3 provisioning/SUT_Provisioning.py）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from devices.device_inventory import get_inventory, get_device_info
+from devices import nvme_logs
+
 # Execute command and return output
 def run_command(command):
     try:
@@ -76,81 +82,47 @@ def get_power_state(device):
     return "Unknown"
 
 def get_nvme_devices():
-    """Get NVMe devices and their capacities."""
-    command = ["lshw", "-c", "storage", "-businfo"]
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        output = result.stdout
-    except subprocess.CalledProcessError as e:
-        print("Error running lshw:", e)
-        return []
-
+    """Get NVMe controllers and their capacities from the cached sysfs inventory."""
     rows = []
-    for line in output.splitlines()[2:]:
-        row = line.split(None, 3)
-        if len(row) >= 3 and "nvme" in row[1]:
-            bus_info = row[0]
-            device = row[1].replace("/dev/", "")  # 清理設備名稱
-            description = row[3] if len(row) > 3 else "Unknown"
-            capacity = get_device_capacity(device)  # 獲取設備容量
-            rows.append([bus_info, device, description, capacity])
+    seen_controllers = set()
+    for info in get_inventory().values():
+        if not info.is_nvme or info.controller in seen_controllers:
+            continue
+        seen_controllers.add(info.controller)
+        bus_info = f"pci@{info.bdf}" if info.bdf else "Unknown"
+        rows.append([bus_info, info.controller, info.model, info.capacity])
     return rows
 
 def get_device_capacity(device):
-    """Get NVMe device capacity using lsblk."""
-    try:
-        # 加上 n1 確保匹配完整設備名稱
-        full_device = f"{device}n1" if not device.endswith("n1") else device
-        
-        # 執行 lsblk，提取設備名稱和容量
-        output = run_command(f"lsblk -b -o NAME,SIZE")
-        for line in output.splitlines():
-            columns = line.split()
-            if full_device in columns[0]:  # 匹配設備名稱
-                size = int(columns[1])
-                return f"{size / 1e12:.2f} TB" if size >= 1e12 else f"{size / 1e9:.2f} GB"
-    except Exception as e:
-        print(f"Error retrieving capacity for {device}: {e}")
-    return "Unknown"
+    """Get NVMe device capacity from the cached sysfs inventory."""
+    # 加上 n1 確保匹配完整設備名稱
+    full_device = f"{device}n1" if not device.endswith("n1") else device
+    info = get_device_info(full_device)
+    return info.capacity if info else "Unknown"
 
 
 def get_nvme_firmware():
-    """Get NVMe firmware versions using nvme-cli."""
+    """Get NVMe firmware versions from the cached sysfs inventory."""
     firmware_info = {}
-    try:
-        command = ["nvme", "list"]
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        for line in result.stdout.splitlines()[2:]:  # 忽略標題行
-            columns = line.split()
-            if len(columns) >= 8:
-                device_full = columns[0].replace("/dev/", "")  # 提取 nvme0n1
-                firmware = columns[-1]  # Firmware 版本
-                # 同時保存 nvme0 和 nvme0n1 的映射
-                base_device_name = device_full.split("n")[0]
-                firmware_info[base_device_name] = firmware
-                firmware_info[device_full] = firmware
-        return firmware_info
-    except subprocess.CalledProcessError as e:
-        print(f"Error retrieving firmware versions: {e}")
+    for info in get_inventory().values():
+        if info.is_nvme:
+            # 同時保存 nvme0 和 nvme0n1 的映射
+            firmware_info[info.controller] = info.firmware
+            firmware_info[info.name] = info.firmware
     return firmware_info
 
 
 # Function to get temperature thresholds and current temperature using smartctl
 def get_temperature_thresholds(device):
-    """Get temperature thresholds and current temperature using smartctl."""
+    """Get temperature thresholds (Identify Controller) and current temperature (SMART log) without smartctl."""
     try:
-        full_device = f"/dev/{device}"  # 確保完整路徑名稱
-        result = subprocess.run(["sudo", "smartctl", "-a", full_device], capture_output=True, text=True, check=True)
-        warning, critical, current_temp = "Unknown", "Unknown", "Unknown"
-        for line in result.stdout.splitlines():
-            if "Warning  Comp. Temp. Threshold:" in line:
-                warning = line.split(":")[-1].strip()
-            elif "Critical Comp. Temp. Threshold:" in line:
-                critical = line.split(":")[-1].strip()
-            elif "Temperature:" in line and "Celsius" in line:
-                current_temp = line.split(":")[-1].strip().split()[0] + " Celsius"
+        thresholds = nvme_logs.get_temperature_thresholds(device)
+        smart_log = nvme_logs.get_smart_log(device)
+        warning = f"{thresholds.warning_c} Celsius" if thresholds.warning_c is not None else "Unknown"
+        critical = f"{thresholds.critical_c} Celsius" if thresholds.critical_c is not None else "Unknown"
+        current_temp = f"{smart_log.temperature_c} Celsius"
         return warning, critical, current_temp
-    except subprocess.CalledProcessError as e:
+    except (OSError, ValueError) as e:
         print(f"Error retrieving temperature for {device}: {e}")
         return "Error", "Error", "Error"
     
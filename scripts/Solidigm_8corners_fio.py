@@ -1,272 +1,598 @@
-#!/usr/bin/env python3
-
-import os
-import logging
-import subprocess
-import csv
-import re
-import json
-
-# 從其他模組 import 相關功能
-from utils.file_utils import find_result_file_name  # 取得測試結果 CSV 檔名
-from analysis.result_parser import parse_fio_output, write_to_csv  # 解析 FIO 輸出 & 寫入 CSV
-from devices.device_utils import get_drives  # 取得可用的儲存裝置
-
-# 🔹 設定 Device 對應的 Product Family
-product_families = {
-    "1": "D3_family_test_cases.json",
-    "2": "D5_family_test_cases.json",
-    "3": "D7_family_test_cases.json"
-}
-
-def select_product_family():
-    """
-    讓使用者選擇 Product Family，並返回測試案例的 JSON 設定。
-    """
-    test_config = None
-    selected_file = None
-
-    while True:
-        print("\n📂 Select a Product Family:")
-        for index, name in product_families.items():
-            print(f"{index}. {name}")
-
-        choice = input("Enter the index of the Product Family: ").strip()
-
-        if choice in product_families:
-            selected_file = os.path.join(os.getcwd(), "test_cases", product_families[choice])
-            print(f"🔍 Checking file: {selected_file}")
-
-            if os.path.exists(selected_file):
-                try:
-                    with open(selected_file, "r") as f:
-                        test_config = json.load(f)  # ✅ 存成變數返回
-                    print(f"✅ Loaded test config from {selected_file}")
-                    break
-                except Exception as e:
-                    print(f"❌ Error loading {selected_file}: {e}")
-                    return None, None  # 🚨 讀取失敗則返回 None
-            else:
-                print(f"❌ File not found: {selected_file}")
-                return None, None  # 🚨 找不到檔案則返回 None
-        else:
-            print("❌ Invalid choice. Please select again.")
-
-    if not test_config:  
-        print("❌ Failed to load test configuration.")
-        return None, None  # 🚨 避免後續 `NoneType` 錯誤
-
-    # 🔹 **選擇 SSD 型號**
-    print("\n📌 請選擇 SSD 型號（來自選擇的 JSON 檔案）:")
-    ssd_models = [model for model in test_config.keys() if not model.startswith("_")]  # ✅ 過濾掉 _comments 之類的 key
-
-    if not ssd_models:
-        print("❌ No valid SSD models found in the test configuration.")
-        return None, None  # 🚨 JSON 沒有 SSD 型號
-
-    for idx, model in enumerate(ssd_models, 1):
-        print(f"[{idx}] {model}")
-
-    try:
-        model_choice = int(input("輸入對應的型號編號: ").strip()) - 1
-        if model_choice < 0 or model_choice >= len(ssd_models):
-            raise ValueError("❌ 無效選擇")
-
-        selected_model = ssd_models[model_choice]
-        print(f"✅ 選擇的 SSD 型號: {selected_model}")
-
-        # 🚨 **確保 test_config[selected_model] 是字典**
-        model_config = test_config.get(selected_model, None)
-        if not isinstance(model_config, dict):
-            print(f"❌ Invalid test format for {selected_model}. Expected a dictionary, got {type(model_config)}")
-            return None, None
-
-    except ValueError as e:
-        print(f"❌ 錯誤: {e}")
-        return None, None  # 選擇錯誤則返回 None
-
-    return model_config, selected_model  # ✅ 回傳測試案例 & SSD 型號
-
-
-#FIO 測試
-# 執行 FIO 測試（封裝單個裝置的所有測試）
-def run_device_tests(device, tests, result_folder, runtime, market_name, form_factor, test_config, task_set=None, log_bandwidth=True):
-    try:
-        if not isinstance(tests, list):
-            raise ValueError(f"Invalid tests format: {tests}")
-
-        logging.info(f"\n🔧 Begin FIO test for device: {device}")
-        logging.info(f"📝 Executing test sequence for {device}:")
-        for i, test in enumerate(tests):
-            logging.info(f"  {i+1:02d}. {test.get('name', 'Unnamed')} | RW: {test.get('rw')} | BS: {test.get('bs')}")
-
-        for test in tests:
-            run_fio_test(
-                result_folder=result_folder,
-                device=device,
-                test_name=test["name"],
-                rw=test["rw"],
-                bs=test["bs"],
-                iodepth=test["iodepth"],
-                numjobs=test["numjobs"],
-                runtime=runtime,
-                market_name=market_name,
-                form_factor=form_factor,
-                test_config=test_config,
-                precondition=test.get("precondition", False),
-                rwmixread=test.get("rwmixread", None),
-                log_bandwidth=log_bandwidth
-            )
-
-    except Exception as e:
-        logging.error(f"❌ Error during tests for device {device}: {e}")
-        raise
-
-
-# **檢查 NVMe 總寫入量**
-import re
-import subprocess
-import os
-import logging
-
-def check_nvme_write(device, result_folder, test_name):
-    """
-    檢查 NVMe SSD 的 Data Units Written 並記錄到 log 檔案 & 獨立 nvme_write_log.txt
-    """
-    is_nvme = device.startswith("nvme")  # ✅ 更準確判斷是否為 NVMe
-
-    if not is_nvme:
-        logging.info(f"Skipping smart-log for {device} (not NVMe).")
-        return
-
-    cmd = f"nvme smart-log /dev/{device} | grep 'Data Units Written'"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-
-    nvme_log_file = os.path.join(result_folder, "nvme_write_log.txt")
-
-    with open(nvme_log_file, "a") as log_file:
-        if result.returncode == 0:
-            match = re.search(r"Data Units Written\s*:\s*([\d,]+)", result.stdout)
-            if match:
-                written_units = int(match.group(1).replace(",", ""))
-                total_written_gb = written_units * 512 / 1024
-                logging.info(f"Preconditioning [{test_name}] - NVMe {device} Total Data Written: {total_written_gb:.2f} GB")
-                log_file.write(f"Preconditioning [{test_name}] - NVMe {device} Total Data Written: {total_written_gb:.2f} GB\n")
-            else:
-                logging.error(f"❌ Failed to extract Data Units Written for {device}. Raw output:\n{result.stdout}")
-                log_file.write(f"❌ Failed to extract Data Units Written for {device}. Raw output:\n{result.stdout}\n")
-        else:
-            logging.error(f"❌ Error running smart-log for {device}")
-            log_file.write(f"❌ Error running smart-log for {device}\n")
-
-
-# FIO 測試  
-# 讀取 JSON 測試設定
-
-def run_fio_test(result_folder, device, test_name, rw, bs, iodepth, numjobs, runtime, 
-                 market_name, form_factor, test_config, precondition=False, rwmixread=None, log_bandwidth=True):
-    """
-    根據 JSON 設定執行 FIO 測試，包含 preconditioning，並自動將結果寫入 CSV。
-    """
-    fio_result_file = os.path.join(result_folder, f"fio_{test_name}_{device}.txt")
-    csv_filename = os.path.join(result_folder, f"{market_name}_fio_summary_results.csv")
-
-    is_nvme = device.startswith("nvme")
-
-    try:
-        if test_config is None:
-            logging.error(f"❌ test_config is None in run_fio_test for {device}. Skipping test.")
-            return
-
-        test_case_info = next((t for t in test_config.get("test_cases", []) if t.get("name") == test_name), {})
-        ioengine = test_case_info.get("ioengine", "libaio")
-
-        precondition_settings = test_config.get("precondition", {}).get(rw, {})
-        precondition_ioengine = precondition_settings.get("ioengine", "libaio")
-
-        detailed_log_path = os.path.join(result_folder, f"{device}_precondition_log", test_name)
-        os.makedirs(detailed_log_path, exist_ok=True)
-        pre_log_file = os.path.join(detailed_log_path, "precondition_bw.1.log")
-        test_log_file = os.path.join(detailed_log_path, "test_bw.1.log")
-
-        # ---------- Preconditioning ----------
-        if precondition and precondition_settings:
-            logging.info(f"⚙️ Running preconditioning for {test_name} on {device}...")
-
-            if is_nvme:
-                try:
-                    subprocess.run(f"blkdiscard /dev/{device}", shell=True, check=True)
-                    logging.info(f"✅ Discarded all blocks on {device} before preconditioning.")
-                except subprocess.CalledProcessError as e:
-                    logging.warning(f"⚠️ blkdiscard failed on {device}, trying 'nvme format'...")
-                    try:
-                        subprocess.run(f"nvme format /dev/{device} -s 1 -n 1", shell=True, check=True)
-                        logging.info(f"✅ Fallback to 'nvme format' succeeded on {device}.")
-                    except subprocess.CalledProcessError as e2:
-                        logging.error(f"❌ nvme format also failed on {device}: {e2}")
-                        precondition = False
-            else:
-                logging.info(f"Skipping blkdiscard on {device} (not NVMe).")
-
-            if precondition:
-                precondition_command = (
-                    f"fio --name=Preconditioning --filename=/dev/{device} --ioengine={precondition_ioengine} --direct=1 "
-                    f"--bs={precondition_settings['bs']} --rw={precondition_settings['rw']} "
-                    f"--iodepth={precondition_settings['iodepth']} --numjobs={precondition_settings['numjobs']} "
-                    f"--randrepeat=0 --norandommap --group_reporting "
-                    f"--write_bw_log={os.path.splitext(pre_log_file)[0]}"
-                )
-
-                if log_bandwidth:
-                    precondition_command += " --log_avg_msec=1000"
-
-                if precondition_settings.get("mode") == "runtime":
-                    precondition_command += f" --runtime={precondition_settings['value']} --time_based"
-                elif precondition_settings.get("mode") == "loop":
-                    precondition_command += f" --loops={precondition_settings['value']}"
-
-                if precondition_settings.get("fill_device"):
-                    precondition_command += " --size=100% --fill_device=1"
-
-                if "cpus_allowed" in precondition_settings:
-                    precondition_command += f" --cpus_allowed={precondition_settings['cpus_allowed']}"
-
-                subprocess.run(precondition_command, shell=True, check=True)
-                logging.info(f"✅ Preconditioning completed for {device}")
-
-                if is_nvme:
-                    check_nvme_write(device, result_folder, test_name)
-
-        # ---------- 正式 FIO 測試 ----------
-        logging.info(f"🚀 Running FIO test: {test_name} on {device}...")
-
-        fio_command = (
-            f"fio --name={test_name} --filename=/dev/{device} --rw={rw} --bs={bs} "
-            f"--iodepth={iodepth} --numjobs={numjobs} --ioengine={ioengine} --runtime={runtime} "
-            f"--direct=1 --group_reporting --norandommap --log_hist_msec=1000 --cpus_allowed_policy=split "
-            f"--write_bw_log={os.path.splitext(test_log_file)[0]}"
-        )
-
-        if log_bandwidth:
-            fio_command += " --log_avg_msec=1000"
-
-        if rw == "randrw" and rwmixread is not None:
-            fio_command += f" --rwmixread={rwmixread}"
-
-        logging.info(f"FIO command: {fio_command}")
-
-        result = subprocess.run(fio_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-        if result.returncode == 0:
-            logging.info(f"✅ FIO test {test_name} completed successfully on {device}")
-
-            total_bw, total_iops, test_runtime = parse_fio_output(result.stdout)
-            write_to_csv(csv_filename, [
-                device, test_name, total_bw, total_iops, iodepth, numjobs, ioengine, test_runtime
-            ])
-            logging.info(f"✅ FIO result saved to {csv_filename}")
-        else:
-            logging.error(f"❌ FIO test {test_name} failed on {device}:\nSTDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}")
-
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ Error during {test_name} on {device}: {e}")
+#!/usr/bin/env python3
+
+import os
+import logging
+import subprocess
+import csv
+import re
+import json
+
+# 從其他模組 import 相關功能
+from utils.file_utils import find_result_file_name  # 取得測試結果 CSV 檔名
+from analysis.result_parser import write_to_csv, load_fio_json, parse_fio_json, merge_fio_results, fio_result_to_row, format_fio_summary, nand_bytes_delta, write_amplification_columns, host_cpu_columns  # 解析 FIO JSON 輸出 & 寫入 CSV
+from devices.device_utils import get_drives  # 取得可用的儲存裝置
+from devices.numa_topology import fio_options as numa_fio_options  # NUMA CPU / memory 綁定
+from devices.erase_engine import erase_device, erase_devices, MODE_DISCARD  # blkdiscard / nvme format
+from scripts.fio_stream import run_fio_streaming, chain_status_callbacks  # 串流執行 FIO 並即時回報進度
+from scripts.steady_state import SteadyStateDetector  # preconditioning steady state 判定
+from scripts.smart_sampler import SmartSamplers, DEFAULT_SMART_INTERVAL, read_smart_log, smart_sample, read_write_counters  # 測試期間 SMART 取樣
+from scripts.host_cpu_monitor import HostCpuMonitor, bound_cpus  # 測試期間 host CPU / 中斷成本
+from analysis.latency_histogram import find_hist_logs, summarize_hist_logs, qos_columns  # latency 直方圖 → QoS 百分位
+from utils.run_journal import append_journal_entry, get_completed_phases, PHASE_PRECONDITION, PHASE_TEST, PHASE_PARSE  # 進度日誌 & resume
+from scripts.fio_jobfile import (  # fio 參數 & 多裝置 job file
+    build_precondition_options, build_test_options, options_to_cli,
+    render_job_file, write_job_file, device_job_name
+)
+
+# 🔹 設定 Device 對應的 Product Family
+product_families = {
+    "1": "D3_family_test_cases.json",
+    "2": "D5_family_test_cases.json",
+    "3": "D7_family_test_cases.json"
+}
+
+def select_product_family():
+    """
+    讓使用者選擇 Product Family，並返回測試案例的 JSON 設定。
+    """
+    test_config = None
+    selected_file = None
+
+    while True:
+        print("\n📂 Select a Product Family:")
+        for index, name in product_families.items():
+            print(f"{index}. {name}")
+
+        choice = input("Enter the index of the Product Family: ").strip()
+
+        if choice in product_families:
+            selected_file = os.path.join(os.getcwd(), "test_cases", product_families[choice])
+            print(f"🔍 Checking file: {selected_file}")
+
+            if os.path.exists(selected_file):
+                try:
+                    with open(selected_file, "r") as f:
+                        test_config = json.load(f)  # ✅ 存成變數返回
+                    print(f"✅ Loaded test config from {selected_file}")
+                    break
+                except Exception as e:
+                    print(f"❌ Error loading {selected_file}: {e}")
+                    return None, None  # 🚨 讀取失敗則返回 None
+            else:
+                print(f"❌ File not found: {selected_file}")
+                return None, None  # 🚨 找不到檔案則返回 None
+        else:
+            print("❌ Invalid choice. Please select again.")
+
+    if not test_config:  
+        print("❌ Failed to load test configuration.")
+        return None, None  # 🚨 避免後續 `NoneType` 錯誤
+
+    # 🔹 **選擇 SSD 型號**
+    print("\n📌 請選擇 SSD 型號（來自選擇的 JSON 檔案）:")
+    ssd_models = [model for model in test_config.keys() if not model.startswith("_")]  # ✅ 過濾掉 _comments 之類的 key
+
+    if not ssd_models:
+        print("❌ No valid SSD models found in the test configuration.")
+        return None, None  # 🚨 JSON 沒有 SSD 型號
+
+    for idx, model in enumerate(ssd_models, 1):
+        print(f"[{idx}] {model}")
+
+    try:
+        model_choice = int(input("輸入對應的型號編號: ").strip()) - 1
+        if model_choice < 0 or model_choice >= len(ssd_models):
+            raise ValueError("❌ 無效選擇")
+
+        selected_model = ssd_models[model_choice]
+        print(f"✅ 選擇的 SSD 型號: {selected_model}")
+
+        # 🚨 **確保 test_config[selected_model] 是字典**
+        model_config = test_config.get(selected_model, None)
+        if not isinstance(model_config, dict):
+            print(f"❌ Invalid test format for {selected_model}. Expected a dictionary, got {type(model_config)}")
+            return None, None
+
+    except ValueError as e:
+        print(f"❌ 錯誤: {e}")
+        return None, None  # 選擇錯誤則返回 None
+
+    return model_config, selected_model  # ✅ 回傳測試案例 & SSD 型號
+
+
+#FIO 測試
+# 執行 FIO 測試（封裝單個裝置的所有測試）
+def run_device_tests(device, tests, result_folder, runtime, market_name, form_factor, test_config, cpu_binding=None, log_bandwidth=True,
+                     status_interval=10, on_status=None, test_plan=None, resume=False, smart_interval=DEFAULT_SMART_INTERVAL,
+                     tuned_params=None):
+    """
+    依序執行裝置的所有測試。
+    test_plan 為 test_cases.test_scheduler.plan_test_sequence() 的結果時，依排程順序執行並略過重複的 preconditioning。
+    cpu_binding 為 devices.numa_topology.plan_cpu_binding() 中此裝置的項目，會套用到每個 fio job。
+    tuned_params 為 scripts.auto_tuner.load_tuned_params() 的結果時，以調整過的 iodepth / numjobs 取代 test case 的設定。
+    """
+    try:
+        if not isinstance(tests, list):
+            raise ValueError(f"Invalid tests format: {tests}")
+
+        if test_plan is None:
+            test_plan = [{"test": test, "precondition": test.get("precondition", False)} for test in tests]
+
+        logging.info(f"\n🔧 Begin FIO test for device: {device}")
+        logging.info(f"📝 Executing test sequence for {device}:")
+        for i, step in enumerate(test_plan):
+            test = step["test"]
+            logging.info(f"  {i+1:02d}. {test.get('name', 'Unnamed')} | RW: {test.get('rw')} | BS: {test.get('bs')} | Precondition: {step['precondition']}")
+
+        for step in test_plan:
+            test = step["test"]
+            tuned = (tuned_params or {}).get(test["name"])
+            if tuned:
+                logging.info(f"🎛️ {device} {test['name']}: using tuned iodepth={tuned['iodepth']} numjobs={tuned['numjobs']}")
+                test = {**test, "iodepth": tuned["iodepth"], "numjobs": tuned["numjobs"]}
+            run_fio_test(
+                result_folder=result_folder,
+                device=device,
+                test_name=test["name"],
+                rw=test["rw"],
+                bs=test["bs"],
+                iodepth=test["iodepth"],
+                numjobs=test["numjobs"],
+                runtime=runtime,
+                market_name=market_name,
+                form_factor=form_factor,
+                test_config=test_config,
+                precondition=step["precondition"],
+                rwmixread=test.get("rwmixread", None),
+                log_bandwidth=log_bandwidth,
+                status_interval=status_interval,
+                on_status=on_status,
+                resume=resume,
+                cpu_binding=cpu_binding,
+                smart_interval=smart_interval
+            )
+
+    except Exception as e:
+        logging.error(f"❌ Error during tests for device {device}: {e}")
+        raise
+
+
+# **檢查 NVMe 總寫入量**
+import re
+import subprocess
+import os
+import logging
+
+def check_nvme_write(device, result_folder, test_name):
+    """
+    檢查 NVMe SSD 的 Data Units Written 並記錄到 log 檔案 & 獨立 nvme_write_log.txt
+    """
+    is_nvme = device.startswith("nvme")  # ✅ 更準確判斷是否為 NVMe
+
+    if not is_nvme:
+        logging.info(f"Skipping smart-log for {device} (not NVMe).")
+        return
+
+    nvme_log_file = os.path.join(result_folder, "nvme_write_log.txt")
+
+    with open(nvme_log_file, "a") as log_file:
+        try:
+            smart_log = read_smart_log(device)
+        except RuntimeError as e:
+            logging.error(f"❌ Error running smart-log for {device}: {e}")
+            log_file.write(f"❌ Error running smart-log for {device}\n")
+            return
+
+        written_units = smart_sample(smart_log).get("data_units_written")
+        if isinstance(written_units, int):
+            # 1 data unit = 1000 個 512-byte sector
+            total_written_gb = written_units * 512000 / 1e9
+            message = f"Preconditioning [{test_name}] - NVMe {device} Total Data Written: {total_written_gb:.2f} GB"
+            if smart_log.get("nand_bytes_written") is not None:
+                message += f", NAND Written: {smart_log['nand_bytes_written'] / 1e9:.2f} GB"
+            logging.info(message)
+            log_file.write(message + "\n")
+        else:
+            logging.error(f"❌ Failed to extract Data Units Written for {device}. Raw output:\n{smart_log}")
+            log_file.write(f"❌ Failed to extract Data Units Written for {device}. Raw output:\n{smart_log}\n")
+
+
+# **latency 直方圖 → QoS 百分位**
+def summarize_qos(hist_files, log_path, label):
+    """合併 hist log 計算 QoS 百分位；沒有 hist log 或解析失敗時回傳 None（CSV 欄位為 N/A）"""
+    if not hist_files:
+        logging.warning(f"⚠️ No latency histogram logs for {label}")
+        return None
+    try:
+        return summarize_hist_logs(hist_files, interval_csv=os.path.join(log_path, "qos_intervals.csv"))
+    except (OSError, ValueError) as e:
+        logging.error(f"❌ Failed to merge latency histogram logs for {label}: {e}")
+        return None
+
+
+# **Preconditioning 前清除裝置**
+def discard_device(device):
+    """blkdiscard 整顆裝置，失敗時改用 nvme format；非 NVMe 裝置略過。回傳是否成功"""
+    return erase_device(device, MODE_DISCARD).success
+
+
+# **執行 Preconditioning fio（單一裝置或多裝置 job file 共用）**
+def run_precondition_fio(precondition_command, precondition_settings, json_file, steady_state_file, label,
+                         status_interval=10, on_status=None):
+    """
+    執行 preconditioning 並處理 steady state 提前結束。
+    :return: 寫入 CSV 的 precondition 說明；被中止時回傳 None；fio 失敗時 raise CalledProcessError
+    """
+    # 設定了 steady_state 時，達到 SNIA PTS 風格的穩態就提前結束 preconditioning
+    detector = None
+    if precondition_settings.get("steady_state"):
+        detector = SteadyStateDetector.from_settings(precondition_settings["steady_state"])
+
+    pre_result = run_fio_streaming(
+        precondition_command, status_interval=status_interval,
+        on_status=chain_status_callbacks(detector, on_status),
+        json_output_file=json_file, label=label
+    )
+
+    if detector is not None:
+        detector.save(steady_state_file)
+
+    if detector is not None and detector.reached:
+        logging.info(f"✅ {label} stopped early: {detector.reason}")
+        return f"steady state @ {detector.reached_at_sec:.0f}s"
+    if pre_result.aborted:
+        logging.error(f"❌ {label} aborted: {pre_result.abort_reason}")
+        return None
+    if pre_result.returncode != 0:
+        logging.error("\n".join(pre_result.stderr_tail))
+        raise subprocess.CalledProcessError(pre_result.returncode, precondition_command)
+
+    precondition_note = f"{precondition_settings.get('mode', 'full')} {precondition_settings.get('value', '')}".strip()
+    if detector is not None:
+        precondition_note += " (steady state not reached)"
+    return precondition_note
+
+
+# FIO 測試  
+# 讀取 JSON 測試設定
+
+def run_fio_test(result_folder, device, test_name, rw, bs, iodepth, numjobs, runtime, 
+                 market_name, form_factor, test_config, precondition=False, rwmixread=None, log_bandwidth=True,
+                 status_interval=10, on_status=None, resume=False, cpu_binding=None, smart_interval=DEFAULT_SMART_INTERVAL,
+                 ioengine=None):
+    """
+    根據 JSON 設定執行 FIO 測試，包含 preconditioning，並自動將結果寫入 CSV。
+    ioengine 為 None 時依 test_name 從 test_config 的 test case 取得（找不到時為 libaio）；
+    sweep / auto-tune 的量測點名稱與 test case 不同，需要明確傳入。
+    preconditioning 與正式測試期間每 smart_interval 秒記錄 SMART（smart_precondition.csv / smart_test.csv）。
+    正式測試期間記錄綁定 core 的 host CPU / 中斷成本（host_cpu_test.json），並寫入 CSV。
+    正式測試寫 latency 直方圖 log，合併後的 QoS 百分位寫入 CSV，每秒的百分位存成 qos_intervals.csv。
+    執行期間每 status_interval 秒回報一次 IOPS/BW/latency；on_status(event) 回傳 False 或原因字串即可中止。
+    每個完成的階段 (precondition / test / parse) 都會寫入 run_journal；resume=True 時略過已完成的階段。
+    """
+    fio_result_file = os.path.join(result_folder, f"fio_{test_name}_{device}.txt")
+    fio_json_file = os.path.join(result_folder, f"fio_{test_name}_{device}.json")
+    csv_filename = os.path.join(result_folder, f"{market_name}_fio_summary_results.csv")
+
+    is_nvme = device.startswith("nvme")
+
+    try:
+        if test_config is None:
+            logging.error(f"❌ test_config is None in run_fio_test for {device}. Skipping test.")
+            return
+
+        if ioengine is None:
+            test_case_info = next((t for t in test_config.get("test_cases", []) if t.get("name") == test_name), {})
+            ioengine = test_case_info.get("ioengine", "libaio")
+
+        precondition_settings = test_config.get("precondition", {}).get(rw, {})
+
+        detailed_log_path = os.path.join(result_folder, f"{device}_precondition_log", test_name)
+        os.makedirs(detailed_log_path, exist_ok=True)
+        pre_log_file = os.path.join(detailed_log_path, "precondition_bw.1.log")
+        pre_json_file = os.path.join(detailed_log_path, "precondition.json")
+        steady_state_file = os.path.join(detailed_log_path, "steady_state.json")
+        precondition_note = "none"
+        test_log_file = os.path.join(detailed_log_path, "test_bw.1.log")
+
+        # ---------- Resume: 略過已完成的階段 ----------
+        completed = get_completed_phases(result_folder) if resume else {}
+        if (device, test_name, PHASE_PARSE) in completed:
+            logging.info(f"⏭️ Skipping {test_name} on {device} (already completed in a previous run)")
+            return
+        test_done = (device, test_name, PHASE_TEST) in completed
+        # 測試前後的 NAND / host 寫入量快照（WAF），resume 時由 journal 取回
+        write_counters = completed.get((device, test_name, PHASE_TEST), {}).get("write_counters", {})
+        host_cpu = completed.get((device, test_name, PHASE_TEST), {}).get("host_cpu")
+        if (device, test_name, PHASE_PRECONDITION) in completed:
+            precondition = False
+            precondition_note = completed[(device, test_name, PHASE_PRECONDITION)].get("note", precondition_note)
+            logging.info(f"⏭️ Preconditioning for {test_name} on {device} already completed, skipping.")
+        elif test_done:
+            precondition = False
+
+        # ---------- Preconditioning ----------
+        if precondition and precondition_settings:
+            logging.info(f"⚙️ Running preconditioning for {test_name} on {device}...")
+
+            precondition = discard_device(device)
+
+            if precondition:
+                precondition_options = build_precondition_options(
+                    precondition_settings, os.path.splitext(pre_log_file)[0], log_bandwidth
+                )
+                precondition_options.update(numa_fio_options(cpu_binding))
+                precondition_command = (
+                    f"fio --name=Preconditioning --filename=/dev/{device} {options_to_cli(precondition_options)}"
+                )
+
+                with SmartSamplers({device: os.path.join(detailed_log_path, "smart_precondition.csv")}, smart_interval):
+                    precondition_note = run_precondition_fio(
+                        precondition_command, precondition_settings, pre_json_file, steady_state_file,
+                        f"Preconditioning {test_name}@{device}", status_interval, on_status
+                    )
+                if precondition_note is None:
+                    return
+                logging.info(f"✅ Preconditioning completed for {device}")
+                append_journal_entry(result_folder, PHASE_PRECONDITION, device, test_name,
+                                     {"json": pre_json_file, "note": precondition_note})
+
+                if is_nvme:
+                    check_nvme_write(device, result_folder, test_name)
+
+        # ---------- 正式 FIO 測試 ----------
+        if not test_done:
+            logging.info(f"🚀 Running FIO test: {test_name} on {device}...")
+
+            test_options = build_test_options(
+                rw, bs, iodepth, numjobs, ioengine, runtime,
+                os.path.splitext(test_log_file)[0], log_bandwidth, rwmixread,
+                hist_prefix=os.path.join(detailed_log_path, "test")
+            )
+            test_options.update(numa_fio_options(cpu_binding))
+            fio_command = (
+                f"fio --name={test_name} --filename=/dev/{device} {options_to_cli(test_options)} --output-format=json+"
+            )
+
+            logging.info(f"FIO command: {fio_command}")
+
+            write_counters = {"before": read_write_counters(device)}
+            smart_file = {device: os.path.join(detailed_log_path, "smart_test.csv")}
+            with HostCpuMonitor() as host_monitor, SmartSamplers(smart_file, smart_interval):
+                result = run_fio_streaming(
+                    fio_command, status_interval=status_interval, on_status=on_status,
+                    json_output_file=fio_json_file, label=f"{test_name}@{device}"
+                )
+            write_counters["after"] = read_write_counters(device)
+            # 未綁定 core 時統計全部 CPU（多裝置平行測試時會包含其他裝置的負載）
+            host_cpu = host_monitor.report(f"{test_name}@{device}", bound_cpus(cpu_binding),
+                                           os.path.join(detailed_log_path, "host_cpu_test.json"))
+
+            if result.aborted:
+                logging.error(f"❌ FIO test {test_name} aborted on {device}: {result.abort_reason} (partial JSON kept in {fio_json_file})")
+                return
+            if result.returncode != 0:
+                stderr_text = "\n".join(result.stderr_tail)
+                logging.error(f"❌ FIO test {test_name} failed on {device} (rc={result.returncode}):\nSTDERR:\n{stderr_text}")
+                return
+
+            logging.info(f"✅ FIO test {test_name} completed successfully on {device}")
+            append_journal_entry(result_folder, PHASE_TEST, device, test_name,
+                                 {"json": fio_json_file, "write_counters": write_counters, "host_cpu": host_cpu})
+        else:
+            logging.info(f"⏭️ FIO test {test_name} on {device} already completed, parsing {fio_json_file}")
+
+        # ---------- 解析結果 ----------
+        try:
+            fio_result = load_fio_json(fio_json_file)
+        except (OSError, ValueError) as e:
+            logging.error(f"❌ Failed to parse FIO JSON output {fio_json_file}: {e}")
+            return
+
+        with open(fio_result_file, "w") as f:
+            f.write(format_fio_summary(fio_result, device))
+
+        row = fio_result_to_row(device, test_name, fio_result, iodepth, numjobs, ioengine)
+        row["Precondition"] = precondition_note
+        row.update(write_amplification_columns(
+            fio_result.write.io_bytes, nand_bytes_delta(write_counters.get("before"), write_counters.get("after"))
+        ))
+        row.update(host_cpu_columns(host_cpu, fio_result.total_ios))
+        row.update(qos_columns(summarize_qos(find_hist_logs(detailed_log_path), detailed_log_path, f"{test_name}@{device}")))
+        write_to_csv(csv_filename, row)
+        append_journal_entry(result_folder, PHASE_PARSE, device, test_name, {"csv": csv_filename, "txt": fio_result_file})
+        logging.info(f"✅ FIO result saved to {csv_filename}")
+
+    except subprocess.CalledProcessError as e:
+        logging.error(f"❌ Error during {test_name} on {device}: {e}")
+
+
+# FIO 測試
+# 多裝置同步測試：每個測試產生一個 job file，所有裝置在同一個 fio process 中同時開始、同時結束
+SYNC_DEVICE_NAME = "ALL"
+
+
+def run_synchronized_tests(devices, tests, result_folder, runtime, market_name, test_config, log_bandwidth=True,
+                           status_interval=10, on_status=None, test_plan=None, resume=False, cpu_binding=None,
+                           smart_interval=DEFAULT_SMART_INTERVAL):
+    """依序執行所有測試，每個測試同時跑在所有裝置上；cpu_binding 為 plan_cpu_binding() 的結果"""
+    if test_plan is None:
+        test_plan = [{"test": test, "precondition": test.get("precondition", False)} for test in tests]
+
+    logging.info(f"\n🔧 Begin synchronized FIO tests on {len(devices)} devices: {', '.join(devices)}")
+    for step in test_plan:
+        run_synchronized_test(
+            devices, step["test"], result_folder, runtime, market_name, test_config,
+            precondition=step["precondition"], log_bandwidth=log_bandwidth,
+            status_interval=status_interval, on_status=on_status, resume=resume, cpu_binding=cpu_binding,
+            smart_interval=smart_interval
+        )
+
+
+def run_synchronized_test(devices, test, result_folder, runtime, market_name, test_config, precondition=False,
+                          log_bandwidth=True, status_interval=10, on_status=None, resume=False, cpu_binding=None,
+                          smart_interval=DEFAULT_SMART_INTERVAL):
+    """
+    以單一 fio job file 在所有裝置上同時執行一個測試，寫入每個裝置的結果以及系統總量 (Device = ALL)。
+    preconditioning 前清除失敗的裝置不做 preconditioning，也不列入正式測試（記錄在 journal 的 "excluded"）。
+    host CPU 成本：ALL 統計全部 CPU；有 cpu_binding 時每個裝置統計自己綁定的 core（同 node 的裝置共用 core）。
+    """
+    test_name = test["name"]
+    rw = test["rw"]
+    ioengine = test.get("ioengine", "libaio")
+    csv_filename = os.path.join(result_folder, f"{market_name}_fio_summary_results.csv")
+    fio_json_file = os.path.join(result_folder, f"fio_{test_name}_{SYNC_DEVICE_NAME}.json")
+    sync_log_path = os.path.join(result_folder, f"{SYNC_DEVICE_NAME}_precondition_log", test_name)
+    os.makedirs(sync_log_path, exist_ok=True)
+
+    def device_log_prefix(device, prefix):
+        path = os.path.join(result_folder, f"{device}_precondition_log", test_name)
+        os.makedirs(path, exist_ok=True)
+        return os.path.join(path, f"{prefix}_bw.1")
+
+    def smart_files(device_list, prefix):
+        return {d: os.path.join(result_folder, f"{d}_precondition_log", test_name, f"smart_{prefix}.csv") for d in device_list}
+
+    def device_options(device, prefix):
+        # 每個裝置的 job section 各自綁定到所在 NUMA node 的 CPU
+        options = {"write_bw_log": device_log_prefix(device, prefix)}
+        if prefix == "test":
+            options["write_hist_log"] = os.path.join(os.path.dirname(options["write_bw_log"]), prefix)
+        options.update(numa_fio_options((cpu_binding or {}).get(device)))
+        return options
+
+    try:
+        completed = get_completed_phases(result_folder) if resume else {}
+        if (SYNC_DEVICE_NAME, test_name, PHASE_PARSE) in completed:
+            logging.info(f"⏭️ Skipping synchronized {test_name} (already completed in a previous run)")
+            return
+        test_done = (SYNC_DEVICE_NAME, test_name, PHASE_TEST) in completed
+        write_counters = completed.get((SYNC_DEVICE_NAME, test_name, PHASE_TEST), {}).get("write_counters", {})
+        host_cpu = completed.get((SYNC_DEVICE_NAME, test_name, PHASE_TEST), {}).get("host_cpu") or {}
+        precondition_note = "none"
+        # 實際參與測試的裝置；resume 時沿用 journal 記錄的清單（之前被排除的裝置維持排除）
+        tested = list(devices)
+        if (SYNC_DEVICE_NAME, test_name, PHASE_PRECONDITION) in completed:
+            precondition = False
+            precondition_note = completed[(SYNC_DEVICE_NAME, test_name, PHASE_PRECONDITION)].get("note", precondition_note)
+            tested = completed[(SYNC_DEVICE_NAME, test_name, PHASE_PRECONDITION)].get("devices", tested)
+        elif test_done:
+            precondition = False
+        if test_done:
+            tested = completed[(SYNC_DEVICE_NAME, test_name, PHASE_TEST)].get("devices", tested)
+
+        # ---------- Preconditioning ----------
+        precondition_settings = test_config.get("precondition", {}).get(rw, {})
+        if precondition and precondition_settings:
+            logging.info(f"⚙️ Running synchronized preconditioning for {test_name}...")
+            erase_results = erase_devices(devices, MODE_DISCARD)
+            ready = [device for device in devices if erase_results[device].success]
+            excluded = [device for device in devices if device not in ready]
+            if not ready:
+                logging.error(f"❌ Erase failed on every device, skipping synchronized {test_name}")
+                return
+            if excluded:
+                logging.warning(f"⚠️ Excluding {', '.join(excluded)} from synchronized {test_name} (erase failed)")
+            tested = ready
+            options = build_precondition_options(precondition_settings, None, log_bandwidth)
+            per_device = {d: device_options(d, "precondition") for d in ready}
+            job_file = write_job_file(
+                result_folder, f"Preconditioning_{test_name}",
+                render_job_file("Preconditioning", options, ready, per_device)
+            )
+            with SmartSamplers(smart_files(ready, "precondition"), smart_interval):
+                precondition_note = run_precondition_fio(
+                    f"fio {job_file}", precondition_settings,
+                    os.path.join(sync_log_path, "precondition.json"),
+                    os.path.join(sync_log_path, "steady_state.json"),
+                    f"Preconditioning {test_name}@{SYNC_DEVICE_NAME}", status_interval, on_status
+                )
+            if precondition_note is None:
+                return
+            append_journal_entry(result_folder, PHASE_PRECONDITION, SYNC_DEVICE_NAME, test_name,
+                                 {"job_file": job_file, "note": precondition_note, "devices": ready,
+                                  "excluded": excluded})
+            for device in ready:
+                check_nvme_write(device, result_folder, test_name)
+
+        # ---------- 正式 FIO 測試 ----------
+        if not test_done:
+            options = build_test_options(
+                rw, test["bs"], test["iodepth"], test["numjobs"], ioengine, runtime,
+                None, log_bandwidth, test.get("rwmixread")
+            )
+            per_device = {d: device_options(d, "test") for d in tested}
+            job_file = write_job_file(result_folder, test_name, render_job_file(test_name, options, tested, per_device))
+            logging.info(f"🚀 Running synchronized FIO test: {test_name} (job file: {job_file})")
+
+            write_counters = {"before": {d: read_write_counters(d) for d in tested}}
+            with HostCpuMonitor() as host_monitor, SmartSamplers(smart_files(tested, "test"), smart_interval):
+                result = run_fio_streaming(
+                    f"fio {job_file} --output-format=json+", status_interval=status_interval, on_status=on_status,
+                    json_output_file=fio_json_file, label=f"{test_name}@{SYNC_DEVICE_NAME}"
+                )
+            write_counters["after"] = {d: read_write_counters(d) for d in tested}
+            host_cpu_file = os.path.join(sync_log_path, "host_cpu_test.json")
+            if cpu_binding:
+                host_cpu = {d: host_monitor.report(f"{test_name}@{d}", bound_cpus(cpu_binding.get(d))) for d in tested}
+                host_cpu[SYNC_DEVICE_NAME] = host_monitor.usage()
+                with open(host_cpu_file, "w") as f:
+                    json.dump(host_cpu, f, indent=2)
+            else:
+                host_cpu = {SYNC_DEVICE_NAME: host_monitor.report(f"{test_name}@{SYNC_DEVICE_NAME}", None, host_cpu_file)}
+            if result.aborted:
+                logging.error(f"❌ Synchronized FIO test {test_name} aborted: {result.abort_reason}")
+                return
+            if result.returncode != 0:
+                stderr_text = "\n".join(result.stderr_tail)
+                logging.error(f"❌ Synchronized FIO test {test_name} failed (rc={result.returncode}):\nSTDERR:\n{stderr_text}")
+                return
+            append_journal_entry(result_folder, PHASE_TEST, SYNC_DEVICE_NAME, test_name,
+                                 {"json": fio_json_file, "job_file": job_file, "write_counters": write_counters,
+                                  "host_cpu": host_cpu, "devices": tested})
+
+        # ---------- 解析結果：每個裝置 + 系統總量 ----------
+        with open(fio_json_file, "r") as f:
+            results = {r.jobname: r for r in parse_fio_json(f.read())}
+
+        device_results = []
+        nand_deltas = []
+        for device in tested:
+            fio_result = results.get(device_job_name(test_name, device))
+            if fio_result is None:
+                logging.error(f"❌ No result for {device} in {fio_json_file}")
+                continue
+            device_results.append(fio_result)
+            with open(os.path.join(result_folder, f"fio_{test_name}_{device}.txt"), "w") as f:
+                f.write(format_fio_summary(fio_result, device))
+            row = fio_result_to_row(device, test_name, fio_result, test["iodepth"], test["numjobs"], ioengine)
+            row["Precondition"] = precondition_note
+            nand_delta = nand_bytes_delta(write_counters.get("before", {}).get(device), write_counters.get("after", {}).get(device))
+            nand_deltas.append(nand_delta)
+            row.update(write_amplification_columns(fio_result.write.io_bytes, nand_delta))
+            row.update(host_cpu_columns(host_cpu.get(device), fio_result.total_ios))
+            device_log_path = os.path.join(result_folder, f"{device}_precondition_log", test_name)
+            row.update(qos_columns(summarize_qos(find_hist_logs(device_log_path), device_log_path, f"{test_name}@{device}")))
+            write_to_csv(csv_filename, row)
+
+        if device_results:
+            aggregate = merge_fio_results(device_results, jobname=f"{test_name}_{SYNC_DEVICE_NAME}")
+            with open(os.path.join(result_folder, f"fio_{test_name}_{SYNC_DEVICE_NAME}.txt"), "w") as f:
+                f.write(format_fio_summary(aggregate, f"{len(device_results)} devices"))
+            row = fio_result_to_row(SYNC_DEVICE_NAME, test_name, aggregate, test["iodepth"], test["numjobs"], ioengine)
+            row["Precondition"] = precondition_note
+            total_nand = sum(nand_deltas) if None not in nand_deltas else None
+            row.update(write_amplification_columns(aggregate.write.io_bytes, total_nand))
+            row.update(host_cpu_columns(host_cpu.get(SYNC_DEVICE_NAME), aggregate.total_ios))
+            all_hist_files = [f for d in tested for f in find_hist_logs(os.path.join(result_folder, f"{d}_precondition_log", test_name))]
+            row.update(qos_columns(summarize_qos(all_hist_files, sync_log_path, f"{test_name}@{SYNC_DEVICE_NAME}")))
+            write_to_csv(csv_filename, row)
+            logging.info(
+                f"📊 {test_name} system total on {len(device_results)} devices: "
+                f"{aggregate.total_iops:.0f} IOPS, {aggregate.total_bw_mbps:.2f} MB/s"
+            )
+
+        append_journal_entry(result_folder, PHASE_PARSE, SYNC_DEVICE_NAME, test_name, {"csv": csv_filename})
+
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        logging.error(f"❌ Error during synchronized {test_name}: {e}")
@@ -0,0 +1,235 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+from analysis.result_parser import load_fio_json
+from devices.device_inventory import get_device_info
+from scripts.Solidigm_8corners_fio import run_fio_test
+from scripts.smart_sampler import DEFAULT_SMART_INTERVAL
+from utils.file_utils import get_spec_json_path_by_product
+
+# ---------- fio 參數自動調整 ----------
+# 每個 test case 在有限的搜尋範圍內找出達到 spec_reference 目標、且 numjobs 與 outstanding IO 最少的
+# iodepth / numjobs：先跑粗網格，再在通過點與前一個未通過的 iodepth 之間二分細調。
+# 結果依 model / capacity / firmware 存到 TUNED_PARAMS_FILE，run_device_tests(tuned_params=...) 可直接套用。
+# bs 不在搜尋範圍內：spec 數值本身就是以 bs 定義（4KB / 16KB / 128KB），fio 預設 offset 已對齊 bs。
+# 快取是量測產生的資料，放在 data/（不進版本控制），不和 test_cases/ 的 test case JSON 放在一起；--tuned-params 可改路徑。
+TUNED_PARAMS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "tuned_parameters.json")
+TUNE_IODEPTHS = (1, 4, 16, 64, 256)
+TUNE_NUMJOBS = (1, 2, 4, 8, 16)
+DEFAULT_TUNE_RUNTIME = 60
+DEFAULT_MAX_RUNS = 20
+# 同一個 numjobs 下 iodepth 加倍，IOPS 增加不到此比例就視為飽和，不再往上加
+SATURATION_GAIN = 0.02
+# 量測點的 fio 輸出 / summary CSV / journal 放在結果資料夾下的子資料夾，
+# analyze_fio_results、results_db 匯入與繪圖只掃描結果資料夾本身，不會把調參結果當成正式結果
+AUTOTUNE_SUBFOLDER = "autotune"
+
+_cache_lock = threading.Lock()
+
+
+# ---------- spec 目標 ----------
+def spec_metric(test):
+    """test case -> spec_reference 的欄位名稱，例如 {"bs": "4k", "rw": "randread"} -> "4KB Random Read (KIOPs)" """
+    size = f"{test['bs'].upper().rstrip('B')}B"
+    names = {
+        "read": "Seq Read (MB/s)",
+        "write": "Seq Write (MB/s)",
+        "randread": "Random Read (KIOPs)",
+        "randwrite": "Random Write (KIOPs)",
+        "randrw": "Random Mixed 70/30 RR/RW (KIOPs)",
+    }
+    return f"{size} {names[test['rw']]}" if test["rw"] in names else None
+
+
+def load_spec_targets(model):
+    """
+    讀取 model 對應容量的 spec 值：{metric: value}。
+    model 格式與 test case JSON 相同，例如 "P5336-U2-PCIE4-61TB"（spec key 為 "P5336-U2"，容量取最接近者）。
+    """
+    spec_path = get_spec_json_path_by_product(model)
+    if not spec_path or not os.path.exists(spec_path):
+        return {}
+    with open(spec_path, "r") as f:
+        spec_data = json.load(f)
+    family_key = "-".join(model.split("-")[:2])
+    family = spec_data.get(family_key)
+    if not family:
+        logging.warning(f"⚠️ No spec entry for {family_key} in {spec_path}")
+        return {}
+    try:
+        capacity = float(model.split("-")[-1].upper().replace("TB", ""))
+    except ValueError:
+        return {}
+    diffs = [abs(float(c.replace("TB", "")) - capacity) for c in family["Capacity"]]
+    index = diffs.index(min(diffs))
+    if diffs[index] > 0.5:
+        logging.warning(f"⚠️ No spec capacity close to {capacity}TB for {family_key}")
+        return {}
+    return {metric: values[index] for metric, values in family.items()
+            if metric != "Capacity" and isinstance(values, list)}
+
+
+def measured_value(fio_result, metric):
+    """依 spec 單位回傳量測值：MB/s 或 KIOPs"""
+    if metric.endswith("(MB/s)"):
+        return fio_result.total_bw_mbps
+    return fio_result.total_iops / 1000
+
+
+# ---------- 快取 ----------
+def cache_key(model, device):
+    info = get_device_info(device)
+    capacity = info.capacity if info else "Unknown"
+    firmware = info.firmware if info else "Unknown"
+    return f"{model}|{capacity}|{firmware}"
+
+
+def load_tuned_params(key, cache_file=TUNED_PARAMS_FILE):
+    """回傳 {test_name: {"iodepth", "numjobs", ...}}；沒有快取時回傳 None"""
+    if not os.path.exists(cache_file):
+        return None
+    with open(cache_file, "r") as f:
+        return json.load(f).get(key)
+
+
+def save_tuned_params(key, test_name, entry, cache_file=TUNED_PARAMS_FILE):
+    with _cache_lock:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        cache = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                cache = json.load(f)
+        cache.setdefault(key, {})[test_name] = entry
+        with open(cache_file, "w") as f:
+            json.dump(cache, f, indent=2)
+
+
+# ---------- 搜尋 ----------
+def _cost(point):
+    # 優先減少 numjobs（CPU thread），其次減少 outstanding IO
+    return point["numjobs"], point["iodepth"] * point["numjobs"]
+
+
+def search_parameters(measure, target, iodepths=TUNE_IODEPTHS, numjobs_list=TUNE_NUMJOBS, max_runs=DEFAULT_MAX_RUNS):
+    """
+    :param measure: measure(iodepth, numjobs) -> 量測值（失敗時 None）
+    :param target: spec 目標；None 時找出飽和點（最低成本達到最大量測值 98% 的組合）
+    :return: (best_point, all_points)，point = {"iodepth", "numjobs", "value", "met"}
+    """
+    points = {}
+
+    def run(iodepth, numjobs):
+        if (iodepth, numjobs) not in points:
+            if len(points) >= max_runs:
+                return None
+            value = measure(iodepth, numjobs)
+            points[(iodepth, numjobs)] = {"iodepth": iodepth, "numjobs": numjobs, "value": value,
+                                          "met": value is not None and target is not None and value >= target}
+        return points[(iodepth, numjobs)]
+
+    # 1) 粗網格：numjobs 由少到多，iodepth 由小到大；飽和就換下一個 numjobs，通過就停止（numjobs 最少優先）
+    best = None
+    for numjobs in sorted(numjobs_list):
+        if best is not None:
+            break
+        previous = None
+        for iodepth in sorted(iodepths):
+            point = run(iodepth, numjobs)
+            if point is None or point["value"] is None:
+                break
+            if point["met"]:
+                if best is None or _cost(point) < _cost(best):
+                    best = point
+                break
+            if previous is not None and point["value"] < previous["value"] * (1 + SATURATION_GAIN):
+                break
+            previous = point
+
+    # 2) 細調：在通過的 iodepth 與前一個較小的粗網格 iodepth 之間二分
+    if best is not None:
+        lower = max((qd for qd in iodepths if qd < best["iodepth"]), default=0)
+        low, high = lower, best["iodepth"]
+        while high - low > 1:
+            middle = (low + high) // 2
+            point = run(middle, best["numjobs"])
+            if point is None:
+                break
+            if point["met"]:
+                high, best = middle, point
+            else:
+                low = middle
+        return best, list(points.values())
+
+    # 沒有任何組合達到 spec：回傳達到最大量測值 98% 的最低成本組合
+    measured = [p for p in points.values() if p["value"] is not None]
+    if not measured:
+        return None, list(points.values())
+    peak = max(p["value"] for p in measured)
+    return min((p for p in measured if p["value"] >= peak * 0.98), key=_cost), list(points.values())
+
+
+def autotune_device(device, tests, result_folder, model, form_factor, test_config, runtime=DEFAULT_TUNE_RUNTIME,
+                    cpu_binding=None, max_runs=DEFAULT_MAX_RUNS, resume=False, smart_interval=DEFAULT_SMART_INTERVAL,
+                    cache_file=TUNED_PARAMS_FILE):
+    """
+    對裝置的每個 test case 搜尋參數並寫入快取。每個量測點都是一次 run_fio_test()（結果寫到
+    <result_folder>/autotune/，不混入正式結果）；每個 test case 只在第一個點做 preconditioning。
+    :return: {test_name: entry}
+    """
+    targets = load_spec_targets(model)
+    key = cache_key(model, device)
+    tune_folder = os.path.join(result_folder, AUTOTUNE_SUBFOLDER)
+    os.makedirs(tune_folder, exist_ok=True)
+    logging.info(f"🎛️ Auto-tuning {device} ({key}), {runtime}s per point, at most {max_runs} points per test")
+    tuned = {}
+    for test in tests:
+        metric = spec_metric(test)
+        target = targets.get(metric)
+        if target is None:
+            logging.warning(f"⚠️ No spec target for {test['name']} ({metric}), tuning for saturation instead")
+        first_point = [True]
+
+        def measure(iodepth, numjobs, test=test, metric=metric):
+            point_name = f"{test['name']}_tune_QD{iodepth}_J{numjobs}"
+            run_fio_test(
+                result_folder=tune_folder, device=device, test_name=point_name, rw=test["rw"], bs=test["bs"],
+                iodepth=iodepth, numjobs=numjobs, runtime=runtime, market_name=f"{model}_autotune",
+                form_factor=form_factor, test_config=test_config,
+                precondition=first_point[0] and test.get("precondition", False),
+                rwmixread=test.get("rwmixread"), resume=resume, cpu_binding=cpu_binding, smart_interval=smart_interval,
+                ioengine=test.get("ioengine", "libaio")
+            )
+            first_point[0] = False
+            try:
+                value = measured_value(load_fio_json(os.path.join(tune_folder, f"fio_{point_name}_{device}.json")), metric or "")
+            except (OSError, ValueError) as e:
+                logging.error(f"❌ Tuning point {point_name} on {device} failed: {e}")
+                return None
+            logging.info(f"🎛️ {device} {test['name']} QD{iodepth} × {numjobs}: {value:.1f} (target {target})")
+            return value
+
+        best, points = search_parameters(measure, target, max_runs=max_runs)
+        if best is None:
+            logging.error(f"❌ Auto-tune of {test['name']} on {device} produced no result")
+            continue
+        entry = {
+            "iodepth": best["iodepth"],
+            "numjobs": best["numjobs"],
+            "metric": metric,
+            "target": target,
+            "measured": round(best["value"], 2),
+            "met_spec": best["met"],
+            "original": {"iodepth": test["iodepth"], "numjobs": test["numjobs"]},
+            "runs": len(points),
+            "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        save_tuned_params(key, test["name"], entry, cache_file)
+        tuned[test["name"]] = entry
+        status = "✅" if best["met"] else "⚠️ below spec,"
+        logging.info(f"{status} {device} {test['name']}: iodepth={best['iodepth']} numjobs={best['numjobs']} "
+                     f"({entry['measured']} vs spec {target}, was {test['iodepth']} × {test['numjobs']})")
+    return tuned
+
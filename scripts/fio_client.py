@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime
+
+# ✅ 讓 script 可以直接執行（python3 scripts/fio_client.py ...）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import setup_logging
+from analysis.result_parser import write_to_csv, parse_fio_json, merge_fio_results, fio_result_to_row, format_fio_summary
+from scripts.fio_jobfile import build_precondition_options, build_test_options, render_job_file, write_job_file
+from scripts.fio_stream import run_fio_streaming
+
+# ---------- 多主機控制模式 (fio --client) ----------
+# hosts 檔案格式：
+# {"hosts": [{"host": "10.0.0.11", "port": 8765, "devices": ["nvme0n1", "nvme1n1"]}, ...]}
+# 每台 SUT 先執行 `fio --server`（或 `fio --server=,<port>`），controller 把 job file 推送到各主機並收回 JSON 結果
+SYNC_DEVICE_NAME = "ALL"
+DEFAULT_STATUS_INTERVAL = 10
+
+
+def load_hosts(hosts_file):
+    with open(hosts_file, "r") as f:
+        data = json.load(f)
+    hosts = data.get("hosts", []) if isinstance(data, dict) else data
+    if not hosts:
+        raise ValueError(f"No hosts defined in {hosts_file}")
+    for entry in hosts:
+        if not entry.get("host") or not entry.get("devices"):
+            raise ValueError(f"Host entry needs 'host' and 'devices': {entry}")
+    return hosts
+
+
+def host_label(entry):
+    """CSV Host 欄位與檔名使用的名稱，例如 10.0.0.11 或 localhost:8766"""
+    return f"{entry['host']}:{entry['port']}" if entry.get("port") else entry["host"]
+
+
+def client_endpoint(entry):
+    """fio --client 的主機字串：hostname[,port]"""
+    return f"{entry['host']},{entry['port']}" if entry.get("port") else entry["host"]
+
+
+def _match_host(hosts, result):
+    for entry in hosts:
+        if entry["host"] == result.hostname and (not entry.get("port") or not result.port or entry["port"] == result.port):
+            return entry
+    return None
+
+
+def client_command(hosts, job_files):
+    """fio --client 指令：每台主機一組 --client=<host[,port]> <job file>"""
+    return "fio --output-format=json+ " + " ".join(
+        f"--client={client_endpoint(entry)} {job_files[host_label(entry)]}" for entry in hosts
+    )
+
+
+def run_client_fio(hosts, job_files, json_file, label, status_interval=DEFAULT_STATUS_INTERVAL):
+    """以一個 fio --client 指令同時在所有主機上執行各自的 job file"""
+    # 有 status-interval snapshot 時 stall watchdog 才會生效：主機斷線或 fio 卡住時不會無限等待
+    result = run_fio_streaming(client_command(hosts, job_files), status_interval=status_interval,
+                               json_output_file=json_file, label=label)
+    if result.aborted:
+        raise RuntimeError(f"fio client run '{label}' aborted: {result.abort_reason}")
+    if result.returncode != 0 or not result.final_json:
+        stderr_text = "\n".join(result.stderr_tail)
+        raise RuntimeError(f"fio client run '{label}' failed (rc={result.returncode}):\n{stderr_text}")
+    return parse_fio_json(result.final_json)
+
+
+def run_client_test(hosts, test, result_folder, runtime, market_name, test_config, precondition=False, log_bandwidth=True,
+                    status_interval=DEFAULT_STATUS_INTERVAL):
+    """
+    在所有主機的所有裝置上同時執行一個測試，結果寫入同一個 CSV（每個裝置一列，另有每台主機與整體的 ALL 列）。
+    bw log 留在各 SUT 上，不會傳回 controller。
+    """
+    test_name = test["name"]
+    rw = test["rw"]
+    ioengine = test.get("ioengine", "libaio")
+    csv_filename = os.path.join(result_folder, f"{market_name}_fio_summary_results.csv")
+
+    # ---------- Preconditioning ----------
+    # controller 無法在遠端執行 blkdiscard，改用 fio 的 trim 覆蓋整顆裝置，再依 JSON 設定填寫
+    precondition_settings = test_config.get("precondition", {}).get(rw, {})
+    if precondition and precondition_settings:
+        logging.info(f"⚙️ Running preconditioning for {test_name} on {len(hosts)} hosts...")
+        trim_options = {"ioengine": "sync", "direct": 1, "rw": "trim", "bs": "128m", "size": "100%", "group_reporting": True}
+        precondition_options = build_precondition_options(precondition_settings, None, log_bandwidth)
+        precondition_options.pop("write_bw_log", None)
+        for step, options in (("Trim", trim_options), ("Preconditioning", precondition_options)):
+            job_files = {
+                host_label(entry): write_job_file(
+                    result_folder, f"{step}_{test_name}_{host_label(entry).replace(':', '_')}",
+                    render_job_file(step, options, entry["devices"], {})
+                )
+                for entry in hosts
+            }
+            run_client_fio(hosts, job_files, os.path.join(result_folder, f"{step.lower()}_{test_name}_clients.json"),
+                           f"{step} {test_name}", status_interval)
+        logging.info(f"✅ Preconditioning completed for {test_name} on all hosts")
+
+    # ---------- 正式 FIO 測試 ----------
+    options = build_test_options(
+        rw, test["bs"], test["iodepth"], test["numjobs"], ioengine, runtime, None, log_bandwidth, test.get("rwmixread")
+    )
+    options.pop("write_bw_log", None)
+    options.pop("log_avg_msec", None)
+    job_files = {
+        host_label(entry): write_job_file(
+            result_folder, f"{test_name}_{host_label(entry).replace(':', '_')}",
+            render_job_file(test_name, options, entry["devices"], {})
+        )
+        for entry in hosts
+    }
+    logging.info(f"🚀 Running FIO test {test_name} on {len(hosts)} hosts...")
+    results = run_client_fio(hosts, job_files, os.path.join(result_folder, f"fio_{test_name}_clients.json"), test_name,
+                             status_interval)
+
+    # ---------- 解析結果 ----------
+    per_host = {}
+    for fio_result in results:
+        entry = _match_host(hosts, fio_result)
+        if entry is None or not fio_result.jobname.startswith(f"{test_name}_"):
+            logging.warning(f"⚠️ Ignoring unexpected client result {fio_result.jobname} from {fio_result.hostname}")
+            continue
+        host = host_label(entry)
+        device = fio_result.jobname[len(test_name) + 1:]
+        per_host.setdefault(host, []).append(fio_result)
+
+        with open(os.path.join(result_folder, f"fio_{test_name}_{host.replace(':', '_')}_{device}.txt"), "w") as f:
+            f.write(format_fio_summary(fio_result, device))
+        write_to_csv(csv_filename, fio_result_to_row(device, test_name, fio_result, test["iodepth"], test["numjobs"], ioengine, host=host))
+
+    all_results = []
+    for host, host_results in per_host.items():
+        all_results.extend(host_results)
+        aggregate = merge_fio_results(host_results, jobname=f"{test_name}_{SYNC_DEVICE_NAME}")
+        write_to_csv(csv_filename, fio_result_to_row(SYNC_DEVICE_NAME, test_name, aggregate, test["iodepth"], test["numjobs"], ioengine, host=host))
+
+    if len(per_host) > 1:
+        aggregate = merge_fio_results(all_results, jobname=f"{test_name}_{SYNC_DEVICE_NAME}")
+        write_to_csv(csv_filename, fio_result_to_row(SYNC_DEVICE_NAME, test_name, aggregate, test["iodepth"], test["numjobs"], ioengine, host=SYNC_DEVICE_NAME))
+        logging.info(
+            f"📊 {test_name} total on {len(per_host)} hosts / {len(all_results)} devices: "
+            f"{aggregate.total_iops:.0f} IOPS, {aggregate.total_bw_mbps:.2f} MB/s"
+        )
+    logging.info(f"✅ FIO result saved to {csv_filename}")
+
+
+def run_client_tests(hosts, tests, result_folder, runtime, market_name, test_config, log_bandwidth=True, test_plan=None,
+                     status_interval=DEFAULT_STATUS_INTERVAL):
+    if test_plan is None:
+        test_plan = [{"test": test, "precondition": test.get("precondition", False)} for test in tests]
+    for step in test_plan:
+        try:
+            run_client_test(hosts, step["test"], result_folder, runtime, market_name, test_config,
+                            precondition=step["precondition"], log_bandwidth=log_bandwidth,
+                            status_interval=status_interval)
+        except (RuntimeError, OSError, ValueError) as e:
+            logging.error(f"❌ Error during {step['test']['name']} on clients: {e}")
+
+
+# ---------- 主流程 ----------
+def main():
+    parser = argparse.ArgumentParser(description="Run test cases on multiple SUTs through fio client/server mode")
+    parser.add_argument("--hosts", required=True, help="hosts JSON 檔案（主機、port、裝置清單）")
+    parser.add_argument("--test-config", required=True, help="測試案例 JSON，例如 test_cases/D5_family_test_cases.json")
+    parser.add_argument("--model", required=True, help="測試案例 JSON 中的 SSD 型號，例如 P5336-U2-PCIE4-61TB")
+    parser.add_argument("--runtime", type=int, required=True, help="每個測試的 runtime（秒）")
+    parser.add_argument("--tests", nargs="*", help="只執行指定名稱的測試")
+    parser.add_argument("--base-path", default="/root/Solidigm_Performance_Testing_Tool", help="測試結果的根目錄")
+    parser.add_argument("--no-precondition", action="store_true", help="略過 preconditioning")
+    parser.add_argument("--status-interval", type=int, default=DEFAULT_STATUS_INTERVAL,
+                        help="即時狀態回報間隔（秒），同時用於偵測卡住的 fio；0 表示只取最終結果")
+    args = parser.parse_args()
+
+    with open(args.test_config, "r") as f:
+        test_config = json.load(f).get(args.model)
+    if not isinstance(test_config, dict):
+        print(f"❌ Model {args.model} not found in {args.test_config}")
+        sys.exit(1)
+
+    hosts = load_hosts(args.hosts)
+    tests = [t for t in test_config["test_cases"] if not args.tests or t["name"] in args.tests]
+    if args.no_precondition:
+        tests = [dict(t, precondition=False) for t in tests]
+
+    result_folder = os.path.join(args.base_path, f"{args.model}_TestResults_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(result_folder, exist_ok=True)
+    setup_logging(os.path.join(result_folder, "fio_tests.log"))
+    with open(os.path.join(result_folder, "fio_hosts.json"), "w") as f:
+        json.dump({"hosts": hosts}, f, indent=2)
+
+    logging.info(f"🌐 Controller mode: {', '.join(host_label(h) for h in hosts)}")
+    run_client_tests(hosts, tests, result_folder, args.runtime, args.model, test_config,
+                     status_interval=args.status_interval)
+    print("✅ All client tests completed. Results saved in:", result_folder)
+
+
+if __name__ == "__main__":
+    main()
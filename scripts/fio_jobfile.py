@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import os
+
+from analysis.result_parser import FIO_PERCENTILE_LIST
+
+# ---------- fio 參數產生 ----------
+# 單一裝置的命令列 (--key=value) 與多裝置 job file 共用同一份參數，避免兩邊設定不一致
+
+
+def build_precondition_options(settings, log_prefix, log_bandwidth=True):
+    """依 test case JSON 的 precondition 設定產生 fio 參數"""
+    options = {
+        "ioengine": settings.get("ioengine", "libaio"),
+        "direct": 1,
+        "bs": settings["bs"],
+        "rw": settings["rw"],
+        "iodepth": settings["iodepth"],
+        "numjobs": settings["numjobs"],
+        "randrepeat": 0,
+        "norandommap": True,
+        "group_reporting": True,
+        "write_bw_log": log_prefix,
+    }
+
+    if settings["rw"] == "randrw" and "rwmixread" in settings:
+        options["rwmixread"] = settings["rwmixread"]
+
+    if log_bandwidth:
+        options["log_avg_msec"] = 1000
+        # bw log 時間改用 Unix epoch (ms)，與 SMART 取樣 (scripts/smart_sampler.py) 同一個時鐘
+        options["log_unix_epoch"] = 1
+
+    if settings.get("mode") == "runtime":
+        options["runtime"] = settings["value"]
+        options["time_based"] = True
+    elif settings.get("mode") == "loop":
+        options["loops"] = settings["value"]
+
+    if settings.get("fill_device"):
+        options["size"] = "100%"
+        options["fill_device"] = 1
+
+    if "cpus_allowed" in settings:
+        options["cpus_allowed"] = settings["cpus_allowed"]
+
+    return options
+
+
+def build_test_options(rw, bs, iodepth, numjobs, ioengine, runtime, log_prefix, log_bandwidth=True, rwmixread=None,
+                       hist_prefix=None):
+    """
+    產生正式量測的 fio 參數。
+    hist_prefix 不為 None 時每 log_hist_msec 寫一次 completion latency 直方圖 (<hist_prefix>_clat_hist.<N>.log)，
+    由 analysis/latency_histogram.py 合併計算 QoS 百分位。
+    """
+    options = {
+        "rw": rw,
+        "bs": bs,
+        "iodepth": iodepth,
+        "numjobs": numjobs,
+        "ioengine": ioengine,
+        "runtime": runtime,
+        "direct": 1,
+        "group_reporting": True,
+        "norandommap": True,
+        "log_hist_msec": 1000,
+        "write_hist_log": hist_prefix,
+        "cpus_allowed_policy": "split",
+        "write_bw_log": log_prefix,
+        "percentile_list": FIO_PERCENTILE_LIST,
+    }
+
+    if log_bandwidth:
+        options["log_avg_msec"] = 1000
+        # bw log 時間改用 Unix epoch (ms)，與 SMART 取樣 (scripts/smart_sampler.py) 同一個時鐘
+        options["log_unix_epoch"] = 1
+
+    if rw == "randrw" and rwmixread is not None:
+        options["rwmixread"] = rwmixread
+
+    return options
+
+
+def options_to_cli(options):
+    """{"bs": "4k", "time_based": True} -> "--bs=4k --time_based" """
+    args = []
+    for key, value in options.items():
+        if value is True:
+            args.append(f"--{key}")
+        elif value is not None and value is not False:
+            args.append(f"--{key}={value}")
+    return " ".join(args)
+
+
+def _render_section(name, options):
+    lines = [f"[{name}]"]
+    for key, value in options.items():
+        if value is True:
+            lines.append(key)
+        elif value is not None and value is not False:
+            lines.append(f"{key}={value}")
+    return "\n".join(lines)
+
+
+# ---------- 多裝置同步 job file ----------
+# 每個裝置一個 job section，放在同一個 fio process 中同時開始、同時結束
+PER_DEVICE_OPTIONS = ("filename", "write_bw_log", "write_hist_log", "cpus_allowed", "numa_mem_policy")
+
+
+def device_job_name(name, device):
+    return f"{name}_{device}"
+
+
+def render_job_file(name, options, devices, per_device_options):
+    """
+    產生多裝置 fio job file 內容。
+
+    :param name: 測試名稱，section 名稱為 <name>_<device>
+    :param options: 所有裝置共用的 fio 參數（放在 [global]）
+    :param devices: 裝置清單，例如 ["nvme0n1", "nvme1n1"]
+    :param per_device_options: {device: {...}}，例如 filename、write_bw_log
+    """
+    global_options = {k: v for k, v in options.items() if k not in PER_DEVICE_OPTIONS}
+    sections = [_render_section("global", global_options)]
+    for device in devices:
+        section_options = {"filename": f"/dev/{device}"}
+        section_options.update(per_device_options.get(device, {}))
+        # 每個裝置各自一個 reporting group，JSON 中每個 section 有自己的結果
+        section_options["new_group"] = True
+        sections.append(_render_section(device_job_name(name, device), section_options))
+    return "\n\n".join(sections) + "\n"
+
+
+def write_job_file(result_folder, name, content):
+    job_dir = os.path.join(result_folder, "fio_jobs")
+    os.makedirs(job_dir, exist_ok=True)
+    job_file = os.path.join(job_dir, f"{name}.fio")
+    with open(job_file, "w") as f:
+        f.write(content)
+    return job_file
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+# ---------- watchdog ----------
+# 有 --status-interval 時，超過此秒數沒有任何 snapshot 視為 fio 卡住（至少為 3 個 status interval）
+DEFAULT_STALL_TIMEOUT_SEC = 300
+# 要求 fio 停止 (SIGINT) 後等待正常收尾的秒數，逾時即 kill
+FIO_STOP_GRACE_SEC = 30
+
+
+# ---------- 即時狀態事件 ----------
+@dataclass
+class FioStatusEvent:
+    """fio --status-interval 每個區間的即時統計（數值為該區間，不是累計）"""
+    label: str
+    elapsed_sec: float
+    interval_sec: float
+    read_iops: float = 0.0
+    write_iops: float = 0.0
+    read_bw_mbps: float = 0.0
+    write_bw_mbps: float = 0.0
+    read_clat_mean_us: float = None
+    write_clat_mean_us: float = None
+    snapshot: int = 0
+
+    @property
+    def total_iops(self):
+        return self.read_iops + self.write_iops
+
+    @property
+    def total_bw_mbps(self):
+        return self.read_bw_mbps + self.write_bw_mbps
+
+
+@dataclass
+class FioStreamResult:
+    """串流執行 fio 的最終結果"""
+    returncode: int
+    final_json: str = ""
+    stderr_tail: list = field(default_factory=list)
+    aborted: bool = False
+    abort_reason: str = ""
+    snapshots: int = 0
+
+
+def _cumulative_counters(doc):
+    """將一個 JSON snapshot 中所有 job 的累計數值加總（client 模式為 client_stats，略過 "All clients" 彙總列）"""
+    counters = {}
+    jobs = doc.get("jobs") or [j for j in doc.get("client_stats", []) if j.get("jobname") != "All clients"]
+    for job in jobs:
+        for direction in ("read", "write"):
+            d = job.get(direction, {})
+            clat = d.get("clat_ns", {})
+            c = counters.setdefault(direction, {"io_bytes": 0, "total_ios": 0, "clat_n": 0, "clat_sum": 0.0})
+            c["io_bytes"] += d.get("io_bytes", 0)
+            c["total_ios"] += d.get("total_ios", 0)
+            c["clat_n"] += clat.get("N", 0)
+            c["clat_sum"] += clat.get("mean", 0) * clat.get("N", 0)
+    return counters
+
+
+def _build_event(label, prev, curr, interval_sec, elapsed_sec, snapshot):
+    event = FioStatusEvent(label=label, elapsed_sec=elapsed_sec, interval_sec=interval_sec, snapshot=snapshot)
+    for direction in ("read", "write"):
+        c = curr.get(direction)
+        if not c:
+            continue
+        p = prev.get(direction, {"io_bytes": 0, "total_ios": 0, "clat_n": 0, "clat_sum": 0.0})
+        d_ios = c["total_ios"] - p["total_ios"]
+        d_bytes = c["io_bytes"] - p["io_bytes"]
+        d_n = c["clat_n"] - p["clat_n"]
+        setattr(event, f"{direction}_iops", d_ios / interval_sec if interval_sec > 0 else 0.0)
+        setattr(event, f"{direction}_bw_mbps", d_bytes / interval_sec / 1_000_000 if interval_sec > 0 else 0.0)
+        if d_n > 0:
+            setattr(event, f"{direction}_clat_mean_us", (c["clat_sum"] - p["clat_sum"]) / d_n / 1000)
+    return event
+
+
+def log_status_event(event):
+    """預設的 logger 輸出"""
+    parts = [f"📈 [{event.label}] t={event.elapsed_sec:.0f}s"]
+    if event.read_iops:
+        lat = f", clat {event.read_clat_mean_us:.1f}us" if event.read_clat_mean_us is not None else ""
+        parts.append(f"R: {event.read_iops:.0f} IOPS {event.read_bw_mbps:.1f}MB/s{lat}")
+    if event.write_iops:
+        lat = f", clat {event.write_clat_mean_us:.1f}us" if event.write_clat_mean_us is not None else ""
+        parts.append(f"W: {event.write_iops:.0f} IOPS {event.write_bw_mbps:.1f}MB/s{lat}")
+    logging.info(" | ".join(parts))
+
+
+def chain_status_callbacks(*callbacks):
+    """
+    將多個 on_status callback 串成一個，依序呼叫；第一個要求中止的結果會被回傳。
+    """
+    callbacks = [cb for cb in callbacks if cb is not None]
+
+    def _chained(event):
+        for cb in callbacks:
+            verdict = cb(event)
+            if verdict is False or isinstance(verdict, str):
+                return verdict
+        return None
+
+    return _chained
+
+
+def _drain_stderr(stream, tail):
+    for line in stream:
+        tail.append(line.rstrip("\n"))
+
+
+def _stop_fio(proc, label, grace_sec=FIO_STOP_GRACE_SEC):
+    """SIGINT 讓 fio 收尾；grace_sec 內沒有結束就 kill，確保不留下佔用裝置的 fio"""
+    if proc.poll() is not None:
+        return
+    try:
+        proc.send_signal(signal.SIGINT)
+        proc.wait(timeout=grace_sec)
+    except subprocess.TimeoutExpired:
+        logging.error(f"❌ fio ({label}) did not exit {grace_sec}s after SIGINT, killing it")
+        proc.kill()
+        proc.wait()
+
+
+def _watchdog(proc, result, activity, stop, label, timeout_sec, stall_timeout_sec):
+    """每秒檢查一次：超過總時間上限或太久沒有 snapshot 時中止 fio"""
+    while not stop.wait(1.0):
+        now = time.monotonic()
+        if timeout_sec and now - activity["start"] > timeout_sec:
+            reason = f"fio exceeded the {timeout_sec}s timeout"
+        elif stall_timeout_sec and now - activity["last_snapshot"] > stall_timeout_sec:
+            reason = f"no fio status snapshot for {stall_timeout_sec}s"
+        else:
+            continue
+        if not result.aborted:
+            result.aborted = True
+            result.abort_reason = reason
+        logging.error(f"⛔ Stopping fio ({label}): {reason}")
+        # 讀取迴圈仍卡在 stdout 上，由 watchdog thread 負責停止 fio
+        _stop_fio(proc, label)
+        return
+
+
+# ---------- 串流執行 fio ----------
+def run_fio_streaming(fio_command, status_interval=10, on_status=None, json_output_file=None, label="fio",
+                      timeout_sec=None, stall_timeout_sec=DEFAULT_STALL_TIMEOUT_SEC):
+    """
+    以 Popen 執行 fio，透過 --status-interval 的 JSON snapshot 即時回報每個區間的 IOPS / BW / latency。
+
+    :param fio_command: fio 指令字串（不要包含 --output=，最終 JSON 由這裡寫出）
+    :param status_interval: snapshot 間隔（秒）；None 或 0 表示只取最終結果
+    :param on_status: callback(FioStatusEvent)；回傳 False 或字串（原因）會中止 fio
+    :param json_output_file: 最終 JSON 結果寫入的檔案
+    :param label: log 中顯示的名稱，例如 "4KB_Random_Read@nvme0n1"
+    :param timeout_sec: 整體執行時間上限（秒）；None 表示不限制
+    :param stall_timeout_sec: 沒有 snapshot 的時間上限（秒），只在有 status_interval 時有效；None 表示不檢查
+    :return: FioStreamResult（watchdog 中止時 aborted=True，abort_reason 說明原因）
+
+    讀取過程中發生例外（包含 on_status 的例外與 KeyboardInterrupt）時會先停止 fio 再往外拋，不會留下孤兒 fio。
+
+    記憶體只保留目前正在讀取的 snapshot 與上一份累計數值，與執行時間長短無關。
+    """
+    args = shlex.split(fio_command)
+    if not any(a.startswith("--output-format") for a in args):
+        args.append("--output-format=json")
+    if status_interval:
+        args.append(f"--status-interval={status_interval}")
+
+    logging.info(f"▶️ Streaming fio ({label}): {' '.join(args)}")
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+
+    stderr_tail = deque(maxlen=200)
+    stderr_thread = threading.Thread(target=_drain_stderr, args=(proc.stderr, stderr_tail), daemon=True)
+    stderr_thread.start()
+
+    result = FioStreamResult(returncode=-1)
+    start = time.monotonic()
+    last_time = start
+    prev_counters = {}
+    doc_lines = None
+    last_doc = ""
+
+    if status_interval and stall_timeout_sec:
+        stall_timeout_sec = max(stall_timeout_sec, 3 * status_interval)
+    else:
+        stall_timeout_sec = None
+    activity = {"start": start, "last_snapshot": start}
+    stop_watchdog = threading.Event()
+    if timeout_sec or stall_timeout_sec:
+        threading.Thread(target=_watchdog, args=(proc, result, activity, stop_watchdog, label, timeout_sec,
+                                                 stall_timeout_sec), daemon=True).start()
+
+    try:
+        for line in proc.stdout:
+            if doc_lines is None:
+                if line.startswith("{"):
+                    doc_lines = [line]
+                continue
+
+            doc_lines.append(line)
+            if line.rstrip("\n") != "}":
+                continue
+
+            text = "".join(doc_lines)
+            doc_lines = None
+            try:
+                doc = json.loads(text)
+            except json.JSONDecodeError:
+                logging.debug(f"Skipping unparsable fio snapshot from {label}")
+                continue
+
+            last_doc = text
+            result.snapshots += 1
+            now = time.monotonic()
+            activity["last_snapshot"] = now
+            counters = _cumulative_counters(doc)
+            event = _build_event(label, prev_counters, counters, now - last_time, now - start, result.snapshots)
+            prev_counters, last_time = counters, now
+
+            if result.aborted:
+                continue
+
+            log_status_event(event)
+            if on_status is not None:
+                verdict = on_status(event)
+                if verdict is False or isinstance(verdict, str):
+                    result.aborted = True
+                    result.abort_reason = verdict if isinstance(verdict, str) else "aborted by status callback"
+                    logging.warning(f"⛔ Stopping fio ({label}): {result.abort_reason}")
+                    # SIGINT 讓 fio 正常收尾並輸出最終結果
+                    proc.send_signal(signal.SIGINT)
+        result.returncode = proc.wait()
+    finally:
+        stop_watchdog.set()
+        _stop_fio(proc, label)
+
+    stderr_thread.join(timeout=5)
+    result.stderr_tail = list(stderr_tail)
+    result.final_json = last_doc
+
+    if json_output_file and last_doc:
+        with open(json_output_file, "w") as f:
+            f.write(last_doc)
+
+    return result
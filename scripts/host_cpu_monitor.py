@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import logging
+
+from devices.numa_topology import SYSFS_ROOT, get_numa_nodes, parse_cpulist
+
+# ---------- Host CPU / 中斷成本 ----------
+# 在每個 fio 測試前後讀取 /proc/stat、/proc/softirqs、/proc/interrupts，以差值計算測試期間
+# 每顆 core / 每個 NUMA node 的使用率、NVMe 中斷數與 BLOCK softirq 數，用來判斷瓶頸在 host 還是裝置。
+PROC_ROOT = "/proc"
+SATURATION_BUSY_PCT = 90.0
+
+# /proc/stat cpu 行前 8 欄：user nice system idle iowait irq softirq steal（guest 已包含在 user 內）
+_STAT_FIELDS = ("user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal")
+
+
+def _read_lines(path):
+    with open(path, "r") as f:
+        return f.read().splitlines()
+
+
+def read_proc_stat(proc_root=PROC_ROOT):
+    """回傳 {cpu_id: {field: jiffies}}，整體合計的 key 為 "all" """
+    stats = {}
+    for line in _read_lines(os.path.join(proc_root, "stat")):
+        if not line.startswith("cpu"):
+            continue
+        parts = line.split()
+        key = "all" if parts[0] == "cpu" else int(parts[0][3:])
+        values = [int(v) for v in parts[1:1 + len(_STAT_FIELDS)]]
+        values += [0] * (len(_STAT_FIELDS) - len(values))
+        stats[key] = dict(zip(_STAT_FIELDS, values))
+    return stats
+
+
+def _read_per_cpu_table(path):
+    """解析 /proc/softirqs 或 /proc/interrupts：回傳 (cpu_ids, [(key, [counts], name), ...])"""
+    lines = _read_lines(path)
+    cpu_ids = [int(name[3:]) for name in lines[0].split()]
+    rows = []
+    for line in lines[1:]:
+        key, _, rest = line.strip().partition(":")
+        fields = rest.split()
+        counts = []
+        for value in fields[:len(cpu_ids)]:
+            if not value.isdigit():
+                break
+            counts.append(int(value))
+        name = fields[-1] if len(fields) > len(counts) else key
+        rows.append((key, counts, name))
+    return cpu_ids, rows
+
+
+def read_softirqs(proc_root=PROC_ROOT):
+    """回傳 {softirq 名稱: {cpu_id: count}}，例如 {"BLOCK": {0: 123, 1: 45}}"""
+    cpu_ids, rows = _read_per_cpu_table(os.path.join(proc_root, "softirqs"))
+    return {key: dict(zip(cpu_ids, counts)) for key, counts, _ in rows}
+
+
+def read_nvme_interrupts(proc_root=PROC_ROOT):
+    """回傳所有 nvmeXqY 中斷在每顆 CPU 上的次數合計 {cpu_id: count}"""
+    cpu_ids, rows = _read_per_cpu_table(os.path.join(proc_root, "interrupts"))
+    totals = dict.fromkeys(cpu_ids, 0)
+    for key, counts, name in rows:
+        if key.isdigit() and name.startswith("nvme"):
+            for cpu, count in zip(cpu_ids, counts):
+                totals[cpu] += count
+    return totals
+
+
+def read_cpu_mhz(proc_root=PROC_ROOT):
+    """/proc/cpuinfo 中所有 CPU 的平均 MHz；無資料（例如部分 ARM 平台）時回傳 None"""
+    try:
+        values = [float(line.split(":")[1]) for line in _read_lines(os.path.join(proc_root, "cpuinfo"))
+                  if line.lower().startswith("cpu mhz")]
+    except (OSError, ValueError):
+        return None
+    return sum(values) / len(values) if values else None
+
+
+def take_snapshot(proc_root=PROC_ROOT):
+    return {
+        "time": time.monotonic(),
+        "stat": read_proc_stat(proc_root),
+        "softirqs": read_softirqs(proc_root),
+        "nvme_irqs": read_nvme_interrupts(proc_root),
+    }
+
+
+class HostCpuMonitor:
+    """
+    記錄一段測試期間的 host CPU 成本（with 區塊結束時一定會 stop，fio 失敗或 Ctrl+C 也一樣）：
+
+        with HostCpuMonitor() as monitor:
+            run_fio_streaming(...)
+        usage = monitor.usage(cpus=[4, 5, 6, 7])
+    """
+
+    def __init__(self, proc_root=PROC_ROOT, sysfs_root=SYSFS_ROOT, threshold_pct=SATURATION_BUSY_PCT):
+        self.proc_root = proc_root
+        self.sysfs_root = sysfs_root
+        self.threshold_pct = threshold_pct
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._begin = None
+        self._end = None
+        self._cpu_mhz = None
+
+    def start(self):
+        self._begin = take_snapshot(self.proc_root)
+        return self
+
+    def stop(self):
+        self._end = take_snapshot(self.proc_root)
+        self._cpu_mhz = read_cpu_mhz(self.proc_root)
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _core_delta(self, cpu):
+        before, after = self._begin["stat"].get(cpu), self._end["stat"].get(cpu)
+        if before is None or after is None:
+            return None
+        # CPU offline / online 後計數器可能歸零，負值視為 0
+        return {field: max(0, after[field] - before[field]) for field in _STAT_FIELDS}
+
+    @staticmethod
+    def _busy_pct(delta):
+        total = sum(delta.values())
+        if total <= 0:
+            return 0.0
+        return 100.0 * (total - delta["idle"] - delta["iowait"]) / total
+
+    def usage(self, cpus=None):
+        """
+        回傳測試期間的 CPU 成本摘要（dict，可直接存 JSON / journal）。
+        :param cpus: 只統計這些 CPU（例如 fio 綁定的 core）；None 表示全部 CPU
+        """
+        if self._begin is None or self._end is None:
+            raise RuntimeError("HostCpuMonitor.usage() called before start()/stop()")
+        all_cpus = sorted(k for k in self._end["stat"] if k != "all")
+        cpus = sorted(set(cpus) & set(all_cpus)) if cpus else all_cpus
+
+        per_cpu = {}
+        busy_jiffies = irq_jiffies = total_jiffies = 0
+        for cpu in cpus:
+            delta = self._core_delta(cpu)
+            if delta is None:
+                continue
+            per_cpu[cpu] = round(self._busy_pct(delta), 2)
+            total = sum(delta.values())
+            total_jiffies += total
+            busy_jiffies += total - delta["idle"] - delta["iowait"]
+            irq_jiffies += delta["irq"] + delta["softirq"]
+
+        per_node = {}
+        for node, node_cpus in get_numa_nodes(self.sysfs_root).items():
+            node_busy = [per_cpu[c] for c in node_cpus if c in per_cpu]
+            if node_busy:
+                per_node[node] = round(sum(node_busy) / len(node_busy), 2)
+
+        block = self._end["softirqs"].get("BLOCK", {})
+        block_before = self._begin["softirqs"].get("BLOCK", {})
+        max_cpu = max(per_cpu, key=per_cpu.get) if per_cpu else None
+        saturated = [cpu for cpu, pct in per_cpu.items() if pct >= self.threshold_pct]
+        return {
+            "window_sec": round(self._end["time"] - self._begin["time"], 3),
+            "cpus": cpus,
+            "busy_pct": round(100.0 * busy_jiffies / total_jiffies, 2) if total_jiffies else 0.0,
+            "irq_softirq_pct": round(100.0 * irq_jiffies / total_jiffies, 2) if total_jiffies else 0.0,
+            "busy_usec": busy_jiffies * 1_000_000 / self.clock_ticks,
+            "max_core": max_cpu,
+            "max_core_pct": per_cpu.get(max_cpu, 0.0),
+            "saturated_cpus": saturated,
+            "nvme_irqs": sum(self._end["nvme_irqs"].get(c, 0) - self._begin["nvme_irqs"].get(c, 0) for c in cpus),
+            "block_softirqs": sum(block.get(c, 0) - block_before.get(c, 0) for c in cpus),
+            "cpu_mhz": self._cpu_mhz,
+            "per_cpu_busy_pct": per_cpu,
+            "per_node_busy_pct": per_node,
+        }
+
+    def report(self, label, cpus=None, output_file=None):
+        """計算 usage，超過門檻的 core 發出警告；output_file 不為 None 時存成 JSON"""
+        usage = self.usage(cpus)
+        if usage["saturated_cpus"]:
+            logging.warning(
+                f"⚠️ [{label}] host CPU saturated: cores {usage['saturated_cpus']} ≥ {self.threshold_pct:.0f}% busy "
+                f"(max core {usage['max_core']} at {usage['max_core_pct']:.1f}%)"
+            )
+        if output_file:
+            with open(output_file, "w") as f:
+                json.dump(usage, f, indent=2)
+        return usage
+
+
+def bound_cpus(cpu_binding):
+    """devices.numa_topology.plan_cpu_binding() 單一裝置的項目 -> CPU 清單；未綁定時回傳 None"""
+    if not cpu_binding or not cpu_binding.get("cpus_allowed"):
+        return None
+    return parse_cpulist(cpu_binding["cpus_allowed"])
@@ -0,0 +1,157 @@
+import os
+import csv
+import json
+import logging
+
+from analysis.result_parser import load_fio_json
+from scripts.Solidigm_8corners_fio import run_fio_test
+from scripts.smart_sampler import DEFAULT_SMART_INTERVAL
+
+# ---------- iodepth × numjobs sweep ----------
+# 把 test case 的單一 iodepth / numjobs 換成一組網格，由低負載往高負載依序量測，
+# 得到每個裝置的 IOPS vs p99 曲線，並找出 knee：達到 peak IOPS 一定比例的最低負載點
+# （outstanding IO = iodepth × numjobs 最少，相同時 p99 較低者優先）。
+DEFAULT_SWEEP_IODEPTHS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+DEFAULT_SWEEP_NUMJOBS = (1, 2, 4, 8)
+DEFAULT_KNEE_FRACTION = 0.9
+
+SWEEP_FIELDS = ["iodepth", "numjobs", "outstanding", "iops", "bw_mbps", "clat_mean_us", "clat_p99_us", "clat_p99.99_us"]
+
+
+def parse_int_list(text):
+    """ "1,2,4" -> [1, 2, 4] """
+    return [int(v) for v in str(text).split(",") if v.strip()]
+
+
+def sweep_points(iodepths=DEFAULT_SWEEP_IODEPTHS, numjobs_list=DEFAULT_SWEEP_NUMJOBS):
+    """依 outstanding IO 由小到大排列的 (iodepth, numjobs) 組合"""
+    points = {(qd, nj) for qd in iodepths for nj in numjobs_list}
+    return sorted(points, key=lambda p: (p[0] * p[1], p[1]))
+
+
+def sweep_test_name(test_name, iodepth, numjobs):
+    return f"{test_name}_QD{iodepth}_J{numjobs}"
+
+
+def sweep_point(fio_result, iodepth, numjobs):
+    """FioResult -> 曲線上的一點（latency 單位 us，多方向時取最差的方向）"""
+    p99 = fio_result.clat_percentile(99.0)
+    p9999 = fio_result.clat_percentile(99.99)
+    directions = fio_result.active_directions()
+    samples = sum(d.clat.samples for _, d in directions)
+    mean_ns = sum(d.clat.mean_ns * d.clat.samples for _, d in directions) / samples if samples else None
+    return {
+        "iodepth": iodepth,
+        "numjobs": numjobs,
+        "outstanding": iodepth * numjobs,
+        "iops": round(fio_result.total_iops, 1),
+        "bw_mbps": round(fio_result.total_bw_mbps, 2),
+        "clat_mean_us": round(mean_ns / 1000, 2) if mean_ns is not None else None,
+        "clat_p99_us": round(p99 / 1000, 2) if p99 is not None else None,
+        "clat_p99.99_us": round(p9999 / 1000, 2) if p9999 is not None else None,
+    }
+
+
+def find_knee(points, fraction=DEFAULT_KNEE_FRACTION):
+    """
+    回傳 IOPS >= fraction × peak IOPS 中負載最低的點；沒有資料時回傳 None。
+    """
+    if not points:
+        return None
+    peak = max(p["iops"] for p in points)
+    candidates = [p for p in points if p["iops"] >= peak * fraction]
+    return min(candidates, key=lambda p: (p["outstanding"], p["clat_p99_us"] if p["clat_p99_us"] is not None else float("inf")))
+
+
+def write_sweep_report(points, knee, peak, output_prefix, fraction):
+    """寫出 <prefix>.csv（完整曲線）與 <prefix>.json（曲線 + knee）"""
+    with open(f"{output_prefix}.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SWEEP_FIELDS + ["knee"])
+        writer.writeheader()
+        for point in points:
+            writer.writerow({**point, "knee": "Yes" if point is knee else ""})
+    with open(f"{output_prefix}.json", "w") as f:
+        json.dump({"knee_fraction": fraction, "peak_iops": peak, "knee": knee, "points": points}, f, indent=2)
+
+
+def plot_sweep_curve(points, knee, title, output_file):
+    """IOPS vs p99 曲線，標出 knee；沒有 matplotlib 時略過"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        logging.warning("⚠️ matplotlib not available, skipping sweep plot")
+        return
+    plt.figure(figsize=(10, 6))
+    for numjobs in sorted({p["numjobs"] for p in points}):
+        series = [p for p in points if p["numjobs"] == numjobs and p["clat_p99_us"] is not None]
+        series.sort(key=lambda p: p["iodepth"])
+        plt.plot([p["iops"] / 1000 for p in series], [p["clat_p99_us"] for p in series], marker="o",
+                 label=f"numjobs={numjobs}")
+        for p in series:
+            plt.annotate(f"QD{p['iodepth']}", (p["iops"] / 1000, p["clat_p99_us"]), fontsize=7,
+                         textcoords="offset points", xytext=(3, 3))
+    if knee and knee["clat_p99_us"] is not None:
+        plt.scatter([knee["iops"] / 1000], [knee["clat_p99_us"]], s=150, facecolors="none", edgecolors="red",
+                    linewidths=2, label=f"Knee: QD{knee['iodepth']} × {knee['numjobs']} jobs", zorder=5)
+    plt.yscale("log")
+    plt.title(title)
+    plt.xlabel("Throughput (KIOPS)")
+    plt.ylabel("clat p99 (us)")
+    plt.grid(True, linestyle="--", linewidth=0.5)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(output_file)
+    plt.close()
+
+
+def run_sweep(device, test, result_folder, runtime, market_name, form_factor, test_config,
+              iodepths=DEFAULT_SWEEP_IODEPTHS, numjobs_list=DEFAULT_SWEEP_NUMJOBS, knee_fraction=DEFAULT_KNEE_FRACTION,
+              cpu_binding=None, log_bandwidth=True, resume=False, smart_interval=DEFAULT_SMART_INTERVAL):
+    """
+    在單一裝置上以 iodepth × numjobs 網格執行一個 test case。
+    只在第一個點做 preconditioning（test case 有設定時），之後的點沿用同一個裝置狀態。
+    每個點都是一般的 run_fio_test()：結果寫入 summary CSV 與 run_journal，resume 時略過已完成的點。
+    :return: {"points": [...], "knee": {...}, "peak_iops": float}
+    """
+    sweep_folder = os.path.join(result_folder, f"{device}_sweep")
+    os.makedirs(sweep_folder, exist_ok=True)
+    grid = sweep_points(iodepths, numjobs_list)
+    logging.info(f"📈 Sweeping {test['name']} on {device}: {len(grid)} points "
+                 f"(iodepth {list(iodepths)} × numjobs {list(numjobs_list)})")
+
+    points = []
+    for index, (iodepth, numjobs) in enumerate(grid):
+        point_name = sweep_test_name(test["name"], iodepth, numjobs)
+        run_fio_test(
+            result_folder=result_folder, device=device, test_name=point_name, rw=test["rw"], bs=test["bs"],
+            iodepth=iodepth, numjobs=numjobs, runtime=runtime, market_name=market_name, form_factor=form_factor,
+            test_config=test_config, precondition=index == 0 and test.get("precondition", False),
+            rwmixread=test.get("rwmixread"), log_bandwidth=log_bandwidth, resume=resume,
+            cpu_binding=cpu_binding, smart_interval=smart_interval, ioengine=test.get("ioengine", "libaio")
+        )
+        try:
+            fio_result = load_fio_json(os.path.join(result_folder, f"fio_{point_name}_{device}.json"))
+        except (OSError, ValueError) as e:
+            logging.error(f"❌ No result for sweep point {point_name} on {device}: {e}")
+            continue
+        point = sweep_point(fio_result, iodepth, numjobs)
+        points.append(point)
+        logging.info(f"📈 {device} QD{iodepth} × {numjobs}: {point['iops']:.0f} IOPS, p99 {point['clat_p99_us']} us")
+
+    knee = find_knee(points, knee_fraction)
+    if knee is None:
+        logging.error(f"❌ Sweep of {test['name']} on {device} produced no results")
+        return {"points": points, "knee": None, "peak_iops": None}
+
+    peak = max(p["iops"] for p in points)
+    output_prefix = os.path.join(sweep_folder, f"{test['name']}_sweep")
+    write_sweep_report(points, knee, peak, output_prefix, knee_fraction)
+    plot_sweep_curve(points, knee, f"{test['name']} iodepth × numjobs sweep - {device}", f"{output_prefix}.png")
+    logging.info(
+        f"📍 {device} {test['name']} knee: QD{knee['iodepth']} × {knee['numjobs']} jobs "
+        f"({knee['outstanding']} outstanding) reaches {knee['iops']:.0f} IOPS = "
+        f"{knee['iops'] / peak * 100:.1f}% of peak {peak:.0f}, p99 {knee['clat_p99_us']} us"
+    )
+    return {"points": points, "knee": knee, "peak_iops": peak}
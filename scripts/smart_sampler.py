@@ -0,0 +1,169 @@
+import os
+import csv
+import time
+import logging
+import threading
+
+from devices.nvme_logs import get_smart_log, get_vendor_smart_log
+
+# ---------- SMART / health 背景取樣 ----------
+# 測試期間每 interval 秒讀一次 SMART log page（devices/nvme_logs.py 直接解碼，不產生子程序），寫成精簡的 CSV 時間序列。
+# 時間欄位為 Unix epoch (ms)，與 fio --log_unix_epoch=1 的 bw log 同一個時鐘，畫圖時可以直接對齊。
+DEFAULT_SMART_INTERVAL = 10
+
+SMART_FIELDS = [
+    "time_ms",
+    "temperature_c",
+    "warning_temp_time",
+    "critical_comp_time",
+    "thm_temp1_trans_count",
+    "thm_temp2_trans_count",
+    "thm_temp1_total_time",
+    "thm_temp2_total_time",
+    "data_units_read",
+    "data_units_written",
+    "media_errors",
+    "percent_used",
+    "nand_bytes_written",
+    "host_bytes_written",
+]
+
+
+def read_smart_log(device, include_vendor=True):
+    """
+    讀取 SMART log (0x02)，回傳與 nvme-cli JSON 同名欄位的 dict；include_vendor 時加上
+    vendor log (0xCA) 的 nand_bytes_written / host_bytes_written（bytes）。失敗時 raise RuntimeError
+    """
+    try:
+        smart_log = get_smart_log(device).as_dict()
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Failed to read SMART log on {device}: {e}") from e
+    if include_vendor:
+        vendor_log = get_vendor_smart_log(device)
+        if vendor_log is not None:
+            smart_log["nand_bytes_written"] = vendor_log.nand_bytes_written
+            smart_log["host_bytes_written"] = vendor_log.host_bytes_written
+    return smart_log
+
+
+def read_write_counters(device):
+    """
+    測試前後的寫入量快照，用於 WAF 計算：
+    {"data_units_written", "nand_bytes_written", "host_bytes_written"}；非 NVMe 或讀取失敗時回傳 None
+    """
+    if not device.startswith("nvme"):
+        return None
+    try:
+        smart_log = read_smart_log(device)
+    except RuntimeError as e:
+        logging.warning(f"⚠️ Cannot read write counters on {device}: {e}")
+        return None
+    return {key: smart_log.get(key) for key in ("data_units_written", "nand_bytes_written", "host_bytes_written")}
+
+
+def _kelvin_to_celsius(value):
+    # SMART log 以 Kelvin 回報 composite temperature
+    return value - 273 if value > 200 else value
+
+
+def smart_sample(smart_log, time_ms=None):
+    """read_smart_log() 的結果 -> SMART_FIELDS 的一列"""
+    row = {"time_ms": int(time.time() * 1000) if time_ms is None else time_ms}
+    for field in SMART_FIELDS[1:]:
+        key = "temperature" if field == "temperature_c" else field
+        value = smart_log.get(key)
+        if field == "temperature_c" and isinstance(value, int):
+            value = _kelvin_to_celsius(value)
+        row[field] = value
+    return row
+
+
+class SmartSampler:
+    """
+    背景執行緒定期記錄單一裝置的 SMART 資料。
+
+        with SmartSampler("nvme0n1", ".../smart_test.csv", interval=10):
+            run_fio_streaming(...)
+    """
+
+    def __init__(self, device, output_file, interval=DEFAULT_SMART_INTERVAL, reader=read_smart_log):
+        self.device = device
+        self.output_file = output_file
+        self.interval = interval
+        self.reader = reader
+        self._include_vendor = True
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"smart-{self.device}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # 結束時再取一筆，確保時間序列涵蓋整個 fio 執行期間
+        self._sample_once()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _sample_once(self):
+        try:
+            smart_log = self.reader(self.device, self._include_vendor)
+        except RuntimeError as e:
+            logging.warning(f"⚠️ SMART sample failed on {self.device}: {e}")
+            return
+        # 不支援 vendor log 的裝置之後不再嘗試，避免每次取樣都多一次失敗的 get-log
+        if self._include_vendor and "nand_bytes_written" not in smart_log:
+            self._include_vendor = False
+        row = smart_sample(smart_log)
+        write_header = not os.path.exists(self.output_file)
+        with open(self.output_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=SMART_FIELDS, extrasaction="ignore")
+            if write_header:
+                writer.writeheader()
+            writer.writerow(row)
+        self.samples += 1
+
+    def _run(self):
+        while True:
+            self._sample_once()
+            if self._stop.wait(self.interval):
+                return
+
+
+class SmartSamplers:
+    """同時取樣多個裝置：{device: output_file}；interval 為 0 或 None 時不取樣"""
+
+    def __init__(self, device_files, interval=DEFAULT_SMART_INTERVAL, reader=read_smart_log):
+        self.samplers = [
+            SmartSampler(device, output_file, interval, reader)
+            for device, output_file in device_files.items() if device.startswith("nvme")
+        ] if interval else []
+
+    def __enter__(self):
+        for sampler in self.samplers:
+            sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for sampler in self.samplers:
+            sampler.stop()
+
+
+def load_smart_samples(smart_file):
+    """讀取 SMART CSV，回傳 list[dict]（數值欄位轉成 int）"""
+    samples = []
+    with open(smart_file, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            samples.append({k: int(v) if v and v.lstrip("-").isdigit() else v for k, v in row.items()})
+    return samples
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+from collections import deque
+
+# ---------- SNIA PTS 風格的 steady state 判定 ----------
+# 預設值對應 SNIA PTS：5 個 round 的 measurement window，
+# 數據範圍 (max - min) ≤ 平均值 20%，最佳擬合直線在 window 內的變化量 ≤ 平均值 10%
+DEFAULT_STEADY_STATE = {
+    "metric": "iops",          # iops 或 bw
+    "round_sec": 60,           # 每個 round 的長度（秒）
+    "window": 5,               # measurement window 的 round 數
+    "excursion_pct": 20,       # 允許的 max-min 範圍（平均值的百分比）
+    "slope_pct": 10,           # 允許的擬合直線變化量（平均值的百分比）
+    "min_runtime_sec": 0,      # 至少執行多久才開始判定
+}
+
+
+def _linear_fit_slope(values):
+    """最小平方法擬合 y = a + b*x (x = 0..n-1)，回傳斜率 b"""
+    n = len(values)
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    num = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    den = sum((x - mean_x) ** 2 for x in range(n))
+    return num / den if den else 0.0
+
+
+class SteadyStateDetector:
+    """
+    線上 steady state 偵測器，可以直接當作 run_fio_streaming 的 on_status callback。
+    每個 status event 依區間長度加權累積成 round 平均，最近 window 個 round 同時符合
+    excursion 與 slope 條件時回傳停止原因字串，讓 fio 提前結束。
+    """
+
+    def __init__(self, metric="iops", round_sec=60, window=5, excursion_pct=20, slope_pct=10, min_runtime_sec=0):
+        if metric not in ("iops", "bw"):
+            raise ValueError(f"Unsupported steady state metric: {metric}")
+        self.metric = metric
+        self.round_sec = round_sec
+        self.window = window
+        self.excursion_pct = excursion_pct
+        self.slope_pct = slope_pct
+        self.min_runtime_sec = min_runtime_sec
+
+        self.rounds = deque(maxlen=window)
+        self.rounds_completed = 0
+        self._round_weighted_sum = 0.0
+        self._round_duration = 0.0
+        self.reached = False
+        self.reached_at_sec = None
+        self.reason = ""
+        self.last_check = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        """由 test case JSON 中 precondition 的 "steady_state" 設定建立"""
+        config = dict(DEFAULT_STEADY_STATE)
+        config.update(settings or {})
+        return cls(**config)
+
+    def __call__(self, event):
+        value = event.total_iops if self.metric == "iops" else event.total_bw_mbps
+        return self.add_sample(event.elapsed_sec, value, event.interval_sec)
+
+    def add_sample(self, elapsed_sec, value, interval_sec):
+        if self.reached or interval_sec <= 0:
+            return None
+
+        self._round_weighted_sum += value * interval_sec
+        self._round_duration += interval_sec
+        if self._round_duration < self.round_sec:
+            return None
+
+        round_avg = self._round_weighted_sum / self._round_duration
+        self._round_weighted_sum = 0.0
+        self._round_duration = 0.0
+        self.rounds.append(round_avg)
+        self.rounds_completed += 1
+
+        if len(self.rounds) < self.window or elapsed_sec < self.min_runtime_sec:
+            return None
+        return self._check(elapsed_sec)
+
+    def _check(self, elapsed_sec):
+        values = list(self.rounds)
+        avg = sum(values) / len(values)
+        if avg <= 0:
+            return None
+
+        excursion = (max(values) - min(values)) / avg * 100
+        slope_change = abs(_linear_fit_slope(values) * (len(values) - 1)) / avg * 100
+        self.last_check = {
+            "average": avg,
+            "excursion_pct": excursion,
+            "slope_pct": slope_change,
+        }
+        logging.info(
+            f"🔎 Steady state check @ {elapsed_sec:.0f}s: avg={avg:.1f} {self.metric}, "
+            f"excursion={excursion:.2f}% (≤{self.excursion_pct}%), slope={slope_change:.2f}% (≤{self.slope_pct}%)"
+        )
+
+        if excursion <= self.excursion_pct and slope_change <= self.slope_pct:
+            self.reached = True
+            self.reached_at_sec = elapsed_sec
+            self.reason = (
+                f"steady state reached after {self.rounds_completed} rounds: excursion {excursion:.2f}% "
+                f"≤ {self.excursion_pct}% and slope {slope_change:.2f}% ≤ {self.slope_pct}%"
+            )
+            return self.reason
+        return None
+
+    def summary(self):
+        return {
+            "reached": self.reached,
+            "reached_at_sec": self.reached_at_sec,
+            "reason": self.reason,
+            "rounds_completed": self.rounds_completed,
+            "window_rounds": list(self.rounds),
+            "last_check": self.last_check,
+            "criteria": {
+                "metric": self.metric,
+                "round_sec": self.round_sec,
+                "window": self.window,
+                "excursion_pct": self.excursion_pct,
+                "slope_pct": self.slope_pct,
+                "min_runtime_sec": self.min_runtime_sec,
+            },
+        }
+
+    def save(self, output_file):
+        with open(output_file, "w") as f:
+            json.dump(self.summary(), f, indent=2)
@@ -0,0 +1,96 @@
+import json
+import logging
+
+# 尚未做過任何 preconditioning（安全清除後的狀態）
+FRESH_STATE = "fresh"
+
+
+def get_precondition_settings(test_config, test):
+    """取得測試案例對應的 precondition 設定；測試不需要或 JSON 沒有對應設定時回傳 None"""
+    if not test.get("precondition", False):
+        return None
+    return test_config.get("precondition", {}).get(test["rw"]) or None
+
+
+def precondition_state_key(settings):
+    """以 precondition 設定內容作為裝置狀態的識別 key"""
+    return json.dumps(settings, sort_keys=True)
+
+
+def describe_state(settings):
+    if not settings:
+        return FRESH_STATE
+    return f"{settings.get('rw')} bs={settings.get('bs')} ({settings.get('mode')}={settings.get('value')})"
+
+
+def estimate_precondition_seconds(settings):
+    """
+    估計 preconditioning 時間（秒）。runtime 模式回傳設定的秒數；
+    loop 模式與裝置容量及寫入速度有關，無法事先得知，回傳 None。
+    """
+    if settings and settings.get("mode") == "runtime":
+        return int(settings.get("value", 0))
+    return None
+
+
+def plan_test_sequence(tests, test_config):
+    """
+    依各測試需要的裝置狀態重新排序並去除重複的 preconditioning。
+
+    依原始 JSON 順序推算每個測試量測時裝置所處的狀態：
+      - precondition=true 的測試需要自己的 precondition 狀態
+      - 其他測試沿用前一個 precondition 留下的狀態（例如 Random_Read 接在 RandRW 之後）
+    相同狀態的測試排在一起（維持原本的相對順序），每組只在第一個測試做一次 blkdiscard + precondition。
+
+    :return: [{"test": test, "precondition": bool, "state": str, "settings": dict | None}, ...]
+    """
+    groups = {}
+    group_order = []
+    current_key, current_settings = FRESH_STATE, None
+
+    for test in tests:
+        settings = get_precondition_settings(test_config, test)
+        if settings:
+            current_key, current_settings = precondition_state_key(settings), settings
+        if current_key not in groups:
+            groups[current_key] = {"settings": current_settings, "tests": []}
+            group_order.append(current_key)
+        groups[current_key]["tests"].append(test)
+
+    plan = []
+    for key in group_order:
+        group = groups[key]
+        for index, test in enumerate(group["tests"]):
+            plan.append({
+                "test": test,
+                "precondition": key != FRESH_STATE and index == 0,
+                "state": describe_state(group["settings"]),
+                "settings": group["settings"],
+            })
+    return plan
+
+
+def print_test_plan(plan, tests, test_config):
+    """列出排程後的測試順序，以及與原始順序相比省下的 preconditioning"""
+    original = [get_precondition_settings(test_config, t) for t in tests]
+    original = [s for s in original if s]
+    planned = [step["settings"] for step in plan if step["precondition"]]
+
+    def _total(settings_list):
+        seconds = sum(estimate_precondition_seconds(s) or 0 for s in settings_list)
+        passes = sum(int(s.get("value", 1)) for s in settings_list if estimate_precondition_seconds(s) is None)
+        return seconds, passes
+
+    orig_sec, orig_passes = _total(original)
+    plan_sec, plan_passes = _total(planned)
+
+    logging.info("🗓️ Planned test sequence (grouped by required device state):")
+    for i, step in enumerate(plan, 1):
+        action = "precondition + test" if step["precondition"] else "test"
+        logging.info(f"  {i:02d}. {step['test']['name']:<24} | state: {step['state']:<40} | {action}")
+
+    logging.info(
+        f"⏱️ Preconditioning runs: {len(original)} → {len(planned)}; "
+        f"estimated time saved: {(orig_sec - plan_sec) / 3600:.1f} h"
+        + (f" + {orig_passes - plan_passes} full-drive pass(es)" if orig_passes != plan_passes else "")
+    )
@@ -0,0 +1,121 @@
+import dataclasses
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from devices.device_inventory import get_device_info, get_inventory, refresh_inventory
+
+NVME_BDF = "0000:3b:00.0"
+SATA_BDF = "0000:00:17.0"
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb" if isinstance(content, bytes) else "w") as f:
+        f.write(content)
+
+
+def link(target, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.symlink(target, path)
+
+
+def add_nvme(sysfs_root, controller, namespace, bdf, size_sectors):
+    """與實機相同的佈局：/sys/block/<ns> -> PCI tree 下的 nvme/<ctrl>/<ns>，device -> ../../<ctrl>"""
+    pci_dir = os.path.join(sysfs_root, "devices", "pci0000:3a", "0000:3a:00.0", bdf)
+    ctrl_dir = os.path.join(pci_dir, "nvme", controller)
+    ns_dir = os.path.join(ctrl_dir, namespace)
+    write_file(os.path.join(pci_dir, "numa_node"), "1\n")
+    write_file(os.path.join(pci_dir, "current_link_speed"), "16.0 GT/s PCIe\n")
+    write_file(os.path.join(pci_dir, "current_link_width"), "4\n")
+    write_file(os.path.join(pci_dir, "max_link_speed"), "32.0 GT/s PCIe\n")
+    write_file(os.path.join(pci_dir, "max_link_width"), "4\n")
+    write_file(os.path.join(ctrl_dir, "model"), "SOLIDIGM SB5PH27X038T                   \n")
+    write_file(os.path.join(ctrl_dir, "serial"), "PHAB123400AB3P8CGN  \n")
+    write_file(os.path.join(ctrl_dir, "firmware_rev"), "G70YG030\n")
+    write_file(os.path.join(ns_dir, "size"), f"{size_sectors}\n")
+    write_file(os.path.join(ns_dir, "queue", "rotational"), "0\n")
+    link(ctrl_dir, os.path.join(ns_dir, "device"))
+    link(ctrl_dir, os.path.join(sysfs_root, "class", "nvme", controller))
+    link(ns_dir, os.path.join(sysfs_root, "block", namespace))
+    link(ns_dir, os.path.join(sysfs_root, "class", "block", namespace))
+    if not os.path.exists(os.path.join(sysfs_root, "bus", "pci", "devices", bdf)):
+        link(pci_dir, os.path.join(sysfs_root, "bus", "pci", "devices", bdf))
+
+
+@pytest.fixture
+def sysfs_tree(tmp_path):
+    """一顆 NVMe (nvme0n1) + 系統碟 SATA (sda，/ 在 sda1) + 會被略過的 loop0 與 multipath 隱藏路徑"""
+    sysfs_root = os.path.join(str(tmp_path), "sys")
+    proc_root = os.path.join(str(tmp_path), "proc")
+    add_nvme(sysfs_root, "nvme0", "nvme0n1", NVME_BDF, 7501476528)
+
+    scsi_dir = os.path.join(sysfs_root, "devices", "pci0000:00", SATA_BDF, "ata1", "host0", "target0:0:0", "0:0:0:0")
+    sda_dir = os.path.join(scsi_dir, "block", "sda")
+    write_file(os.path.join(scsi_dir, "vendor"), "ATA     \n")
+    write_file(os.path.join(scsi_dir, "model"), "INTEL SSDSC2KB48\n")
+    write_file(os.path.join(scsi_dir, "rev"), "0132\n")
+    write_file(os.path.join(scsi_dir, "vpd_pg80"), b"\x00\x80\x00\x14BTYF12340ABC480BGN  ")
+    write_file(os.path.join(sda_dir, "size"), "937703088\n")
+    write_file(os.path.join(sda_dir, "queue", "rotational"), "0\n")
+    write_file(os.path.join(sda_dir, "sda1", "partition"), "1\n")
+    link(scsi_dir, os.path.join(sda_dir, "device"))
+    link(sda_dir, os.path.join(sysfs_root, "block", "sda"))
+    link(sda_dir, os.path.join(sysfs_root, "class", "block", "sda"))
+    link(os.path.join(sda_dir, "sda1"), os.path.join(sysfs_root, "class", "block", "sda1"))
+    link(os.path.join(sysfs_root, "devices", "pci0000:00", SATA_BDF),
+         os.path.join(sysfs_root, "bus", "pci", "devices", SATA_BDF))
+
+    loop_dir = os.path.join(sysfs_root, "devices", "virtual", "block", "loop0")
+    write_file(os.path.join(loop_dir, "size"), "0\n")
+    link(loop_dir, os.path.join(sysfs_root, "block", "loop0"))
+    write_file(os.path.join(sysfs_root, "block", "nvme0c0n1", "device", "model"), "hidden path\n")
+
+    write_file(os.path.join(proc_root, "mounts"), "/dev/sda1 / ext4 rw,relatime 0 0\ntmpfs /run tmpfs rw 0 0\n")
+    write_file(os.path.join(proc_root, "swaps"), "Filename\tType\tSize\tUsed\tPriority\n")
+    return sysfs_root, proc_root
+
+
+def test_scan_reads_device_attributes(sysfs_tree):
+    sysfs_root, proc_root = sysfs_tree
+    inventory = get_inventory(sysfs_root, proc_root)
+    assert list(inventory) == ["nvme0n1", "sda"]
+
+    nvme = inventory["nvme0n1"]
+    assert nvme.is_nvme and nvme.controller == "nvme0"
+    assert nvme.bdf == NVME_BDF
+    assert nvme.numa_node == 1
+    assert nvme.model == "SOLIDIGM SB5PH27X038T"
+    assert nvme.serial == "PHAB123400AB3P8CGN"
+    assert nvme.firmware == "G70YG030"
+    assert nvme.capacity == "3.84 TB"
+    assert nvme.link == "16.0 GT/s PCIe x4 (max 32.0 GT/s PCIe x4)"
+    assert not nvme.is_system_drive
+
+    sata = inventory["sda"]
+    assert sata.transport == "sata"
+    assert sata.bdf == SATA_BDF
+    assert sata.serial == "BTYF12340ABC480BGN"
+    assert sata.firmware == "0132"
+    assert sata.mountpoints == ("/",)
+    assert sata.is_system_drive
+
+
+def test_inventory_is_cached_and_read_only(sysfs_tree):
+    sysfs_root, proc_root = sysfs_tree
+    inventory = get_inventory(sysfs_root, proc_root)
+    assert get_inventory(sysfs_root, proc_root) is inventory
+    with pytest.raises(TypeError):
+        inventory["nvme1n1"] = None
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        inventory["nvme0n1"].firmware = "G70YG040"
+
+    # 新增的裝置只有 refresh 後才看得到，之前拿到的清單不變
+    add_nvme(sysfs_root, "nvme1", "nvme1n1", "0000:3c:00.0", 7501476528)
+    assert get_device_info("nvme1n1", sysfs_root, proc_root) is None
+    refreshed = refresh_inventory(sysfs_root, proc_root)
+    assert refreshed["nvme1n1"].bdf == "0000:3c:00.0"
+    assert get_device_info("nvme1n1", sysfs_root, proc_root) is refreshed["nvme1n1"]
+    assert "nvme1n1" not in inventory
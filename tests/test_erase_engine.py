@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from devices.erase_engine import MODE_DISCARD, erase_devices
+
+
+class FakeRunner:
+    """假的 runner(command, timeout)：依裝置回傳結果，並記錄同時執行的最大數量"""
+
+    def __init__(self, outcomes=None, delay=0.05):
+        self.outcomes = outcomes or {}
+        self.delay = delay
+        self.commands = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, command, timeout=None):
+        with self.lock:
+            self.commands.append(command)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            device = command.split("/dev/")[1].split()[0]
+            outcome = self.outcomes.get((device, command.split()[0]), (0, ""))
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_concurrency_is_capped():
+    devices = [f"nvme{i}n1" for i in range(6)]
+    runner = FakeRunner()
+    progress = []
+    results = erase_devices(devices, max_workers=2, runner=runner,
+                            on_progress=lambda result, done, total: progress.append((done, total)))
+    assert runner.peak == 2
+    assert list(results) == devices
+    assert all(r.success and r.method == "blkdiscard" for r in results.values())
+    assert progress == [(done, 6) for done in range(1, 7)]
+
+
+def test_failure_falls_back_and_is_reported():
+    runner = FakeRunner({
+        ("nvme0n1", "blkdiscard"): (1, "blkdiscard: Operation not supported"),
+        ("nvme1n1", "blkdiscard"): (1, "blkdiscard: Operation not supported"),
+        ("nvme1n1", "nvme"): (22, "NVMe status: Invalid Format"),
+        ("nvme2n1", "blkdiscard"): RuntimeError("runner crashed"),
+    })
+    results = erase_devices(["nvme0n1", "nvme1n1", "nvme2n1"], runner=runner)
+
+    assert results["nvme0n1"].success and results["nvme0n1"].method == "nvme format"
+    assert not results["nvme1n1"].success
+    assert results["nvme1n1"].method == "nvme format"
+    assert "Invalid Format" in results["nvme1n1"].message
+    # runner 本身丟出非預期的例外：該裝置記為失敗，不影響其他裝置
+    assert not results["nvme2n1"].success
+    assert results["nvme2n1"].method == "error"
+    assert "runner crashed" in results["nvme2n1"].message
+
+
+def test_timeout_stops_without_trying_next_method():
+    runner = FakeRunner({("nvme0n1", "blkdiscard"): subprocess.TimeoutExpired("blkdiscard /dev/nvme0n1", 5)})
+    results = erase_devices(["nvme0n1", "nvme1n1"], timeout=5, runner=runner)
+    assert not results["nvme0n1"].success
+    assert results["nvme0n1"].message == "blkdiscard timed out after 5s"
+    assert not any(c.startswith("nvme format /dev/nvme0n1") for c in runner.commands)
+    assert results["nvme1n1"].success
+
+
+def test_discard_mode_skips_non_nvme():
+    runner = FakeRunner()
+    results = erase_devices(["sdb", "nvme0n1"], mode=MODE_DISCARD, runner=runner)
+    assert results["sdb"].success and results["sdb"].method == "skipped"
+    assert runner.commands == ["blkdiscard /dev/nvme0n1"]
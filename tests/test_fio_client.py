@@ -0,0 +1,76 @@
+import csv
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import scripts.fio_client as fio_client
+from scripts.fio_client import client_command, run_client_test
+from scripts.fio_stream import FioStreamResult
+
+HOSTS = [
+    {"host": "10.0.0.11", "devices": ["nvme0n1", "nvme1n1"]},
+    {"host": "10.0.0.12", "port": 8766, "devices": ["nvme0n1"]},
+]
+TEST = {"name": "4KB_Random_Read", "rw": "randread", "bs": "4k", "iodepth": 128, "numjobs": 4, "ioengine": "io_uring"}
+
+
+def client_job(hostname, port, jobname, iops):
+    return {"hostname": hostname, "port": port, "jobname": jobname,
+            "read": {"io_bytes": int(iops * 4096 * 60), "bw_bytes": iops * 4096, "iops": iops, "runtime": 60000,
+                     "total_ios": int(iops * 60)}}
+
+
+def fake_streaming(calls, final_json):
+    def run(command, status_interval=10, on_status=None, json_output_file=None, label="fio", **kwargs):
+        calls.append({"command": command, "status_interval": status_interval, "label": label})
+        return FioStreamResult(returncode=0, final_json=final_json)
+    return run
+
+
+def test_client_command():
+    job_files = {"10.0.0.11": "/r/fio_jobs/a.fio", "10.0.0.12:8766": "/r/fio_jobs/b.fio"}
+    assert client_command(HOSTS, job_files) == (
+        "fio --output-format=json+ --client=10.0.0.11 /r/fio_jobs/a.fio --client=10.0.0.12,8766 /r/fio_jobs/b.fio"
+    )
+
+
+def test_run_client_test_builds_job_files_and_rows(tmp_path, monkeypatch):
+    result_folder = str(tmp_path)
+    final_json = json.dumps({"fio version": "fio-3.36", "client_stats": [
+        client_job("10.0.0.11", 0, "4KB_Random_Read_nvme0n1", 1_000_000),
+        client_job("10.0.0.11", 0, "4KB_Random_Read_nvme1n1", 900_000),
+        client_job("10.0.0.12", 8766, "4KB_Random_Read_nvme0n1", 800_000),
+        {"hostname": "10.0.0.11", "jobname": "All clients", "read": {"iops": 2_700_000}},
+    ]})
+    calls = []
+    monkeypatch.setattr(fio_client, "run_fio_streaming", fake_streaming(calls, final_json))
+
+    run_client_test(HOSTS, TEST, result_folder, 60, "P5336", {}, status_interval=5)
+
+    # 一個 fio 指令帶所有主機；status interval 有傳下去，stall watchdog 才會生效
+    assert len(calls) == 1
+    job_dir = os.path.join(result_folder, "fio_jobs")
+    assert calls[0]["command"] == (
+        f"fio --output-format=json+ --client=10.0.0.11 {job_dir}/4KB_Random_Read_10.0.0.11.fio "
+        f"--client=10.0.0.12,8766 {job_dir}/4KB_Random_Read_10.0.0.12_8766.fio"
+    )
+    assert calls[0]["status_interval"] == 5
+
+    with open(os.path.join(job_dir, "4KB_Random_Read_10.0.0.11.fio")) as f:
+        sections = f.read().split("\n\n")
+    global_lines = sections[0].splitlines()
+    assert global_lines[0] == "[global]"
+    for line in ("rw=randread", "bs=4k", "iodepth=128", "numjobs=4", "ioengine=io_uring", "runtime=60", "direct=1"):
+        assert line in global_lines
+    # bw log 留在 SUT 上也不會傳回 controller，client 模式不寫
+    assert not any(line.startswith(("write_bw_log", "log_avg_msec")) for line in global_lines)
+    assert [s.splitlines()[:2] for s in sections[1:]] == [
+        ["[4KB_Random_Read_nvme0n1]", "filename=/dev/nvme0n1"],
+        ["[4KB_Random_Read_nvme1n1]", "filename=/dev/nvme1n1"],
+    ]
+
+    with open(os.path.join(result_folder, "P5336_fio_summary_results.csv"), newline="") as f:
+        rows = [(row["Host"], row["Device"]) for row in csv.DictReader(f)]
+    assert rows == [("10.0.0.11", "nvme0n1"), ("10.0.0.11", "nvme1n1"), ("10.0.0.12:8766", "nvme0n1"),
+                    ("10.0.0.11", "ALL"), ("10.0.0.12:8766", "ALL"), ("ALL", "ALL")]
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analysis.fio_logs import aggregate, load_logs
+
+T0 = 1_700_000_000_000
+
+
+def write_bw_logs(folder, jobs, seconds, kib_per_sec, jitter_ms, seed=0):
+    rng = np.random.default_rng(seed)
+    files = []
+    for job in range(1, jobs + 1):
+        path = os.path.join(folder, f"test_bw.1_bw.{job}.log")
+        times = T0 + np.arange(seconds) * 1000 + rng.integers(0, jitter_ms + 1, seconds) + job
+        rows = np.c_[times, np.full(seconds, kib_per_sec), np.zeros(seconds, int), np.full(seconds, 4096),
+                     np.zeros(seconds, int)]
+        np.savetxt(path, rows, fmt="%d", delimiter=", ")
+        files.append(path)
+    return files
+
+
+def test_aggregate_keeps_every_second_with_log_jitter(tmp_path):
+    # fio 的 log 時間有幾 ms 抖動；每一秒都要保留，且每秒都是 8 個 job 的總和
+    files = write_bw_logs(str(tmp_path), jobs=8, seconds=300, kib_per_sec=1000, jitter_ms=4)
+    times, per_direction = aggregate(load_logs(files, use_cache=False), "IOPS")
+    assert len(times) == 300
+    assert np.array_equal(times, np.arange(300) * 1000)
+    assert np.allclose(per_direction[0], 8 * 1000 * 1024 / 4096)
+
+
+def test_aggregate_kiops_uses_each_sample_bs(tmp_path):
+    # randrw 的兩個 job：read 中途 bs 由 4k 換成 16k（KiB/s 變 4 倍，IOPS 不變），write 固定 4k
+    path = str(tmp_path / "test_bw.1_bw.1.log")
+    rows = [(T0 + 1000 * s, 4000 if s < 3 else 16000, 0, 4096 if s < 3 else 16384, 0) for s in range(6)]
+    rows += [(T0 + 1000 * s + 2, 2000, 1, 4096, 0) for s in range(6)]
+    np.savetxt(path, np.array(rows), fmt="%d", delimiter=", ")
+    log_set = load_logs([path], use_cache=False)
+
+    times, kiops = aggregate(log_set, "KIOPS")
+    assert np.array_equal(times, np.arange(6) * 1000)
+    assert np.allclose(kiops[0], 1.0)
+    assert np.allclose(kiops[1], 0.5)
+
+    _, mbps = aggregate(log_set, "MB/s")
+    assert np.allclose(mbps[0], [4.096] * 3 + [16.384] * 3)
+    _, iops = aggregate(log_set, "IOPS")
+    assert np.allclose(iops[1], 500.0)
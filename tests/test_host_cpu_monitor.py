@@ -0,0 +1,108 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.host_cpu_monitor import HostCpuMonitor, read_nvme_interrupts, read_proc_stat
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def write_proc(proc_root, per_cpu, nvme_irqs, block_softirqs):
+    """
+    per_cpu: {cpu: (user, system, idle, irq, softirq)} 的累計 jiffies
+    nvme_irqs: {cpu: nvme0q1 的累計中斷數}；block_softirqs: {cpu: BLOCK softirq 累計數}
+    """
+    cpus = sorted(per_cpu)
+    total = [sum(per_cpu[c][i] for c in cpus) for i in range(5)]
+
+    def stat_line(name, values):
+        user, system, idle, irq, softirq = values
+        # user nice system idle iowait irq softirq steal guest guest_nice
+        return f"{name} {user} 0 {system} {idle} 0 {irq} {softirq} 0 0 0"
+
+    lines = [stat_line("cpu", total)] + [stat_line(f"cpu{c}", per_cpu[c]) for c in cpus]
+    lines += ["intr 123456 0 0", "ctxt 987654", "btime 1700000000", "processes 4242"]
+    write_file(os.path.join(proc_root, "stat"), "\n".join(lines) + "\n")
+
+    header = "".join(f"{'CPU' + str(c):>11}" for c in cpus)
+    write_file(os.path.join(proc_root, "interrupts"), "\n".join([
+        "     " + header,
+        "  0: " + "".join(f"{10:>11}" for _ in cpus) + "  IR-IO-APIC    2-edge      timer",
+        " 98: " + "".join(f"{5:>11}" for _ in cpus) + "  IR-PCI-MSI 1048576-edge      nvme0q0",
+        " 99: " + "".join(f"{nvme_irqs.get(c, 0):>11}" for c in cpus) + "  IR-PCI-MSI 1048577-edge      nvme0q1",
+        "100: " + "".join(f"{777:>11}" for _ in cpus) + "  IR-PCI-MSI 2097152-edge      eth0-TxRx-0",
+        "NMI: " + "".join(f"{1:>11}" for _ in cpus) + "   Non-maskable interrupts",
+        "ERR:          0",
+    ]) + "\n")
+    write_file(os.path.join(proc_root, "softirqs"), "\n".join([
+        "          " + header,
+        "       HI:" + "".join(f"{0:>11}" for _ in cpus),
+        "    BLOCK:" + "".join(f"{block_softirqs.get(c, 0):>11}" for c in cpus),
+    ]) + "\n")
+    write_file(os.path.join(proc_root, "cpuinfo"),
+               "".join(f"processor\t: {c}\ncpu MHz\t\t: {2000 + 100 * c:.3f}\n\n" for c in cpus))
+
+
+@pytest.fixture
+def fake_host(tmp_path):
+    """4 顆 CPU、兩個 NUMA node (0-1 / 2-3)"""
+    proc_root = os.path.join(str(tmp_path), "proc")
+    sysfs_root = os.path.join(str(tmp_path), "sys")
+    write_file(os.path.join(sysfs_root, "devices", "system", "node", "node0", "cpulist"), "0-1\n")
+    write_file(os.path.join(sysfs_root, "devices", "system", "node", "node1", "cpulist"), "2-3\n")
+    before = {c: (1000, 500, 8000, 10, 20) for c in range(4)}
+    write_proc(proc_root, before, nvme_irqs={c: 100 for c in range(4)}, block_softirqs={c: 50 for c in range(4)})
+    return proc_root, sysfs_root, before
+
+
+def test_proc_readers(fake_host):
+    proc_root, _, _ = fake_host
+    stats = read_proc_stat(proc_root)
+    assert sorted(k for k in stats if k != "all") == [0, 1, 2, 3]
+    assert stats[2] == {"user": 1000, "nice": 0, "system": 500, "idle": 8000, "iowait": 0,
+                        "irq": 10, "softirq": 20, "steal": 0}
+    assert stats["all"]["idle"] == 32000
+    # 只計算 nvmeXqY，timer / 網卡 / NMI 不算
+    assert read_nvme_interrupts(proc_root) == {0: 105, 1: 105, 2: 105, 3: 105}
+
+
+def test_usage_over_a_window(fake_host):
+    proc_root, sysfs_root, before = fake_host
+    with HostCpuMonitor(proc_root, sysfs_root, threshold_pct=90.0) as monitor:
+        # 測試期間每顆 core 各經過 1000 jiffies：CPU 2 幾乎滿載，其餘 10%
+        after = {c: (before[c][0] + 60, before[c][1] + 40, before[c][2] + 900, 10, 20) for c in range(4)}
+        after[2] = (before[2][0] + 600, before[2][1] + 250, before[2][2] + 50, 10 + 40, 20 + 60)
+        write_proc(proc_root, after, nvme_irqs={0: 100, 1: 100, 2: 100 + 5000, 3: 100},
+                   block_softirqs={0: 50, 1: 50, 2: 50 + 4000, 3: 50})
+
+    usage = monitor.usage()
+    assert usage["per_cpu_busy_pct"] == {0: 10.0, 1: 10.0, 2: 95.0, 3: 10.0}
+    assert usage["per_node_busy_pct"] == {0: 10.0, 1: 52.5}
+    assert usage["busy_pct"] == 31.25
+    assert usage["irq_softirq_pct"] == 2.5
+    assert usage["saturated_cpus"] == [2]
+    assert (usage["max_core"], usage["max_core_pct"]) == (2, 95.0)
+    assert usage["nvme_irqs"] == 5000 and usage["block_softirqs"] == 4000
+    assert usage["cpu_mhz"] == 2150.0
+
+    # 只統計 fio 綁定的 core
+    bound = monitor.usage(cpus=[0, 1])
+    assert bound["cpus"] == [0, 1]
+    assert bound["busy_pct"] == 10.0 and bound["saturated_cpus"] == []
+    assert bound["nvme_irqs"] == 0
+
+
+def test_context_manager_stops_on_error(fake_host):
+    proc_root, sysfs_root, _ = fake_host
+    with pytest.raises(KeyboardInterrupt):
+        with HostCpuMonitor(proc_root, sysfs_root) as monitor:
+            raise KeyboardInterrupt
+    assert monitor.usage()["busy_pct"] == 0.0
+    with pytest.raises(RuntimeError):
+        HostCpuMonitor(proc_root, sysfs_root).usage()
@@ -0,0 +1,122 @@
+import builtins
+import errno
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import devices.irq_affinity as irq_affinity
+from devices.irq_affinity import (IRQ_SNAPSHOT_FILE, apply_irq_affinity, get_device_irqs, plan_irq_affinity,
+                                  read_interrupt_names, restore_irq_affinity)
+
+BDF = "0000:3b:00.0"
+# nvme0 的 admin queue 與 3 個 I/O queue
+NVME0_IRQS = {100: "nvme0q0", 101: "nvme0q1", 102: "nvme0q2", 103: "nvme0q3"}
+ORIGINAL_AFFINITY = "0-63"
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def add_irq(proc_root, irq, name, affinity=ORIGINAL_AFFINITY):
+    with open(os.path.join(proc_root, "interrupts"), "a") as f:
+        f.write(f" {irq}:          0          0  IR-PCI-MSI 1572864-edge      {name}\n")
+    write_file(os.path.join(proc_root, "irq", str(irq), "smp_affinity_list"), f"{affinity}\n")
+
+
+def make_tree(root, irqs=NVME0_IRQS):
+    """假的 /sys（nvme0n1 -> 0000:3b:00.0，msi_irqs）與 /proc（interrupts、irq/*/smp_affinity_list）"""
+    sysfs_root = os.path.join(root, "sys")
+    proc_root = os.path.join(root, "proc")
+    pci_dir = os.path.join(sysfs_root, "devices", "pci0000:3a", "0000:3a:00.0", BDF)
+    block_dir = os.path.join(pci_dir, "nvme", "nvme0", "nvme0n1")
+    os.makedirs(block_dir)
+    os.makedirs(os.path.join(sysfs_root, "class", "block"))
+    os.symlink(block_dir, os.path.join(sysfs_root, "class", "block", "nvme0n1"))
+    os.makedirs(os.path.join(sysfs_root, "bus", "pci", "devices"))
+    os.symlink(pci_dir, os.path.join(sysfs_root, "bus", "pci", "devices", BDF))
+    write_file(os.path.join(proc_root, "interrupts"), "            CPU0       CPU1\n")
+    for irq, name in irqs.items():
+        write_file(os.path.join(pci_dir, "msi_irqs", str(irq)), "msix\n")
+        add_irq(proc_root, irq, name)
+    return sysfs_root, proc_root
+
+
+def read_affinity(proc_root, irq):
+    with open(os.path.join(proc_root, "irq", str(irq), "smp_affinity_list")) as f:
+        return f.read().strip()
+
+
+@pytest.fixture
+def irqbalance(monkeypatch):
+    calls = []
+    monkeypatch.setattr(irq_affinity, "stop_irqbalance", lambda: calls.append("stop") or True)
+    monkeypatch.setattr(irq_affinity, "start_irqbalance", lambda: calls.append("start"))
+    return calls
+
+
+def test_device_irqs_and_plan(tmp_path):
+    sysfs_root, proc_root = make_tree(str(tmp_path))
+    assert read_interrupt_names(proc_root) == NVME0_IRQS
+    device_irqs = get_device_irqs("nvme0n1", sysfs_root, proc_root)
+    assert device_irqs == NVME0_IRQS
+    # admin queue 允許整段 CPU，I/O queue 輪流分配到每一顆
+    assert plan_irq_affinity(device_irqs, "8-9") == {100: "8-9", 101: "8", 102: "9", 103: "8"}
+    assert plan_irq_affinity(device_irqs, "") == {}
+
+
+def test_apply_and_restore(tmp_path, irqbalance):
+    sysfs_root, proc_root = make_tree(str(tmp_path))
+    result_folder = str(tmp_path)
+    snapshot = apply_irq_affinity(["nvme0n1"], {"nvme0n1": {"cpus_allowed": "8-9"}}, result_folder,
+                                  sysfs_root, proc_root)
+    assert snapshot == {irq: ORIGINAL_AFFINITY for irq in NVME0_IRQS}
+    assert [read_affinity(proc_root, irq) for irq in NVME0_IRQS] == ["8-9", "8", "9", "8"]
+    with open(os.path.join(result_folder, IRQ_SNAPSHOT_FILE)) as f:
+        assert json.load(f)["irqbalance_active"] is True
+
+    restore_irq_affinity(result_folder, proc_root)
+    assert all(read_affinity(proc_root, irq) == ORIGINAL_AFFINITY for irq in NVME0_IRQS)
+    assert irqbalance == ["stop", "start"]
+
+
+def test_managed_irq_is_reported_and_left_unchanged(tmp_path, irqbalance, monkeypatch):
+    sysfs_root, proc_root = make_tree(str(tmp_path))
+    managed = os.path.join(proc_root, "irq", "101", "smp_affinity_list")
+
+    def fake_open(path, mode="r", *args, **kwargs):
+        # kernel managed IRQ：寫入 smp_affinity_list 回傳 EIO
+        if path == managed and "w" in mode:
+            raise OSError(errno.EIO, "Input/output error", path)
+        return builtins.open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(irq_affinity, "open", fake_open, raising=False)
+    apply_irq_affinity(["nvme0n1"], {"nvme0n1": {"cpus_allowed": "8-9"}}, str(tmp_path), sysfs_root, proc_root)
+    assert read_affinity(proc_root, 101) == ORIGINAL_AFFINITY
+    assert read_affinity(proc_root, 102) == "9"
+    with open(os.path.join(str(tmp_path), irq_affinity.IRQ_REPORT_FILE)) as f:
+        report = f.read()
+    assert f"nvme0n1 nvme0q1 IRQ 101: {ORIGINAL_AFFINITY} (managed, not changed)" in report
+
+
+def test_resume_adds_new_irqs_to_snapshot(tmp_path, irqbalance):
+    sysfs_root, proc_root = make_tree(str(tmp_path))
+    result_folder = str(tmp_path)
+    binding = {"nvme0n1": {"cpus_allowed": "8-9"}}
+    apply_irq_affinity(["nvme0n1"], binding, result_folder, sysfs_root, proc_root)
+
+    # resume 前 controller 多了一個 I/O queue；已記錄的 IRQ 維持原值，新的 IRQ 要補進 snapshot
+    add_irq(proc_root, 104, "nvme0q4", affinity="0-31")
+    write_file(os.path.join(sysfs_root, "bus", "pci", "devices", BDF, "msi_irqs", "104"), "msix\n")
+    snapshot = apply_irq_affinity(["nvme0n1"], binding, result_folder, sysfs_root, proc_root)
+    assert snapshot[100] == ORIGINAL_AFFINITY
+    assert snapshot[104] == "0-31"
+
+    restore_irq_affinity(result_folder, proc_root)
+    assert read_affinity(proc_root, 101) == ORIGINAL_AFFINITY
+    assert read_affinity(proc_root, 104) == "0-31"
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analysis.latency_histogram import (FIO_IO_U_PLAT_NR, accumulate_hist_logs, bin_latencies, merge_hist_logs,
+                                        summarize_hist_logs)
+
+# fio 3.x hist log 全寬：time, direction, bs + 1856 個 bin
+T0 = 1_700_000_000_000
+
+
+def write_hist_log(path, rows):
+    """rows: [(time_ms, ddir, {bin_index: count})]"""
+    with open(path, "w") as f:
+        for time_ms, ddir, bins in rows:
+            counts = np.zeros(FIO_IO_U_PLAT_NR, dtype=np.int64)
+            for index, count in bins.items():
+                counts[index] = count
+            f.write(", ".join(str(v) for v in [time_ms, ddir, 4096, *counts]) + "\n")
+
+
+def test_full_width_log_percentiles(tmp_path):
+    # 兩個 job、各兩個區間，合計 read 10000 個樣本：
+    #   bin 100  -> 100 ns（前兩個 group 為精確值）              9900 個
+    #   bin 1000 -> 2^20 + 40.5 * 2^14 = 1712128 ns              90 個
+    #   bin 1800 -> 2^33 + 8.5 * 2^27 = 9730785280 ns（超過 16.7 ms） 10 個
+    job1 = [(T0 + 1000, 0, {100: 2475, 1000: 20}), (T0 + 2000, 0, {100: 2475, 1000: 25, 1800: 5}),
+            (T0 + 2000, 1, {200: 7})]
+    job2 = [(T0 + 1003, 0, {100: 2475, 1000: 25}), (T0 + 2002, 0, {100: 2475, 1000: 20, 1800: 5})]
+    files = [str(tmp_path / "test_clat_hist.1.log"), str(tmp_path / "test_clat_hist.2.log")]
+    write_hist_log(files[0], job1)
+    write_hist_log(files[1], job2)
+
+    summary = summarize_hist_logs(files, interval_csv=str(tmp_path / "qos_intervals.csv"))
+
+    assert summary["Read"]["p99"] == pytest.approx(0.1)
+    assert summary["Read"]["p99.9"] == pytest.approx(1712.128)
+    assert summary["Read"]["p99.99"] == pytest.approx(9730785.28)
+    assert summary["Read"]["p99.9999"] == pytest.approx(9730785.28)
+    assert "Write" in summary
+    assert os.path.exists(tmp_path / "qos_intervals.csv")
+
+
+def test_coarse_log_width():
+    # log_hist_coarseness=2：1856 >> 2 = 464 欄
+    assert len(bin_latencies(FIO_IO_U_PLAT_NR >> 2)) == 464
+    with pytest.raises(ValueError):
+        bin_latencies(1216)
+
+
+def test_interval_windows_only_when_requested(tmp_path):
+    # 兩個 job 的時間點錯開幾 ms，仍歸入同一個區間；只有要求區間輸出時才建立 windows × bins
+    files = [str(tmp_path / "test_clat_hist.1.log"), str(tmp_path / "test_clat_hist.2.log")]
+    write_hist_log(files[0], [(T0 + 1000 * s, 0, {100: 10}) for s in range(1, 6)])
+    write_hist_log(files[1], [(T0 + 1000 * s + 3, 0, {100: 5, 300: 1}) for s in range(1, 6)] + [(T0 + 5003, 1, {50: 2})])
+
+    sums = accumulate_hist_logs(files, (0, 1, 2))
+    assert sums.windows == {}
+    assert sums.totals[0][100] == 75 and sums.totals[0][300] == 5
+    assert sums.totals[1][50] == 2 and 2 not in sums.totals
+
+    hist = merge_hist_logs(files, direction=0)
+    assert hist.counts.dtype == np.uint32
+    assert hist.counts.shape == (5, FIO_IO_U_PLAT_NR)
+    assert hist.counts[:, 100].tolist() == [15] * 5
+    assert np.array_equal(hist.total, sums.totals[0])
+    assert merge_hist_logs(files, direction=2) is None
+    assert merge_hist_logs(files).samples == 82
+
+    # 有無區間輸出，整體百分位相同
+    assert summarize_hist_logs(files) == summarize_hist_logs(files, interval_csv=str(tmp_path / "qos_intervals.csv"))
@@ -0,0 +1,91 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analysis.log_cache import CACHE_DIRNAME, build_cache, cache_path, cached_parse, prune_cache
+
+
+class CountingParser:
+    """記錄被呼叫次數的 parser：呼叫次數不變 = 快取命中"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, source):
+        self.calls += 1
+        return np.loadtxt(source, delimiter=",", dtype=np.int64, ndmin=2)
+
+
+def write_log(path, rows, mtime_ns=None):
+    with open(path, "w") as f:
+        f.write("".join(f"{t}, {v}, 0, 4096, 0\n" for t, v in rows))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+MTIME_NS = 1_700_000_000_123_456_789
+
+
+def test_hit_and_miss_on_size_and_mtime(tmp_path):
+    source = write_log(str(tmp_path / "test_bw.1.log"), [(1000, 4000), (2000, 4100)], MTIME_NS)
+    parser = CountingParser()
+
+    first = cached_parse(source, parser, "fio_log")
+    assert parser.calls == 1 and os.path.exists(cache_path(source))
+    assert np.array_equal(cached_parse(source, parser, "fio_log"), first)
+    assert parser.calls == 1
+
+    # 內容變長（size 不同）
+    write_log(source, [(1000, 4000), (2000, 4100), (3000, 4200)], MTIME_NS)
+    assert len(cached_parse(source, parser, "fio_log")) == 3
+    assert parser.calls == 2
+
+    # 同樣大小、只有 mtime 不同（例如重跑覆寫了同長度的 log）
+    write_log(source, [(1000, 4000), (2000, 4100), (3000, 4300)], MTIME_NS + 1)
+    assert cached_parse(source, parser, "fio_log")[2, 1] == 4300
+    assert parser.calls == 3
+    cached_parse(source, parser, "fio_log")
+    assert parser.calls == 3
+
+    # use_cache=False 一律重新解析
+    cached_parse(source, parser, "fio_log", use_cache=False)
+    assert parser.calls == 4
+
+
+def test_parser_name_invalidates(tmp_path):
+    source = write_log(str(tmp_path / "test_bw.1.log"), [(1000, 4000)], MTIME_NS)
+    parser = CountingParser()
+    cached_parse(source, parser, "fio_log")
+    cached_parse(source, parser, "fio_log_v2")
+    assert parser.calls == 2
+    cached_parse(source, parser, "fio_log_v2")
+    assert parser.calls == 2
+    cached_parse(source, parser, "fio_log")
+    assert parser.calls == 3
+
+
+def test_build_and_prune(tmp_path):
+    folder = str(tmp_path)
+    kept = write_log(os.path.join(folder, "4KB_Random_Read_bw.1.log"), [(1000, 4000)], MTIME_NS)
+    changed = write_log(os.path.join(folder, "4KB_Random_Read_bw.2.log"), [(1000, 4000)], MTIME_NS)
+    deleted = write_log(os.path.join(folder, "4KB_Random_Read_bw.3.log"), [(1000, 4000)], MTIME_NS)
+    write_log(os.path.join(folder, "notes.log"), [(1000, 4000)])
+
+    # 只處理 fio log，第二次全部已是最新
+    assert build_cache(folder) == (3, 0)
+    assert build_cache(folder) == (0, 3)
+    assert sorted(os.listdir(os.path.join(folder, CACHE_DIRNAME))) == [
+        "4KB_Random_Read_bw.1.log.npz", "4KB_Random_Read_bw.2.log.npz", "4KB_Random_Read_bw.3.log.npz"]
+
+    write_log(changed, [(1000, 4000), (2000, 4100)], MTIME_NS)
+    os.remove(deleted)
+    assert prune_cache(folder) == 2
+    assert os.listdir(os.path.join(folder, CACHE_DIRNAME)) == [os.path.basename(kept) + ".npz"]
+    assert prune_cache(folder) == 0
+
+    # 全部刪除後，空的 .parsed 資料夾也一併移除
+    assert prune_cache(folder, remove_all=True) == 1
+    assert not os.path.exists(os.path.join(folder, CACHE_DIRNAME))
@@ -0,0 +1,108 @@
+import os
+import sys
+import struct
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import devices.nvme_logs as nvme_logs
+from analysis.result_parser import nand_bytes_delta, write_amplification_columns
+from devices.nvme_logs import (IDENTIFY_LEN, LOG_ID_SMART, LOG_ID_VENDOR_SMART, SMART_LOG_LEN, VENDOR_BYTES_WRITTEN_UNIT,
+                               VENDOR_SMART_LOG_LEN, SmartLog, TemperatureThresholds, VendorSmartLog)
+from scripts.smart_sampler import read_write_counters
+
+MIB_32 = 32 * 1024 * 1024
+
+
+def smart_blob(temperature_k=311, data_units_written=1_234_567, sensors=(309, 315), thm_counts=(3, 1),
+               thm_times=(120, 7)):
+    """手工組出的 SMART / Health log (0x02)，欄位位移與 SmartLog.from_bytes 相同"""
+    data = bytearray(SMART_LOG_LEN)
+    struct.pack_into("<BHBBBB", data, 0, 0x00, temperature_k, 100, 10, 2, 0)
+    data[32:48] = (987_654).to_bytes(16, "little")              # data units read
+    data[48:64] = data_units_written.to_bytes(16, "little")
+    data[112:128] = (42).to_bytes(16, "little")                  # power cycles
+    data[128:144] = (1_000).to_bytes(16, "little")               # power on hours
+    data[160:176] = (0).to_bytes(16, "little")                   # media errors
+    struct.pack_into("<II", data, 192, 5, 0)                     # warning / critical temperature time
+    struct.pack_into("<8H", data, 200, *(list(sensors) + [0] * (8 - len(sensors))))
+    struct.pack_into("<4I", data, 216, *thm_counts, *thm_times)
+    return bytes(data)
+
+
+def vendor_attribute(key, raw_bytes, normalized=100):
+    # id, reserved[2], normalized, reserved, raw[6], reserved
+    return bytes([key, 0, 0, normalized, 0]) + raw_bytes.ljust(6, b"\x00") + b"\x00"
+
+
+def vendor_blob(nand_units, host_units, throttle_percent=0, throttle_count=0):
+    """手工組出的 Intel / Solidigm additional SMART log (0xCA)"""
+    data = b"".join([
+        vendor_attribute(0xAB, (0).to_bytes(6, "little")),
+        vendor_attribute(0xAD, struct.pack("<3H", 10, 42, 25), normalized=98),
+        vendor_attribute(0xEA, bytes([throttle_percent]) + throttle_count.to_bytes(4, "little")),
+        vendor_attribute(0xF4, nand_units.to_bytes(6, "little")),
+        vendor_attribute(0xF5, host_units.to_bytes(6, "little")),
+    ])
+    return data.ljust(VENDOR_SMART_LOG_LEN, b"\x00")
+
+
+def identify_blob(warning_k=343, critical_k=353):
+    data = bytearray(IDENTIFY_LEN)
+    struct.pack_into("<HH", data, 266, warning_k, critical_k)
+    return bytes(data)
+
+
+def test_smart_log_decoding():
+    smart_log = SmartLog.from_bytes(smart_blob())
+    assert smart_log.temperature == 311
+    assert smart_log.temperature_c == 38
+    assert smart_log.temperature_sensors == (309, 315)
+    assert smart_log.avail_spare == 100 and smart_log.percent_used == 2
+    assert smart_log.power_cycles == 42 and smart_log.power_on_hours == 1_000
+    assert smart_log.warning_temp_time == 5
+    assert (smart_log.thm_temp1_trans_count, smart_log.thm_temp2_trans_count) == (3, 1)
+    assert (smart_log.thm_temp1_total_time, smart_log.thm_temp2_total_time) == (120, 7)
+    assert smart_log.data_units_written_bytes == 1_234_567 * 512_000
+    assert smart_log.data_units_read_bytes == 987_654 * 512_000
+    with pytest.raises(ValueError):
+        SmartLog.from_bytes(smart_blob()[:100])
+
+
+def test_vendor_smart_log_decoding():
+    vendor_log = VendorSmartLog.from_bytes(vendor_blob(nand_units=3_000, host_units=1_000,
+                                                       throttle_percent=25, throttle_count=4))
+    assert VENDOR_BYTES_WRITTEN_UNIT == MIB_32
+    assert vendor_log.nand_bytes_written == 3_000 * MIB_32
+    assert vendor_log.host_bytes_written == 1_000 * MIB_32
+    assert vendor_log.thermal_throttle == {"percent": 25, "count": 4}
+    assert vendor_log.wear_leveling == {"min": 10, "max": 42, "avg": 25}
+    assert vendor_log.attributes["wear_leveling_count"].normalized == 98
+    # 清單在第一個 id 為 0 的位置結束，沒有的 attribute 回傳 None
+    assert vendor_log.raw("crc_error_count") is None
+
+
+def test_identify_temperature_thresholds():
+    thresholds = TemperatureThresholds.from_identify(identify_blob())
+    assert (thresholds.warning_c, thresholds.critical_c) == (70, 80)
+    assert TemperatureThresholds.from_identify(identify_blob(0, 0)).warning_c is None
+
+
+def test_write_counters_drive_waf(monkeypatch):
+    # 測試前後各讀一次 0x02 / 0xCA；NAND 寫入 96 GiB、host 寫入 64 GiB -> WAF 1.5
+    before = {LOG_ID_SMART: smart_blob(data_units_written=1_000),
+              LOG_ID_VENDOR_SMART: vendor_blob(nand_units=10_000, host_units=9_000)}
+    after = {LOG_ID_SMART: smart_blob(data_units_written=1_000 + 131_072),
+             LOG_ID_VENDOR_SMART: vendor_blob(nand_units=10_000 + 3_072, host_units=9_000 + 2_048)}
+    pages = {}
+    monkeypatch.setattr(nvme_logs, "read_log_page", lambda device, log_id, length: pages[log_id])
+
+    pages.update(before)
+    counters_before = read_write_counters("nvme0n1")
+    pages.update(after)
+    counters_after = read_write_counters("nvme0n1")
+
+    assert counters_after["host_bytes_written"] - counters_before["host_bytes_written"] == 64 << 30
+    nand_bytes = nand_bytes_delta(counters_before, counters_after)
+    assert nand_bytes == 96 << 30
+    assert write_amplification_columns(64 << 30, nand_bytes)["WAF"] == "1.500"
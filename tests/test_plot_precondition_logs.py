@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analysis.plot_precondition_logs import infer_metric_from_logname
+
+
+@pytest.mark.parametrize("log_path, metric", [
+    ("4KB_Random_Read", "4KB Random Read (KIOPs)"),
+    ("4KB_Random_Write", "4KB Random Write (KIOPs)"),
+    ("16KB_RandRW_70R_30W", "16KB Random Mixed 70/30 RR/RW (KIOPs)"),
+    ("8KB_RandRW_70R_30W", "8KB Random Mixed 70/30 RR/RW (KIOPs)"),
+    ("128KB_Seq_Read", "128KB Seq Read (MB/s)"),
+    ("128KB_Seq_Write", "128KB Seq Write (MB/s)"),
+    # 結果資料夾中的完整路徑、sweep 的量測點名稱
+    ("/r/nvme0n1_precondition_log/32KB_Random_Read", "32KB Random Read (KIOPs)"),
+    ("16KB_Random_Write_QD32_J4", "16KB Random Write (KIOPs)"),
+])
+def test_infer_metric_from_logname(log_path, metric):
+    assert infer_metric_from_logname(log_path) == metric
+
+
+@pytest.mark.parametrize("log_path", ["Random_Read", "4KB_Trim", "precondition"])
+def test_infer_metric_unknown_names(log_path):
+    assert infer_metric_from_logname(log_path) is None
@@ -58,17 +58,25 @@ def get_spec_json_path_by_product(product_name):
         return None
 
 # ---------- 找到測試結果資料夾並選擇是否創建新資料夾 ----------
-def find_latest_result_folder(base_path, selected_model, output_folder_name):
+def find_latest_result_folder(base_path, selected_model, output_folder_name, resume=False):
     """
     根據 SSD 型號找到最新的測試結果資料夾，或選擇建立新資料夾。
     :param base_path: 測試結果的根目錄
     :param selected_model: 選擇的 SSD 型號（例如 "P5336-U2"）
     :param output_folder_name: 測試結果資料夾的名稱（例如 "TestResults"）
+    :param resume: True 時直接回傳最新的資料夾（不詢問），用於接續中斷的測試
     :return: 最新或新建的資料夾路徑
     """
     folders = glob.glob(os.path.join(base_path, f"{selected_model}_{output_folder_name}_*"))
     latest_folder = max(folders, key=os.path.getmtime) if folders else None
 
+    if resume:
+        if latest_folder:
+            print(f"Resuming in the latest folder: {latest_folder}")
+            return latest_folder
+        print("No existing folders found to resume. Exiting.")
+        sys.exit(1)
+
     create_new = input("Do you want to create a new folder? (y/n): ").strip().lower()
     if create_new == 'y':
         new_folder = os.path.join(base_path, f"{selected_model}_{output_folder_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import csv
+import json
+import queue
+import socket
+import sqlite3
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# ---------- 測試結果資料庫 (SQLite, WAL) ----------
+# 每次測試 (run) 的環境、裝置韌體與每一列 summary 結果都存進同一個資料庫，可以跨資料夾查詢歷史，
+# 例如「4KB_Random_Read 在韌體 X → Y 之間的變化」。測試期間所有寫入都經過 ResultsStore 的單一
+# writer thread（queue），裝置 thread 不會互相搶 SQLite 的寫入鎖；WAL 模式下查詢不會被寫入擋住。
+# 資料庫放在 data/（不進版本控制）；主程式 --results-db 與本檔 CLI 的 --db 可改路徑。
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "results_history.db")
+FIO_VERSION_TIMEOUT_SEC = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        TEXT PRIMARY KEY,
+    model         TEXT,
+    started_at    TEXT,
+    result_folder TEXT,
+    hostname      TEXT,
+    kernel        TEXT,
+    fio_version   TEXT,
+    config        TEXT
+);
+CREATE TABLE IF NOT EXISTS run_devices (
+    run_id       TEXT NOT NULL REFERENCES runs(run_id),
+    device       TEXT NOT NULL,
+    model_number TEXT,
+    serial       TEXT,
+    firmware     TEXT,
+    capacity     TEXT,
+    PRIMARY KEY (run_id, device)
+);
+CREATE TABLE IF NOT EXISTS results (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id        TEXT NOT NULL REFERENCES runs(run_id),
+    device        TEXT NOT NULL,
+    test_name     TEXT NOT NULL,
+    summary       TEXT,
+    host          TEXT,
+    recorded_at   TEXT,
+    iops          REAL,
+    bw_mbps       REAL,
+    read_iops     REAL,
+    write_iops    REAL,
+    clat_p99_us   REAL,
+    clat_p9999_us REAL,
+    metrics       TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs(model);
+CREATE INDEX IF NOT EXISTS idx_run_devices_firmware ON run_devices(firmware);
+CREATE INDEX IF NOT EXISTS idx_results_test ON results(test_name);
+CREATE INDEX IF NOT EXISTS idx_results_run_device ON results(run_id, device);
+"""
+
+# summary CSV 欄位 -> results 資料表中可索引 / 排序的數值欄位；其餘欄位以 JSON 存在 metrics
+METRIC_COLUMNS = {
+    "IOPS": "iops",
+    "Bandwidth": "bw_mbps",
+    "Read IOPS": "read_iops",
+    "Write IOPS": "write_iops",
+    "clat p99 (us)": "clat_p99_us",
+    "clat p99.99 (us)": "clat_p9999_us",
+}
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _number(value):
+    """ "1234.56MB/s" / "N/A" / 1234 -> float 或 None """
+    if value is None:
+        return None
+    try:
+        return float(str(value).replace("MB/s", "").strip())
+    except ValueError:
+        return None
+
+
+# ---------- 環境資訊 ----------
+def get_fio_version():
+    try:
+        return subprocess.run(["fio", "--version"], capture_output=True, text=True,
+                              timeout=FIO_VERSION_TIMEOUT_SEC).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        # 沒有安裝 fio 或 fio 沒有回應：版本記為 NULL，不影響寫入結果
+        return None
+
+
+def collect_device_environment(devices):
+    """{device: {"model_number", "serial", "firmware", "capacity"}}；韌體取自 get_nvme_firmware()"""
+    from devices.device_inventory import get_device_info
+    from provisioning.SUT_Provisioning import get_nvme_firmware
+
+    firmware = get_nvme_firmware()
+    environment = {}
+    for device in devices:
+        info = get_device_info(device)
+        environment[device] = {
+            "model_number": info.model if info else None,
+            "serial": info.serial if info else None,
+            "firmware": firmware.get(device) or (info.firmware if info else None),
+            "capacity": info.capacity if info else None,
+        }
+    return environment
+
+
+# ---------- 寫入 ----------
+class ResultsStore:
+    """
+    測試期間的單一 writer：所有寫入放進 queue，由背景 thread 依序寫入 SQLite。
+
+        store = ResultsStore().start()
+        store.begin_run(run_id, model, result_folder, config, devices)
+        add_row_listener(store.record_row)    # write_to_csv 每寫一列就同步寫入資料庫
+        ...
+        store.close()
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._run_ids = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="results-db", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """等 queue 中的寫入全部完成後結束 writer thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        conn = connect(self.db_path)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                sql, params = item
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                except sqlite3.Error as e:
+                    logging.error(f"❌ Results database write failed: {e}")
+        finally:
+            conn.close()
+
+    def _submit(self, sql, params):
+        self._queue.put((sql, params))
+
+    def begin_run(self, run_id, model, result_folder, config=None, devices=(), device_environment=None):
+        """記錄一次 run 與每個裝置的韌體；--resume 時沿用原本的 run（started_at 不變）"""
+        self._run_ids[os.path.abspath(result_folder)] = run_id
+        self._submit(
+            "INSERT INTO runs (run_id, model, started_at, result_folder, hostname, kernel, fio_version, config) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(run_id) DO UPDATE SET config = excluded.config, fio_version = excluded.fio_version",
+            (run_id, model, datetime.now().isoformat(timespec="seconds"), os.path.abspath(result_folder),
+             socket.gethostname(), platform.release(), get_fio_version(), json.dumps(config or {}))
+        )
+        if device_environment is None:
+            device_environment = collect_device_environment(devices)
+        for device, env in device_environment.items():
+            self._submit(
+                "INSERT OR REPLACE INTO run_devices (run_id, device, model_number, serial, firmware, capacity) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, device, env.get("model_number"), env.get("serial"), env.get("firmware"), env.get("capacity"))
+            )
+
+    def record_row(self, csv_file, row, run_id=None):
+        """write_to_csv 的 listener：run_id 依 CSV 所在的結果資料夾決定"""
+        run_id = run_id or self._run_ids.get(os.path.dirname(os.path.abspath(csv_file)))
+        if run_id is None:
+            return
+        self._submit(
+            "INSERT INTO results (run_id, device, test_name, summary, host, recorded_at, "
+            + ", ".join(METRIC_COLUMNS.values()) + ", metrics) VALUES (?, ?, ?, ?, ?, ?, "
+            + ", ".join("?" * len(METRIC_COLUMNS)) + ", ?)",
+            (run_id, row.get("Device"), row.get("Test Name"), os.path.basename(csv_file), row.get("Host"),
+             datetime.now().isoformat(timespec="seconds"),
+             *[_number(row.get(column)) for column in METRIC_COLUMNS], json.dumps(row, default=str))
+        )
+
+
+# ---------- 查詢 ----------
+def query_results(conn, model=None, test=None, firmware=None, device=None, run_id=None, limit=None):
+    """依條件查詢結果（新的在前），回傳 list[dict]"""
+    conditions, params = [], []
+    for column, value in (("runs.model", model), ("results.test_name", test), ("run_devices.firmware", firmware),
+                          ("results.device", device), ("results.run_id", run_id)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    sql = (
+        "SELECT results.run_id, runs.started_at, runs.model, results.device, run_devices.firmware, "
+        "results.test_name, results.iops, results.bw_mbps, results.clat_p99_us, results.clat_p9999_us "
+        "FROM results JOIN runs ON runs.run_id = results.run_id "
+        "LEFT JOIN run_devices ON run_devices.run_id = results.run_id AND run_devices.device = results.device"
+    )
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY runs.started_at DESC, results.id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def firmware_summary(conn, test, model=None, firmwares=None):
+    """每個韌體版本的平均結果：[{"firmware", "runs", "samples", "iops", "bw_mbps", "clat_p99_us"}]"""
+    conditions, params = ["results.test_name = ?", "run_devices.firmware IS NOT NULL"], [test]
+    if model is not None:
+        conditions.append("runs.model = ?")
+        params.append(model)
+    if firmwares:
+        conditions.append(f"run_devices.firmware IN ({', '.join('?' * len(firmwares))})")
+        params.extend(firmwares)
+    sql = (
+        "SELECT run_devices.firmware AS firmware, COUNT(DISTINCT results.run_id) AS runs, COUNT(*) AS samples, "
+        "AVG(results.iops) AS iops, AVG(results.bw_mbps) AS bw_mbps, AVG(results.clat_p99_us) AS clat_p99_us, "
+        "MIN(runs.started_at) AS first_run "
+        "FROM results JOIN runs ON runs.run_id = results.run_id "
+        "JOIN run_devices ON run_devices.run_id = results.run_id AND run_devices.device = results.device "
+        "WHERE " + " AND ".join(conditions) + " GROUP BY run_devices.firmware ORDER BY first_run"
+    )
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def list_runs(conn, model=None, limit=20):
+    sql = ("SELECT runs.run_id, runs.model, runs.started_at, runs.hostname, runs.kernel, runs.fio_version, "
+           "GROUP_CONCAT(DISTINCT run_devices.firmware) AS firmware, "
+           "(SELECT COUNT(*) FROM results WHERE results.run_id = runs.run_id) AS results "
+           "FROM runs LEFT JOIN run_devices ON run_devices.run_id = runs.run_id")
+    params = []
+    if model is not None:
+        sql += " WHERE runs.model = ?"
+        params.append(model)
+    sql += f" GROUP BY runs.run_id ORDER BY runs.started_at DESC LIMIT {int(limit)}"
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+# ---------- 匯入既有的結果資料夾 ----------
+def import_result_folder(conn, result_folder):
+    """
+    把舊的結果資料夾（*_fio_summary_results.csv + run_journal.jsonl 中記錄的測試設定）匯入資料庫，回傳匯入的列數。
+    沒有 journal（更早的資料夾）時 model 取自資料夾名稱；舊資料沒有韌體資訊時 firmware 為 NULL。
+    """
+    from utils.run_journal import load_run_config
+
+    run_id = os.path.basename(os.path.normpath(result_folder))
+    config = load_run_config(result_folder) or {}
+    model = config.get("model") or run_id.split("_TestResults_")[0]
+    started_at = datetime.fromtimestamp(os.path.getmtime(result_folder)).isoformat(timespec="seconds")
+    count = 0
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO runs (run_id, model, started_at, result_folder, config) VALUES (?, ?, ?, ?, ?)",
+            (run_id, model, started_at, os.path.abspath(result_folder), json.dumps(config))
+        )
+        if conn.execute("SELECT COUNT(*) FROM results WHERE run_id = ?", (run_id,)).fetchone()[0]:
+            logging.info(f"⏭️ {run_id} already imported")
+            return 0
+        for csv_name in sorted(os.listdir(result_folder)):
+            if not csv_name.endswith("_fio_summary_results.csv"):
+                continue
+            with open(os.path.join(result_folder, csv_name), "r", newline="") as f:
+                for row in csv.DictReader(f):
+                    conn.execute(
+                        "INSERT INTO results (run_id, device, test_name, summary, host, recorded_at, "
+                        + ", ".join(METRIC_COLUMNS.values()) + ", metrics) VALUES (?, ?, ?, ?, ?, ?, "
+                        + ", ".join("?" * len(METRIC_COLUMNS)) + ", ?)",
+                        (run_id, row.get("Device"), row.get("Test Name"), csv_name, row.get("Host"), started_at,
+                         *[_number(row.get(column)) for column in METRIC_COLUMNS], json.dumps(row))
+                    )
+                    count += 1
+    return count
+
+
+# ---------- CLI ----------
+def _print_table(rows):
+    if not rows:
+        print("(no results)")
+        return
+    columns = list(rows[0].keys())
+    widths = {c: max(len(c), *(len(_format(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(_format(row[c]).ljust(widths[c]) for c in columns))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "" if value is None else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查詢測試結果資料庫")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="資料庫路徑")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = sub.add_parser("runs", help="列出最近的 run")
+    runs_parser.add_argument("--model")
+    runs_parser.add_argument("--limit", type=int, default=20)
+
+    query_parser = sub.add_parser("query", help="查詢結果")
+    query_parser.add_argument("--model")
+    query_parser.add_argument("--test")
+    query_parser.add_argument("--firmware")
+    query_parser.add_argument("--device")
+    query_parser.add_argument("--run")
+    query_parser.add_argument("--limit", type=int, default=50)
+
+    fw_parser = sub.add_parser("firmware", help="比較同一個測試在各韌體版本的平均結果")
+    fw_parser.add_argument("--test", required=True)
+    fw_parser.add_argument("--model")
+    fw_parser.add_argument("--firmware", action="append", help="只比較指定的韌體（可重複）")
+
+    import_parser = sub.add_parser("import", help="匯入既有的結果資料夾")
+    import_parser.add_argument("folders", nargs="+")
+
+    args = parser.parse_args(argv)
+    conn = connect(args.db)
+    try:
+        if args.command == "runs":
+            _print_table(list_runs(conn, args.model, args.limit))
+        elif args.command == "query":
+            _print_table(query_results(conn, args.model, args.test, args.firmware, args.device, args.run, args.limit))
+        elif args.command == "firmware":
+            _print_table(firmware_summary(conn, args.test, args.model, args.firmware))
+        elif args.command == "import":
+            for folder in args.folders:
+                print(f"✅ {folder}: {import_result_folder(conn, folder)} rows imported")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
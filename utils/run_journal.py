@@ -0,0 +1,90 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+# ---------- 測試進度日誌 (append-only) ----------
+# 每完成一個階段就寫入一行 JSON 並 fsync，程序中斷或主機重開後可以用 --resume 接續
+JOURNAL_FILE = "run_journal.jsonl"
+
+PHASE_CONFIG = "config"
+PHASE_ERASE = "erase"
+PHASE_PRECONDITION = "precondition"
+PHASE_TEST = "test"
+PHASE_PARSE = "parse"
+
+_journal_lock = threading.Lock()
+
+
+def get_journal_path(result_folder):
+    return os.path.join(result_folder, JOURNAL_FILE)
+
+
+def append_journal_entry(result_folder, phase, device=None, test_name=None, outputs=None):
+    """
+    記錄一個已完成的階段。
+    :param phase: config / erase / precondition / test / parse
+    :param outputs: 該階段產生的檔案或資訊，例如 {"json": ".../fio_4KB_Random_Read_nvme0n1.json"}
+    """
+    entry = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "phase": phase,
+        "device": device,
+        "test": test_name,
+        "outputs": outputs or {},
+    }
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    path = get_journal_path(result_folder)
+    with _journal_lock:
+        # 上次中斷時可能留下沒有換行的半行，先補上換行避免新紀錄被接在後面
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+        with open(path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def load_journal(result_folder):
+    """讀取所有紀錄；最後一行若因中斷而不完整則忽略"""
+    path = get_journal_path(result_folder)
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"⚠️ Ignoring truncated journal entry in {path}: {line[:80]}")
+    return entries
+
+
+def get_completed_phases(result_folder):
+    """回傳 {(device, test, phase): outputs}"""
+    return {
+        (e.get("device"), e.get("test"), e.get("phase")): e.get("outputs", {})
+        for e in load_journal(result_folder)
+    }
+
+
+def is_phase_completed(result_folder, device, test_name, phase):
+    return (device, test_name, phase) in get_completed_phases(result_folder)
+
+
+def save_run_config(result_folder, config):
+    """記錄本次測試的設定（裝置、runtime 等），讓 --resume 不需要再次輸入"""
+    append_journal_entry(result_folder, PHASE_CONFIG, outputs=config)
+
+
+def load_run_config(result_folder):
+    """取得最後一次記錄的測試設定，沒有則回傳 None"""
+    configs = [e["outputs"] for e in load_journal(result_folder) if e.get("phase") == PHASE_CONFIG]
+    return configs[-1] if configs else None